@@ -0,0 +1,331 @@
+"""
+Hot/cold archival of old applications.
+
+app.db keeps the recent applications. This job moves the ones created
+before the start of the month --older-than-days ago into one SQLite file
+per month under ARCHIVE_DIR, with the same schema as app.db:
+
+    archive/applications-2025-01.db   that month's applications and their borrower rows
+    archive/index.db                  routing index: application -> month
+
+A decision is final as soon as an application is created, so every
+application is closed: age is the only criterion, and only whole months
+are moved.
+
+The job walks the oldest applications in chunks (by the created_at index).
+Each chunk is copied into its partitions and the index, committed there,
+then deleted from app.db in one short transaction. Copies skip rows that
+are already there and moved rows leave app.db, so an interrupted run
+resumes by running it again. Borrower rows are copied along but stay in
+app.db: requests reuse them by fingerprint, and deleting one could race
+with a request about to reference it.
+
+GET /applications/{application_id} falls through to the archive when the
+id isn't in app.db. The index stores 8 bytes of a hash of the id and the
+month per application, and names the partition to read. Partitions and
+the index are opened read-only (mode=ro, query_only) with memory-mapped
+I/O; only this job writes to them. GET /applications and
+/borrowers/{id}/applications list app.db only. /stats counters keep the
+archived days (api.stats rebuild and verify read the partitions too).
+
+Each shard (api.sharding) has its own archive, since row ids are only
+unique within a database: shard 0's is ARCHIVE_DIR itself, shard k's is
+ARCHIVE_DIR/shard<k>/. The job archives every shard.
+
+Usage:
+    python -m api.archive [--older-than-days 180] [--chunk-size 500] [--pause 0.05]
+
+    ARCHIVE_DIR     archive   (partition files and the index)
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Engine, Integer, MetaData, Table, bindparam, create_engine, delete, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from api.helpers import APPLICATION_RESPONSE_COLUMNS
+from api.models import Application, Base, Borrower
+from api.stats import compute_buckets, merge_buckets
+from api.storage import StorageSettings
+from api.utils import load_env_file
+
+DEFAULT_ARCHIVE_DIR = "archive"
+ARCHIVE_CHUNK_SIZE = 500
+ARCHIVE_AFTER_DAYS = 180
+
+_PARTITION_RE = re.compile(r"^applications-(\d{4})-(\d{2})\.db$")
+
+# The routing index lives in its own file, apart from the app's metadata
+_index_metadata = MetaData()
+routes = Table(
+    "routes", _index_metadata,
+    Column("key", Integer, primary_key=True),    # routing_key(application_id)
+    Column("month", Integer, primary_key=True),  # YYYYMM of the partition
+    sqlite_with_rowid=False,
+)
+
+_PARTITION_TABLES = [Borrower.__table__, Application.__table__]
+
+_applications = Application.__table__
+_borrowers = Borrower.__table__
+_APPLICATION_VALUES_QUERY = (
+    select(*(_applications.c[column.key] for column in APPLICATION_RESPONSE_COLUMNS))
+    .where(_applications.c.application_id == bindparam("application_id"))
+)
+_ROUTE_QUERY = select(routes.c.month).where(routes.c.key == bindparam("key"))
+
+
+def routing_key(application_id: str) -> int:
+    """First 8 bytes of the id's sha256 as a signed 64-bit SQLite integer."""
+    return int.from_bytes(hashlib.sha256(application_id.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+def month_of(created_at: datetime) -> int:
+    return created_at.year * 100 + created_at.month
+
+
+def archive_cutoff(today: date, older_than_days: int) -> datetime:
+    """Start of the month older_than_days ago: everything before it is archived."""
+    day = today - timedelta(days=older_than_days)
+    return datetime(day.year, day.month, 1)
+
+
+@dataclass
+class ArchiveProgress:
+    moved: int = 0
+    chunks: int = 0
+    months: int = 0
+
+
+class ApplicationArchive:
+    """The partition files and routing index under one directory."""
+
+    def __init__(self, directory: str = DEFAULT_ARCHIVE_DIR, mmap_size: int = 268435456):
+        self.directory = Path(directory)
+        self.mmap_size = mmap_size
+        self._readers: Dict[Path, Engine] = {}
+        self._writers: Dict[Path, Engine] = {}
+        self._lock = threading.Lock()
+        self._shards: Dict[int, "ApplicationArchive"] = {}
+        self.lookups = 0
+        self.hits = 0
+
+    @classmethod
+    def from_env(cls) -> "ApplicationArchive":
+        return cls(
+            os.environ.get("ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR),
+            mmap_size=StorageSettings.from_env().sqlite_mmap_size,
+        )
+
+    def shard(self, shard: int) -> "ApplicationArchive":
+        """The archive of a shard's applications (this one for shard 0)."""
+        if shard == 0:
+            return self
+        with self._lock:
+            if shard not in self._shards:
+                self._shards[shard] = ApplicationArchive(str(self.directory / f"shard{shard}"), self.mmap_size)
+            return self._shards[shard]
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / "index.db"
+
+    def partition_path(self, month: int) -> Path:
+        return self.directory / f"applications-{month // 100:04d}-{month % 100:02d}.db"
+
+    def months(self) -> List[int]:
+        """Months that have a partition, oldest first."""
+        if not self.directory.is_dir():
+            return []
+        found = (_PARTITION_RE.match(path.name) for path in self.directory.iterdir())
+        return sorted(int(m.group(1)) * 100 + int(m.group(2)) for m in found if m)
+
+    # Reading (the API)
+
+    def _reader(self, path: Path) -> Optional[Engine]:
+        """Read-only, memory-mapped engine of an existing file, else None."""
+        engine = self._readers.get(path)
+        if engine is not None:
+            return engine
+        if not path.exists():
+            return None
+        with self._lock:
+            if path not in self._readers:
+                engine = create_engine(
+                    f"sqlite:///file:{path.resolve()}?mode=ro&uri=true",
+                    connect_args={"check_same_thread": False},
+                )
+                statements = [f"PRAGMA mmap_size = {int(self.mmap_size)}", "PRAGMA query_only = ON"]
+
+                @event.listens_for(engine, "connect")
+                def apply_pragmas(dbapi_connection, connection_record):
+                    cursor = dbapi_connection.cursor()
+                    try:
+                        for statement in statements:
+                            cursor.execute(statement)
+                    finally:
+                        cursor.close()
+
+                self._readers[path] = engine
+            return self._readers[path]
+
+    def fetch_application_values(self, application_id: str) -> Optional[tuple]:
+        """Like api.helpers.fetch_application_values, from the partition the index names."""
+        index = self._reader(self.index_path)
+        if index is None:
+            return None
+        self.lookups += 1
+        with index.connect() as conn:
+            months = conn.execute(_ROUTE_QUERY, {"key": routing_key(application_id)}).scalars().all()
+        # Usually one month; several only if two ids share a routing key
+        for month in months:
+            partition = self._reader(self.partition_path(month))
+            if partition is None:
+                continue
+            with partition.connect() as conn:
+                values = conn.execute(_APPLICATION_VALUES_QUERY, {"application_id": application_id}).first()
+            if values is not None:
+                self.hits += 1
+                return values
+        return None
+
+    def compute_buckets(self) -> dict:
+        """api.stats.compute_buckets summed over every partition."""
+        buckets = {}
+        for month in self.months():
+            with self._reader(self.partition_path(month)).connect() as conn:
+                merge_buckets(buckets, compute_buckets(conn))
+        return buckets
+
+    def stats(self) -> dict:
+        """Usage of this archive and its shards' together."""
+        stats = {"partitions": len(self.months()), "open_files": len(self._readers),
+                 "lookups": self.lookups, "hits": self.hits}
+        for archive in list(self._shards.values()):
+            for name, value in archive.stats().items():
+                stats[name] += value
+        return stats
+
+    # Writing (the archive job)
+
+    def _writer(self, path: Path, tables: list, metadata: MetaData) -> Engine:
+        engine = self._writers.get(path)
+        if engine is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            engine = self._writers[path] = create_engine(f"sqlite:///{path}")
+            metadata.create_all(bind=engine, tables=tables)
+        return engine
+
+    def write_month(self, month: int, applications: List[dict], borrowers: List[dict]) -> None:
+        """Copy rows into a month's partition; rows already there are skipped."""
+        engine = self._writer(self.partition_path(month), _PARTITION_TABLES, Base.metadata)
+        with engine.begin() as conn:
+            if borrowers:
+                conn.execute(sqlite_insert(_borrowers).on_conflict_do_nothing(), borrowers)
+            conn.execute(sqlite_insert(_applications).on_conflict_do_nothing(), applications)
+
+    def write_routes(self, entries: List[Tuple[int, int]]) -> None:
+        """Add (routing key, month) entries to the index."""
+        engine = self._writer(self.index_path, [routes], _index_metadata)
+        with engine.begin() as conn:
+            conn.execute(
+                sqlite_insert(routes).on_conflict_do_nothing(),
+                [{"key": key, "month": month} for key, month in entries],
+            )
+
+    def close(self) -> None:
+        for engine in (*self._readers.values(), *self._writers.values()):
+            engine.dispose()
+        self._readers.clear()
+        self._writers.clear()
+        for archive in self._shards.values():
+            archive.close()
+
+
+def _delete_chunk(engine: Engine, ids: List[int]) -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(_applications).where(_applications.c.id.in_(ids)))
+
+
+def archive_applications(
+        engine: Engine,
+        archive: ApplicationArchive,
+        cutoff: datetime,
+        chunk_size: int = ARCHIVE_CHUNK_SIZE,
+        pause: float = 0.05,
+        max_chunks: Optional[int] = None
+) -> ArchiveProgress:
+    """
+    Move every application created before cutoff from engine's database
+    into the archive, oldest first. max_chunks stops early, mostly for tests.
+    """
+    progress = ArchiveProgress()
+    months = set()
+    while max_chunks is None or progress.chunks < max_chunks:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(_applications)
+                .where(_applications.c.created_at < cutoff)
+                .order_by(_applications.c.created_at, _applications.c.id)
+                .limit(chunk_size)
+            ).mappings().all()
+            if not rows:
+                break
+            borrowers = {
+                row["id"]: dict(row) for row in conn.execute(
+                    select(_borrowers).where(_borrowers.c.id.in_({row["borrower_id"] for row in rows}))
+                ).mappings()
+            }
+
+        by_month = defaultdict(list)
+        for row in rows:
+            by_month[month_of(row["created_at"])].append(dict(row))
+        for month, applications in by_month.items():
+            month_borrowers = {app["borrower_id"] for app in applications}
+            archive.write_month(month, applications, [borrowers[i] for i in month_borrowers if i in borrowers])
+        archive.write_routes([(routing_key(row["application_id"]), month_of(row["created_at"])) for row in rows])
+        # Only once the copies are committed
+        _delete_chunk(engine, [row["id"] for row in rows])
+
+        months.update(by_month)
+        progress.moved += len(rows)
+        progress.chunks += 1
+        progress.months = len(months)
+        if pause:
+            time.sleep(pause)
+    return progress
+
+
+def main():
+    load_env_file()
+    parser = argparse.ArgumentParser(description="Move old applications into monthly archive files.")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archive whole months before the one this many days ago")
+    parser.add_argument("--chunk-size", type=int, default=ARCHIVE_CHUNK_SIZE)
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between chunks")
+    args = parser.parse_args()
+
+    from api.sharding import default_shards
+
+    archive = ApplicationArchive.from_env()
+    cutoff = archive_cutoff(date.today(), args.older_than_days)
+    for shard, engine in enumerate(default_shards().engines):
+        progress = archive_applications(engine, archive.shard(shard), cutoff, args.chunk_size, args.pause)
+        print(
+            f"Moved {progress.moved} applications created before {cutoff.date()} "
+            f"into {progress.months} monthly partitions under {archive.shard(shard).directory}/."
+        )
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
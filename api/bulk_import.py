@@ -0,0 +1,353 @@
+"""
+Bulk import of historical applications from partner CSV or NDJSON dumps.
+
+Usage:
+    python -m api.bulk_import FILE [--format csv|ndjson] [--workers 4]
+        [--chunk-size 1000] [--checkpoint FILE] [--rejects FILE] [--source ID]
+
+Records:
+    NDJSON  one ApplicationRequest per line, e.g.
+            {"borrower": {...}, "requested_amount": "25000.00"}
+    CSV     a header with the BorrowerRequest fields, ssn and requested_amount
+Both may also carry open_credit_lines (the credit check result at the time;
+the random stub is used when missing) and created_at (ISO 8601, kept as the
+application's creation time).
+
+The file flows through a generator pipeline, so memory is bounded by the
+chunks in flight, not by the file size:
+    read     stream records from the file, skipping those already imported
+    prepare  in a process pool, per chunk: parse, validate against
+             ApplicationRequest, normalize/hash/encrypt the SSN and run the
+             decision rules (compute_offer)
+    write    in this process, per chunk: resolve borrowers by fingerprint,
+             insert the applications, one transaction per chunk (and per
+             shard, see api.sharding)
+
+Invalid records go to the rejects file (NDJSON: record number, error and the
+raw record) and are skipped. After every committed chunk the checkpoint
+records how far the import got; a re-run resumes from there. Application ids
+are derived from the source (by default the sha256 of the file's content;
+--source names it instead) and the record number, and existing ids are
+skipped on insert (counted as skipped, not imported), so a chunk committed
+just before a crash is never imported twice, while another file of the same
+name is imported in full. The checkpoint keeps its source: it can't be
+resumed with another file. Likewise a resumed run first
+drops the rejects past the checkpoint, which it is about to write again; a
+fresh run starts a new rejects file.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from random import randint
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+from api.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from api.crypto import SSNMaterial, prepare_ssn
+from api.helpers import decision_values, find_or_create_borrowers, insert_ignoring_conflicts
+from api.listing import to_naive_utc
+from api.models import Application
+from api.schemas import ApplicationRequest, BorrowerRequest
+from api.sharding import ShardMap, bucket_of_hash
+from api.stats import record_decisions
+from api.utils import bucketed_uuid, load_env_file
+
+IMPORT_CHUNK_SIZE = 1000
+# Namespace of the application ids derived from (file name, record number)
+IMPORT_NAMESPACE = uuid.UUID("6f1c1c1e-6a3b-4f57-9b7e-3d0a6c8f2b10")
+
+BORROWER_FIELDS = tuple(BorrowerRequest.model_fields)
+
+
+@dataclass
+class ImportProgress:
+    records: int = 0   # records read, imported, skipped or rejected
+    imported: int = 0
+    rejected: int = 0
+    skipped: int = 0   # valid, but already imported by an earlier run
+    source: str = ""   # what the application ids are derived from (see file_source)
+
+
+@dataclass
+class PreparedRecord:
+    """A valid record, ready to write. Built in a worker process."""
+    number: int
+    request: ApplicationRequest
+    ssn: SSNMaterial
+    values: dict  # Application columns, borrower_id excepted
+
+
+# Stage 1: read
+
+def read_records(path: str, fmt: str, skip: int = 0) -> Iterator[Tuple[int, Union[str, dict]]]:
+    """
+    (record number, raw record) pairs, numbered from 1. NDJSON lines are
+    yielded unparsed (parsing happens in the workers), CSV rows as dicts.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            records = csv.DictReader(f)
+        else:
+            records = (line.rstrip("\r\n") for line in f if line.strip())
+        for number, raw in enumerate(records, start=1):
+            if number > skip:
+                yield number, raw
+
+
+def _chunks(iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# Stage 2: prepare (runs in the worker processes)
+
+def _csv_to_record(row: dict) -> dict:
+    row = {key: value for key, value in row.items() if value not in ("", None)}
+    borrower = {field: row.pop(field) for field in BORROWER_FIELDS if field in row}
+    return dict(row, borrower=borrower)
+
+
+def file_source(path: str) -> str:
+    """The default source of a file: the sha256 of its content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def application_id_for(source: str, number: int, bucket: Optional[int] = None) -> str:
+    """Derived from the record, with the borrower's shard bucket like api.utils.generate_uuid."""
+    value = uuid.uuid5(IMPORT_NAMESPACE, f"{source}:{number}")
+    return f"application_{bucketed_uuid(value, bucket) if bucket is not None else value}"
+
+
+def _prepare_record(source: str, number: int, raw) -> PreparedRecord:
+    record = json.loads(raw) if isinstance(raw, str) else _csv_to_record(raw)
+    if not isinstance(record, dict):
+        raise ValueError("Record is not an object")
+    request = ApplicationRequest.model_validate(record)
+
+    open_credit_lines = record.get("open_credit_lines")
+    open_credit_lines = randint(0, 100) if open_credit_lines is None else int(open_credit_lines)
+    if not 0 <= open_credit_lines <= 100:
+        raise ValueError("open_credit_lines must be between 0 and 100")
+
+    # Encrypt here, on the pool, rather than in the writer process
+    ssn = prepare_ssn(request.borrower.ssn, encrypt=True)
+    values = decision_values(request.requested_amount, open_credit_lines)
+    values["application_id"] = application_id_for(source, number, bucket_of_hash(ssn.ssn_hash))
+    created_at = record.get("created_at")
+    # Every row of a chunk must have the same keys for one executemany
+    values["created_at"] = values["updated"] = (
+        to_naive_utc(datetime.fromisoformat(created_at)) if created_at else datetime.utcnow()
+    )
+    return PreparedRecord(number, request, ssn, values)
+
+
+def prepare_chunk(source: str, chunk: list) -> Tuple[List[PreparedRecord], List[dict]]:
+    """Prepared records and rejects of one chunk of (number, raw) pairs."""
+    prepared, rejects = [], []
+    for number, raw in chunk:
+        try:
+            prepared.append(_prepare_record(source, number, raw))
+        except ValidationError as e:
+            rejects.append({"record": number, "error": "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            ), "raw": raw})
+        except (ValueError, TypeError) as e:
+            rejects.append({"record": number, "error": str(e), "raw": raw})
+    return prepared, rejects
+
+
+# Stage 3: write
+
+def write_chunk(db: Session, prepared: List[PreparedRecord]) -> int:
+    """
+    Borrowers, applications and their statistics of one chunk, in one
+    transaction. Returns how many were written, the others existed already.
+    """
+    if prepared:
+        # Skip records a previous run already committed (see the module docstring)
+        existing = set(db.execute(
+            select(Application.application_id)
+            .where(Application.application_id.in_([p.values["application_id"] for p in prepared]))
+        ).scalars())
+        prepared = [p for p in prepared if p.values["application_id"] not in existing]
+    if prepared:
+        borrowers = find_or_create_borrowers(db, [p.request.borrower for p in prepared], [p.ssn for p in prepared])
+        rows = [dict(p.values, borrower_id=borrower.id) for p, borrower in zip(prepared, borrowers)]
+        insert_ignoring_conflicts(db, Application, rows, "application_id")
+        record_decisions(db, rows)
+    db.commit()
+    return len(prepared)
+
+
+def _open_rejects(path: str, resume_after: int):
+    """
+    The rejects file, for appending. A resumed run keeps the rejects up to
+    its checkpoint only: later ones were written by a run that crashed
+    before checkpointing them, and are about to be written again.
+    """
+    if not resume_after or not os.path.exists(path):
+        return open(path, "w", encoding="utf-8")
+    tmp = f"{path}.tmp"
+    with open(path, encoding="utf-8") as old, open(tmp, "w", encoding="utf-8") as kept:
+        for line in old:
+            if line.strip() and json.loads(line)["record"] <= resume_after:
+                kept.write(line)
+    os.replace(tmp, path)
+    return open(path, "a", encoding="utf-8")
+
+
+def _prepared_chunks(chunks, source: str, workers: int):
+    """prepare_chunk over chunks, in order, on a pool with a bounded read-ahead."""
+    if workers <= 0:
+        for chunk in chunks:
+            yield chunk, prepare_chunk(source, chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append((chunk, pool.submit(prepare_chunk, source, chunk)))
+            # Keep the pool busy without reading the whole file ahead
+            if len(in_flight) >= workers * 2:
+                done_chunk, future = in_flight.popleft()
+                yield done_chunk, future.result()
+        while in_flight:
+            done_chunk, future = in_flight.popleft()
+            yield done_chunk, future.result()
+
+
+def import_file(
+        engine: Union[Engine, Sequence[Engine]],
+        path: str,
+        fmt: Optional[str] = None,
+        workers: int = 0,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        checkpoint: Optional[str] = None,
+        rejects_path: Optional[str] = None,
+        progress_every: float = 0.0,
+        max_chunks: Optional[int] = None,
+        shard_map: Optional[ShardMap] = None,
+        source: Optional[str] = None
+) -> ImportProgress:
+    """
+    Import every record of path. Returns the counters of the whole import,
+    including parts done by earlier interrupted runs. max_chunks stops
+    early (the checkpoint is kept), mostly for tests.
+
+    engine may be the engines of every shard, with the shard_map routing
+    each record to its borrower's shard. source defaults to file_source(path).
+    """
+    engines = [engine] if isinstance(engine, Engine) else list(engine)
+    shard_map = shard_map or ShardMap.default(len(engines))
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    source = source or file_source(path)
+    progress = load_checkpoint(checkpoint, ImportProgress)
+    if progress.source and progress.source != source:
+        raise ValueError(f"Checkpoint {checkpoint} is of another source ({progress.source}), not {source}")
+    progress.source = source
+    rejects_file = _open_rejects(rejects_path, progress.records) if rejects_path else None
+
+    started, resumed_at, last_report = time.monotonic(), progress.records, 0.0
+    chunks = _chunks(read_records(path, fmt, skip=progress.records), chunk_size)
+    completed = True
+    try:
+        for done, (chunk, (prepared, rejects)) in enumerate(_prepared_chunks(chunks, source, workers)):
+            if max_chunks is not None and done >= max_chunks:
+                completed = False
+                break
+            by_shard = defaultdict(list)
+            for record in prepared:
+                by_shard[shard_map.shard_of_hash(record.ssn.ssn_hash)].append(record)
+            written = 0
+            for shard, records in by_shard.items():
+                with Session(engines[shard], autoflush=False, expire_on_commit=False) as db:
+                    written += write_chunk(db, records)
+            if rejects_file:
+                rejects_file.writelines(json.dumps(reject) + "\n" for reject in rejects)
+                rejects_file.flush()
+
+            progress.records = chunk[-1][0]
+            progress.imported += written
+            progress.skipped += len(prepared) - written
+            progress.rejected += len(rejects)
+            save_checkpoint(checkpoint, progress)
+
+            now = time.monotonic()
+            if progress_every and now - last_report >= progress_every:
+                last_report = now
+                rate = (progress.records - resumed_at) / max(now - started, 1e-9)
+                print(
+                    f"{progress.records} records ({progress.imported} imported, "
+                    f"{progress.skipped} skipped, {progress.rejected} rejected), {rate:.0f} records/s",
+                    file=sys.stderr, flush=True,
+                )
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+    if completed:
+        clear_checkpoint(checkpoint)
+    return progress
+
+
+def main():
+    load_env_file()
+    parser = argparse.ArgumentParser(description="Import historical applications from a CSV or NDJSON file.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: from the file extension")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for parsing, validation and crypto (0: in this process)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", help="default: <file>.checkpoint.json")
+    parser.add_argument("--rejects", help="default: <file>.rejects.ndjson")
+    parser.add_argument("--source", help="id the application ids derive from (default: sha256 of the file)")
+    args = parser.parse_args()
+
+    from api.migrations import upgrade
+    from api.sharding import default_shards
+
+    shards = default_shards()
+    for engine in shards.engines:
+        upgrade(engine)
+    started = time.monotonic()
+    try:
+        progress = import_file(
+            shards.engines,
+            args.path,
+            fmt=args.format,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            checkpoint=args.checkpoint or f"{args.path}.checkpoint.json",
+            rejects_path=args.rejects or f"{args.path}.rejects.ndjson",
+            progress_every=5.0,
+            shard_map=shards.map,
+            source=args.source,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.monotonic() - started
+    print(
+        f"Done: {progress.records} records, {progress.imported} imported, "
+        f"{progress.skipped} skipped, {progress.rejected} rejected in {elapsed:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Read-through response cache for GET /applications/{application_id}.
+
+Applications never change once created, so their rendered JSON bodies can be
+cached by application_id. The cache is filled on write (POST) and on the first
+read, and also remembers IDs that were not found (negative caching) for a
+shorter time so scans with bad IDs don't reach the database.
+
+Backends, picked with APP_CACHE_BACKEND:
+    memory (default)  in-process LRU bounded by APP_CACHE_MAX_SIZE entries
+    redis             shared between workers, needs the `redis` package and REDIS_URL
+    none              caching disabled
+
+APP_CACHE_TTL_SECONDS and APP_CACHE_NEGATIVE_TTL_SECONDS bound entry lifetimes.
+
+Request handlers use the *_async methods: the Redis backend runs its calls in
+the thread pool there, so a round trip to Redis never blocks the event loop.
+The cache fails open: a Redis error is logged and counted, and the lookup
+is a miss (the database answers) or the write is skipped.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# get() results besides a cached body
+MISS = object()
+NOT_FOUND = object()
+
+# Keys deleted per UNLINK by RedisResponseCache.clear()
+REDIS_CLEAR_BATCH = 500
+
+
+class ResponseCache:
+    """Interface shared by the cache backends."""
+
+    def __init__(self):
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.errors = 0  # backend failures, answered as misses or skipped writes
+
+    def get(self, key: str):
+        """Cached JSON body (bytes), NOT_FOUND for a cached 404, or MISS."""
+        raise NotImplementedError
+
+    def set(self, key: str, body: bytes) -> None:
+        raise NotImplementedError
+
+    def set_not_found(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    # In-process backends answer inline; network backends override these
+    async def get_async(self, key: str):
+        return self.get(key)
+
+    async def set_async(self, key: str, body: bytes) -> None:
+        self.set(key, body)
+
+    async def set_not_found_async(self, key: str) -> None:
+        self.set_not_found(key)
+
+    def _count(self, result):
+        if result is MISS:
+            self.misses += 1
+        elif result is NOT_FOUND:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return result
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
+
+
+class NullResponseCache(ResponseCache):
+    """Caching disabled: every lookup is a miss."""
+
+    def get(self, key: str):
+        return self._count(MISS)
+
+    def set(self, key: str, body: bytes) -> None:
+        pass
+
+    def set_not_found(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class LRUResponseCache(ResponseCache):
+    """
+    In-process LRU with a size bound and per-entry TTL. With max_bytes the
+    cached bodies are also bounded by their total length.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, negative_ttl: float = 30.0,
+                 max_bytes: Optional[int] = None):
+        super().__init__()
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, body or NOT_FOUND)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(value) -> int:
+        return len(value) if isinstance(value, bytes) else 0
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return self._count(MISS)
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._bytes -= self._size(value)
+                return self._count(MISS)
+            self._entries.move_to_end(key)
+            return self._count(value)
+
+    def _put(self, key: str, value, ttl: float) -> None:
+        with self._lock:
+            replaced = self._entries.pop(key, None)
+            if replaced is not None:
+                self._bytes -= self._size(replaced[1])
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += self._size(value)
+            while len(self._entries) > self.max_size or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes and self._entries):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def set(self, key: str, body: bytes) -> None:
+        self._put(key, body, self.ttl)
+
+    def set_not_found(self, key: str) -> None:
+        self._put(key, NOT_FOUND, self.negative_ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(size=len(self._entries), max_size=self.max_size, bytes=self._bytes)
+        return stats
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache shared by every worker, bodies stored in Redis with native TTLs."""
+
+    _NOT_FOUND_MARKER = b"\x00404"
+
+    def __init__(
+            self,
+            url: str,
+            ttl: float = 300.0,
+            negative_ttl: float = 30.0,
+            prefix: str = "application:",
+            client=None,
+    ):
+        super().__init__()
+        try:
+            import redis
+        except ImportError as e:
+            if client is None:
+                raise RuntimeError("APP_CACHE_BACKEND=redis requires the 'redis' package") from e
+            self._errors = (OSError,)
+        else:
+            # Connection errors and timeouts are RedisErrors, socket errors OSErrors
+            self._errors = (redis.RedisError, OSError)
+        self._client = client if client is not None else redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+
+    def _failed(self, operation: str, key: str) -> None:
+        self.errors += 1
+        logger.warning("Redis %s of %s failed, cache bypassed", operation, key, exc_info=True)
+
+    def get(self, key: str):
+        try:
+            raw = self._client.get(self.prefix + key)
+        except self._errors:
+            self._failed("get", key)
+            return self._count(MISS)
+        if raw is None:
+            return self._count(MISS)
+        if raw == self._NOT_FOUND_MARKER:
+            return self._count(NOT_FOUND)
+        return self._count(raw)
+
+    def set(self, key: str, body: bytes) -> None:
+        self._put(key, body, self.ttl)
+
+    def set_not_found(self, key: str) -> None:
+        self._put(key, self._NOT_FOUND_MARKER, self.negative_ttl)
+
+    def _put(self, key: str, value: bytes, ttl: float) -> None:
+        try:
+            self._client.set(self.prefix + key, value, px=int(ttl * 1000))
+        except self._errors:
+            self._failed("set", key)
+
+    def clear(self) -> None:
+        keys = []
+        for key in self._client.scan_iter(match=self.prefix + "*", count=REDIS_CLEAR_BATCH):
+            keys.append(key)
+            if len(keys) == REDIS_CLEAR_BATCH:
+                self._client.unlink(*keys)
+                keys = []
+        if keys:
+            self._client.unlink(*keys)
+
+    async def get_async(self, key: str):
+        return await run_in_threadpool(self.get, key)
+
+    async def set_async(self, key: str, body: bytes) -> None:
+        await run_in_threadpool(self.set, key, body)
+
+    async def set_not_found_async(self, key: str) -> None:
+        await run_in_threadpool(self.set_not_found, key)
+
+
+def build_response_cache() -> ResponseCache:
+    """Cache backend configured by the APP_CACHE_* environment variables."""
+    backend = os.environ.get("APP_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.environ.get("APP_CACHE_TTL_SECONDS", 300))
+    negative_ttl = float(os.environ.get("APP_CACHE_NEGATIVE_TTL_SECONDS", 30))
+
+    if backend == "none":
+        return NullResponseCache()
+    if backend == "memory":
+        max_size = int(os.environ.get("APP_CACHE_MAX_SIZE", 10000))
+        return LRUResponseCache(max_size=max_size, ttl=ttl, negative_ttl=negative_ttl)
+    if backend == "redis":
+        url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+        return RedisResponseCache(url, ttl=ttl, negative_ttl=negative_ttl)
+    raise ValueError(f"Unknown APP_CACHE_BACKEND: {backend}")
@@ -0,0 +1,35 @@
+"""
+Progress checkpoints for the resumable batch jobs (api.rotation, api.bulk_import).
+
+A checkpoint is a dataclass saved as JSON. Saves are atomic (write to a
+temporary file, then rename), so a crash never leaves a torn checkpoint.
+"""
+import json
+import os
+from dataclasses import asdict
+from typing import Optional, Type, TypeVar
+
+T = TypeVar("T")
+
+
+def load_checkpoint(path: Optional[str], cls: Type[T]) -> T:
+    """The saved progress, or a fresh cls() if there is none."""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return cls(**json.load(f))
+    return cls()
+
+
+def save_checkpoint(path: Optional[str], progress) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(asdict(progress), f)
+    os.replace(tmp, path)
+
+
+def clear_checkpoint(path: Optional[str]) -> None:
+    """Called when a run completes, so the next run starts over."""
+    if path and os.path.exists(path):
+        os.remove(path)
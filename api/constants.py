@@ -1,5 +1,9 @@
 """
 Business rules and constants for loan application processing.
+
+compute_offer reads its tiers from api/rules/decision_table.json; the
+amount, credit line and tier constants below describe the shipped table
+(tests pin the two together) and name the tiers in the statistics.
 """
 from decimal import Decimal
 
@@ -24,4 +28,34 @@ TIER_1_RATE = 10.0
 
 # Tier 2: 10-50 credit lines
 TIER_2_TERM = 24
-TIER_2_RATE = 20.0
\ No newline at end of file
+TIER_2_RATE = 20.0
+
+# Batch submission
+MAX_BATCH_SIZE = 500
+# Max fingerprints per IN (...) borrower lookup, kept well under SQLite's bound-parameter limit
+BORROWER_LOOKUP_CHUNK_SIZE = 500
+
+# GET /applications page sizes
+LIST_PAGE_SIZE = 50
+MAX_LIST_PAGE_SIZE = 500
+# Rows fetched from the database cursor (and sent) at a time by the export
+EXPORT_CHUNK_SIZE = 1000
+
+# GET /stats day range
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+
+# POST /quotes grid limits and memoized grids
+MAX_QUOTE_AMOUNTS = 100
+# Largest amount a quote takes (anything over MAX_LOAN_AMOUNT is denied anyway)
+MAX_QUOTE_AMOUNT = Decimal("1000000000")
+MAX_QUOTE_CREDIT_LINES = 101
+MAX_QUOTE_CELLS = 2000
+QUOTE_CACHE_MAX_SIZE = 1000
+# Rendered bytes kept in all, and the largest grid memoized (bigger ones are rendered each time)
+QUOTE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+QUOTE_CACHE_MAX_CELLS = 200
+
+# Hash sharding (api.sharding): ssn_hash -> one of SHARD_BUCKETS buckets -> shard.
+# Fixed: bucket numbers are part of every application_id and borrower_id.
+SHARD_BUCKETS = 1024
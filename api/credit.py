@@ -0,0 +1,242 @@
+"""
+Credit checks: how many open credit lines a borrower has.
+
+Providers, picked with CREDIT_PROVIDER:
+    random (default)  the stub used so far, randint(0, 100)
+    http              a remote credit bureau at CREDIT_BUREAU_URL
+
+The HTTP provider keeps one pooled httpx.AsyncClient for the process (reopened
+on first use after aclose(), so apps can shut down and start again), bounds
+the number of in-flight bureau calls with a semaphore, gives every attempt a
+timeout, retries transport errors and 5xx answers with jittered exponential
+backoff, and caches results by ssn_hash for CREDIT_CACHE_TTL_SECONDS so a
+re-application inside that window skips the bureau. Concurrent checks of the
+same SSN share one bureau call.
+
+The check runs before the request's database work, so no pooled database
+connection is held while waiting on the bureau.
+"""
+import asyncio
+import functools
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import List, Optional, Union
+
+import httpx
+
+from api.crypto import SSNMaterial
+
+
+class CreditCheckError(Exception):
+    """The bureau could not be reached or gave no usable answer."""
+
+
+class CreditCheckProvider:
+    """Interface shared by the credit check providers."""
+
+    async def open_credit_lines(self, ssn: SSNMaterial) -> int:
+        raise NotImplementedError
+
+    async def open_credit_lines_many(
+            self,
+            ssns: List[Union[SSNMaterial, Exception]]
+    ) -> List[Union[int, Exception]]:
+        """
+        Check many SSNs concurrently. Items that are already an exception
+        (invalid SSNs) and failed checks come back as exceptions, in place.
+        """
+        async def check(ssn):
+            if isinstance(ssn, Exception):
+                return ssn
+            return await self.open_credit_lines(ssn)
+        return list(await asyncio.gather(*(check(ssn) for ssn in ssns), return_exceptions=True))
+
+    def stats(self) -> dict:
+        return {"provider": type(self).__name__}
+
+    async def aclose(self) -> None:
+        pass
+
+
+class RandomCreditCheck(CreditCheckProvider):
+    """Stand-in for a real bureau."""
+
+    async def open_credit_lines(self, ssn: SSNMaterial) -> int:
+        return random.randint(0, 100)
+
+
+class _TTLCache:
+    """Small LRU of ssn_hash -> open credit lines, with a TTL per entry."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: int) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _parse_open_credit_lines(body) -> int:
+    """open_credit_lines of a bureau answer; ValueError unless an int in 0..100."""
+    value = body["open_credit_lines"]
+    # bool is an int subclass; floats and strings aren't accepted either
+    if type(value) is not int or not 0 <= value <= 100:
+        raise ValueError(f"open_credit_lines out of range: {value!r}")
+    return value
+
+
+class HTTPCreditCheck(CreditCheckProvider):
+    """
+    Credit bureau over HTTP: POST {base_url}{path} with {"ssn": "..."},
+    answered with {"open_credit_lines": <int>}.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            path: str = "/credit-check",
+            timeout: float = 2.0,
+            max_connections: int = 20,
+            max_concurrency: int = 20,
+            retries: int = 2,
+            backoff: float = 0.05,
+            cache_ttl: float = 300.0,
+            cache_max_size: int = 10000,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.path = path
+        self.retries = retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self._client_options = dict(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache = _TTLCache(cache_max_size, cache_ttl)
+        self._in_flight = {}  # ssn_hash -> Task shared by concurrent checks
+        self.calls = 0
+        self.retried = 0
+        self.failures = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def open_credit_lines(self, ssn: SSNMaterial) -> int:
+        cached = self._cache.get(ssn.ssn_hash)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        self.cache_misses += 1
+
+        # A task, not the first caller's coroutine: that request being
+        # cancelled doesn't cancel the call the others are waiting on
+        shared = self._in_flight.get(ssn.ssn_hash)
+        if shared is None:
+            shared = asyncio.get_running_loop().create_task(self._fetch_and_cache(ssn))
+            self._in_flight[ssn.ssn_hash] = shared
+            shared.add_done_callback(functools.partial(self._call_done, ssn.ssn_hash))
+        return await asyncio.shield(shared)
+
+    async def _fetch_and_cache(self, ssn: SSNMaterial) -> int:
+        value = await self._fetch(ssn)
+        self._cache.set(ssn.ssn_hash, value)
+        return value
+
+    def _call_done(self, ssn_hash: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(ssn_hash) is task:
+            del self._in_flight[ssn_hash]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller was cancelled
+
+    async def _fetch(self, ssn: SSNMaterial) -> int:
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.retried += 1
+                    # Full jitter: spread retries so a bureau hiccup doesn't
+                    # come back as a synchronized wave
+                    await asyncio.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+                self.calls += 1
+                if self._client is None:
+                    self._client = httpx.AsyncClient(**self._client_options)
+                try:
+                    response = await self._client.post(self.path, json={"ssn": ssn.normalized})
+                except httpx.TransportError:  # includes timeouts
+                    continue
+                if response.status_code >= 500:
+                    continue
+                try:
+                    response.raise_for_status()
+                    return _parse_open_credit_lines(response.json())
+                except (httpx.HTTPStatusError, KeyError, TypeError, ValueError) as e:
+                    self.failures += 1
+                    raise CreditCheckError("Invalid credit bureau response") from e
+        self.failures += 1
+        raise CreditCheckError("Credit bureau unavailable")
+
+    def stats(self) -> dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "provider": type(self).__name__,
+            "calls": self.calls,
+            "retried": self.retried,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "cache_size": len(self._cache),
+        }
+
+    async def aclose(self) -> None:
+        """Close the pooled connections; the next check opens a new client."""
+        client, self._client = self._client, None
+        # Both are bound to the closing event loop: the next app may run on another
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if client is not None:
+            await client.aclose()
+
+
+def build_credit_provider() -> CreditCheckProvider:
+    """Credit check provider configured by the CREDIT_* environment variables."""
+    provider = os.environ.get("CREDIT_PROVIDER", "random").lower()
+    if provider == "random":
+        return RandomCreditCheck()
+    if provider == "http":
+        url = os.environ.get("CREDIT_BUREAU_URL")
+        if not url:
+            raise RuntimeError("CREDIT_PROVIDER=http requires CREDIT_BUREAU_URL")
+        return HTTPCreditCheck(
+            url,
+            timeout=float(os.environ.get("CREDIT_TIMEOUT_SECONDS", 2.0)),
+            max_connections=int(os.environ.get("CREDIT_MAX_CONNECTIONS", 20)),
+            max_concurrency=int(os.environ.get("CREDIT_MAX_CONCURRENCY", 20)),
+            retries=int(os.environ.get("CREDIT_RETRIES", 2)),
+            cache_ttl=float(os.environ.get("CREDIT_CACHE_TTL_SECONDS", 300)),
+            cache_max_size=int(os.environ.get("CREDIT_CACHE_MAX_SIZE", 10000)),
+        )
+    raise ValueError(f"Unknown CREDIT_PROVIDER: {provider}")
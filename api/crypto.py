@@ -0,0 +1,149 @@
+"""
+SSN crypto service.
+
+A request's SSN is normalized and hashed exactly once into an SSNMaterial,
+which is then handed to find_or_create_borrower instead of the raw SSN.
+Encryption is done once too: lazily, only when a new borrower row is
+written, or up front on a worker pool.
+
+CRYPTO_WORKERS (default 0) sizes an optional thread pool. With workers, the
+async request path does the normalize/hash/encrypt work on the pool so the
+event loop keeps serving other requests during burst intake, and the batch
+API spreads bulk encryption over the pool.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
+
+from api.metrics import stage
+from api.security import (
+    encrypt_normalized_ssn,
+    hash_normalized_ssn,
+    normalize_ssn,
+    previous_normalized_ssn_hashes,
+)
+
+BATCH_CHUNK_SIZE = 64
+
+
+class SSNMaterial:
+    """
+    Normalized SSN with its hash and (lazily) its ciphertext.
+
+    previous_hashes are the hashes under retired SSN_HASH_KEY_PREVIOUS keys;
+    lookups accept them while a key rotation is in progress.
+    """
+    __slots__ = ("ssn_hash", "previous_hashes", "_normalized", "_encrypted")
+
+    def __init__(
+        self,
+        normalized: str,
+        ssn_hash: str,
+        encrypted: Optional[str] = None,
+        previous_hashes: Tuple[str, ...] = (),
+    ):
+        self._normalized = normalized
+        self.ssn_hash = ssn_hash
+        self.previous_hashes = previous_hashes
+        self._encrypted = encrypted
+
+    @property
+    def hash_candidates(self) -> Tuple[str, ...]:
+        """Current hash first, then the ones under retired keys."""
+        return (self.ssn_hash,) + self.previous_hashes
+
+    @property
+    def normalized(self) -> str:
+        """The plain SSN digits, for the credit bureau call only."""
+        return self._normalized
+
+    @property
+    def ssn_encrypted(self) -> str:
+        return self.encrypt()
+
+    def encrypt(self) -> str:
+        """Ciphertext of the SSN, computed on first use."""
+        if self._encrypted is None:
+            with stage("ssn_crypto"):
+                self._encrypted = encrypt_normalized_ssn(self._normalized)
+        return self._encrypted
+
+    def __repr__(self) -> str:
+        # Never show the SSN itself
+        return f"SSNMaterial(ssn_hash={self.ssn_hash[:8]}...)"
+
+
+def prepare_ssn(ssn: str, encrypt: bool = False) -> SSNMaterial:
+    """Normalize and hash an SSN once; optionally encrypt it right away."""
+    with stage("ssn_crypto"):
+        normalized = normalize_ssn(ssn)
+        encrypted = encrypt_normalized_ssn(normalized) if encrypt else None
+        return SSNMaterial(
+            normalized,
+            hash_normalized_ssn(normalized),
+            encrypted,
+            previous_normalized_ssn_hashes(normalized),
+        )
+
+
+def _encrypt_chunk(materials: List[SSNMaterial]) -> None:
+    for material in materials:
+        material.encrypt()
+
+
+class CryptoService:
+    """Entry point for SSN crypto, with an optional worker pool."""
+
+    def __init__(self, workers: int = 0):
+        self.workers = workers
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ssn-crypto") if workers > 0 else None
+        )
+
+    @classmethod
+    def from_env(cls) -> "CryptoService":
+        return cls(workers=int(os.environ.get("CRYPTO_WORKERS", 0)))
+
+    def prepare(self, ssn: str) -> SSNMaterial:
+        """Hash now, encrypt only if a new borrower needs it."""
+        return prepare_ssn(ssn)
+
+    async def prepare_async(self, ssn: str) -> SSNMaterial:
+        """
+        Off the event loop when a pool is configured; the ciphertext is
+        computed there too, so a new borrower costs no crypto on the loop.
+        """
+        if self._executor is None:
+            return prepare_ssn(ssn)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, prepare_ssn, ssn, True)
+
+    def prepare_many(self, ssns: List[str]) -> List[Union[SSNMaterial, ValueError]]:
+        """
+        Batch API: normalize and hash many SSNs. Items that fail
+        normalization come back as their ValueError, in place.
+        """
+        results = []
+        for ssn in ssns:
+            try:
+                results.append(prepare_ssn(ssn))
+            except ValueError as e:
+                results.append(e)
+        return results
+
+    def encrypt_many(self, materials: List[SSNMaterial]) -> None:
+        """Batch API: compute the ciphertext of many SSNs, spread over the pool."""
+        chunks = [materials[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(materials), BATCH_CHUNK_SIZE)]
+        if self._executor is None or len(chunks) < 2:
+            for chunk in chunks:
+                _encrypt_chunk(chunk)
+        else:
+            list(self._executor.map(_encrypt_chunk, chunks))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+crypto_service = CryptoService.from_env()
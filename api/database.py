@@ -0,0 +1,141 @@
+"""
+Database engines and the session dependency.
+
+Two modes, picked with the DB_ASYNC environment variable:
+  - sync (default): a regular Session; DB work runs in Starlette's thread pool
+  - async (DB_ASYNC=1): an AsyncSession on aiosqlite; DB work runs on the
+    event loop without taking a thread pool slot
+
+Engines are configured from api.storage (URL, pool, SQLite pragmas). The
+app owns a Database per shard (api.sharding, api.main.create_app); their engines are only built when
+first used, so they are created in each worker process after a fork, and
+connected by the app's startup.
+
+Scripts use the module level `engine` and `SessionLocal`, built from the
+environment (and .env) on first access.
+"""
+import asyncio
+import os
+from functools import cached_property
+from typing import Optional
+
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from api.storage import (
+    StorageSettings,
+    create_async_engine_from_settings,
+    create_engine_from_settings,
+    pool_stats,
+)
+
+
+def async_db_from_env() -> bool:
+    return os.environ.get("DB_ASYNC", "").lower() in ("1", "true", "yes")
+
+
+class Database:
+    """The engines and session factories of one app."""
+
+    def __init__(self, settings: StorageSettings, use_async: bool = False):
+        self.settings = settings
+        self.use_async = use_async
+
+    @cached_property
+    def engine(self) -> Engine:
+        return create_engine_from_settings(self.settings)
+
+    @cached_property
+    def SessionLocal(self) -> sessionmaker:
+        return sessionmaker(bind=self.engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+    @cached_property
+    def async_engine(self) -> AsyncEngine:
+        return create_async_engine_from_settings(self.settings)
+
+    @cached_property
+    def AsyncSessionLocal(self) -> async_sessionmaker:
+        return async_sessionmaker(bind=self.async_engine, autoflush=False, expire_on_commit=False)
+
+    def missing_tables(self, metadata) -> set:
+        """Tables of `metadata` that the database doesn't have."""
+        with self.engine.connect() as conn:
+            return set(metadata.tables) - set(inspect(conn).get_table_names())
+
+    async def warm_pool(self) -> int:
+        """
+        Open the serving engine's pool_size connections now (pragmas and
+        all) instead of on the first requests. Returns how many were opened.
+        """
+        size = 1 if self.settings.is_memory else self.settings.pool_size
+        if self.use_async:
+            connections = [await self.async_engine.connect() for _ in range(size)]
+            for conn in connections:
+                await conn.execute(text("SELECT 1"))
+            await asyncio.gather(*(conn.close() for conn in connections))
+        else:
+            await run_in_threadpool(self._warm_sync_pool, size)
+        return size
+
+    def _warm_sync_pool(self, size: int) -> None:
+        connections = [self.engine.connect() for _ in range(size)]
+        for conn in connections:
+            conn.execute(text("SELECT 1"))
+            conn.close()
+
+    def pool_stats(self) -> dict:
+        """Pool usage of the engine serving requests (empty until it's built)."""
+        name = "async_engine" if self.use_async else "engine"
+        return pool_stats(self.__dict__[name]) if name in self.__dict__ else {}
+
+    async def dispose(self) -> None:
+        if "async_engine" in self.__dict__:
+            await self.async_engine.dispose()
+        if "engine" in self.__dict__:
+            self.engine.dispose()
+
+
+_default: Optional[Database] = None
+
+
+def default_database() -> Database:
+    """The database configured by the environment (and .env), for scripts."""
+    global _default
+    if _default is None:
+        _default = Database(StorageSettings.from_env(), use_async=async_db_from_env())
+    return _default
+
+
+def __getattr__(name: str):
+    # `from api.database import engine` in scripts: built on first access
+    if name in ("engine", "SessionLocal", "async_engine", "AsyncSessionLocal"):
+        return getattr(default_database(), name)
+    if name == "DATABASE_URL":
+        return default_database().settings.url
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def get_db(request: Request):
+    """
+    Database session dependency: an api.sharding.ShardSessions, handing out
+    a Session or an AsyncSession (depending on DB_ASYNC) per shard used.
+    """
+    sessions = request.app.state.database.sessions()
+    try:
+        yield sessions
+    finally:
+        await sessions.close()
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Run a sync helper taking a Session as first argument, without blocking
+    the event loop: through AsyncSession.run_sync in async mode, in the
+    thread pool otherwise.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
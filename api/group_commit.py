@@ -0,0 +1,182 @@
+"""
+Group commit for POST /applications.
+
+SQLite has one writer at a time, and every commit waits for the WAL to be
+written. With one transaction per request, concurrent submissions queue up
+behind each other's commits. With GROUP_COMMIT on, the application writes
+of concurrent requests are gathered and committed together:
+
+  - A request with nothing being written leads a batch: it waits up to
+    GROUP_COMMIT_MAX_WAIT_MS for other writes to join (less once
+    GROUP_COMMIT_MAX_ROWS have), then they are all written in one
+    transaction (helpers.create_applications_grouped), in a session the
+    coalescer opens for the batch and closes once it is written. No
+    request's session is used: a request ending early can't close it
+    under the batch.
+  - Requests arriving meanwhile wait for their result. When the batch is
+    committed, the first of them leads the next batch with whatever has
+    queued up during the commit.
+
+With several shards (api.sharding) each shard's sessionmaker gathers its
+own batches, since a transaction can't span databases.
+
+Each write runs in a savepoint: a rejected row fails only its own request,
+a failed commit fails the whole batch. A request gets back its own saved
+Application, or its exception raised as if it had written alone.
+
+Environment:
+    GROUP_COMMIT               off    1/true to enable
+    GROUP_COMMIT_MAX_ROWS      64     writes per transaction
+    GROUP_COMMIT_MAX_WAIT_MS   2      how long a batch waits for more writes
+
+Only worth it with concurrent writers; a lone request pays up to the wait.
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from api.helpers import create_applications_grouped
+from api.metrics import registry
+
+BATCH_SIZE = registry.histogram(
+    "group_commit_batch_size", "Application writes per group commit.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+
+class _Write:
+    __slots__ = ("args", "result")
+
+    def __init__(self, args: tuple, result: asyncio.Future):
+        self.args = args
+        self.result = result
+
+
+class _Lane:
+    """The writes gathering for one database, and its sessionmaker."""
+    __slots__ = ("factory", "queue", "leading", "task", "full")
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.queue: List[_Write] = []
+        self.leading = False
+        self.task: Optional[asyncio.Task] = None
+        # Resolved when the gathering batch is full
+        self.full: Optional[asyncio.Future] = None
+
+
+async def _write_grouped(factory, writes: List[tuple]) -> list:
+    """create_applications_grouped in a session of its own, closed once the batch is written."""
+    if isinstance(factory, async_sessionmaker):
+        async with factory() as db:
+            return await db.run_sync(create_applications_grouped, writes)
+
+    # Opened, used and closed in the one worker thread, even if the awaiting task is cancelled
+    def write():
+        with factory() as db:
+            return create_applications_grouped(db, writes)
+
+    return await run_in_threadpool(write)
+
+
+class WriteCoalescer:
+    """Gathers concurrent create_application calls into shared transactions."""
+
+    def __init__(self, enabled: bool = False, max_rows: int = 64, max_wait: float = 0.002):
+        if max_rows < 1:
+            raise ValueError("GROUP_COMMIT_MAX_ROWS must be at least 1")
+        self.enabled = enabled
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.batches = 0
+        self.writes = 0
+        # By sessionmaker: writes only share a transaction on the same database
+        self._lanes: Dict[object, _Lane] = {}
+
+    @classmethod
+    def from_env(cls) -> "WriteCoalescer":
+        env = os.environ
+        return cls(
+            enabled=env.get("GROUP_COMMIT", "").lower() in ("1", "true", "yes"),
+            max_rows=int(env.get("GROUP_COMMIT_MAX_ROWS", 64)),
+            max_wait=float(env.get("GROUP_COMMIT_MAX_WAIT_MS", 2)) / 1000,
+        )
+
+    async def create_application(
+            self,
+            factory,
+            request,
+            ssn=None,
+            open_credit_lines=None,
+            idempotency_key=None,
+            idempotency_hash=None
+    ):
+        """
+        helpers.create_application, committed together with the concurrent
+        ones. factory is the sessionmaker (sync or async) of the database
+        to write to. The returned Application is detached: its session is
+        closed once the batch is committed.
+        """
+        loop = asyncio.get_running_loop()
+        write = _Write((request, ssn, open_credit_lines, idempotency_key, idempotency_hash), loop.create_future())
+        lane = self._lanes.get(factory)
+        if lane is None:
+            lane = self._lanes[factory] = _Lane(factory)
+        lane.queue.append(write)
+        if not lane.leading:
+            lane.leading = True
+            self._lead(lane, loop)
+        elif len(lane.queue) >= self.max_rows and lane.full is not None and not lane.full.done():
+            lane.full.set_result(None)
+        return await write.result
+
+    def _lead(self, lane: _Lane, loop) -> None:
+        # A task, not the leading request's coroutine: if that request is
+        # cancelled, the writes it carries still get their results
+        lane.full = loop.create_future()
+        lane.task = loop.create_task(self._write_batch(lane))
+
+    async def _write_batch(self, lane: _Lane) -> None:
+        batch: List[_Write] = []
+        try:
+            if len(lane.queue) < self.max_rows and self.max_wait > 0:
+                try:
+                    await asyncio.wait_for(asyncio.shield(lane.full), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            batch, lane.queue[:self.max_rows] = lane.queue[:self.max_rows], []
+            BATCH_SIZE.observe(len(batch))
+            self.batches += 1
+            self.writes += len(batch)
+            try:
+                results = await _write_grouped(lane.factory, [write.args for write in batch])
+            except Exception as e:
+                # The commit itself failed: nothing in the batch was saved
+                results = [e] * len(batch)
+            for write, result in zip(batch, results):
+                if write.result.done():
+                    continue
+                if isinstance(result, Exception):
+                    write.result.set_exception(result)
+                else:
+                    write.result.set_result(result)
+        finally:
+            for write in batch:
+                if not write.result.done():
+                    write.result.cancel()
+            if lane.queue:
+                self._lead(lane, asyncio.get_running_loop())
+            else:
+                lane.leading = False
+                lane.task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "batches": self.batches,
+            "writes": self.writes,
+            "mean_batch_size": self.writes / self.batches if self.batches else 0.0,
+        }
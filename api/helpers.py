@@ -1,92 +1,445 @@
+import re
 from decimal import Decimal
+from hashlib import sha256
 from random import randint
+from typing import List, Optional, Union
 from select import select
 
+from api.constants import BORROWER_LOOKUP_CHUNK_SIZE
 from api.models import Borrower, Application
 from api.rules.offer import compute_offer
 from api.schemas import BorrowerRequest, ApplicationRequest
+from api.sharding import bucket_of_hash
+from api.utils import generate_uuid
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from api.security import encrypt_ssn, hash_ssn
+from api.crypto import SSNMaterial, crypto_service, prepare_ssn
+from api.idempotency import store_response
+from api.metrics import stage
+from api.stats import record_decisions
 
+_NON_DIGITS_RE = re.compile(r"\D")
 
-def find_or_create_borrower(db: Session, b: BorrowerRequest) -> Borrower:
+# Scale of the Numeric(…, 2) application columns
+_CENT = Decimal("0.01")
+
+
+def borrower_fingerprint(b, ssn_hash: str) -> str:
     """
-    Check if borrower exists by matching ALL fields.
-    If exact match found, reuse, Otherwise create new borrower.
-    This preserves historical borrower state for each application.
+    Deterministic fingerprint of a borrower snapshot.
+    Fields are normalized (trimmed, case-folded, phone digits only) and
+    hashed together with the keyed ssn_hash, so the fingerprint carries no
+    readable PII and two submissions of the same person/details collide.
+    Works with a BorrowerRequest or a Borrower row.
     """
+    parts = (
+        ssn_hash,
+        _normalize_text(b.first_name),
+        _normalize_text(b.last_name),
+        _normalize_text(b.email),
+        _NON_DIGITS_RE.sub("", b.phone),
+        _normalize_text(b.address_street),
+        _normalize_text(b.city),
+        _normalize_text(b.state),
+        _normalize_text(b.zip_code),
+    )
+    return sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
 
-    existing = db.execute(
-        select(Borrower).where(
-            Borrower.first_name == b.first_name,
-            Borrower.last_name == b.last_name,
-            Borrower.email == b.email,
-            Borrower.phone == b.phone,
-            Borrower.ssn_hash == hash_ssn(b.ssn),
-            Borrower.address_street == b.address_street,
-            Borrower.city == b.city,
-            Borrower.state == b.state,
-            Borrower.zip_code == b.zip_code,
-        )
-    ).scalar_one_or_none()
 
-    if existing:
-        return existing
+def borrower_fingerprints(b, ssn: SSNMaterial) -> List[str]:
+    """
+    Fingerprints a borrower may be stored under: the current one first,
+    then those under retired hash keys (see api.rotation).
+    """
+    return [borrower_fingerprint(b, ssn_hash) for ssn_hash in ssn.hash_candidates]
+
+
+def _normalize_text(value: str) -> str:
+    return " ".join(value.split()).casefold()
+
 
-    new_borrower = Borrower(
+def _upsert_borrowers(db: Session, rows: List[dict]) -> None:
+    """
+    INSERT ... ON CONFLICT (fingerprint) DO NOTHING.
+    Concurrent submissions of the same borrower end up sharing one row.
+    """
+    insert_ignoring_conflicts(db, Borrower, rows, "fingerprint")
+
+
+def insert_ignoring_conflicts(db: Session, model, rows: List[dict], unique_column: str) -> None:
+    """INSERT ... ON CONFLICT (unique_column) DO NOTHING, on any dialect."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        db.execute(sqlite_insert(model).on_conflict_do_nothing(index_elements=[unique_column]), rows)
+    elif dialect == "postgresql":
+        db.execute(pg_insert(model).on_conflict_do_nothing(index_elements=[unique_column]), rows)
+    else:
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(model), [row])
+            except IntegrityError:
+                pass
+
+
+def _new_borrower_row(b: BorrowerRequest, ssn: SSNMaterial, fingerprint: str) -> dict:
+    return dict(
+        borrower_id=generate_uuid(prefix="borrower", bucket=bucket_of_hash(ssn.ssn_hash)),
         first_name=b.first_name,
         last_name=b.last_name,
         email=b.email,
         phone=b.phone,
-        ssn_encrypted=encrypt_ssn(b.ssn),
-        ssn_hash=hash_ssn(b.ssn),
+        ssn_encrypted=ssn.ssn_encrypted,
+        ssn_hash=ssn.ssn_hash,
+        fingerprint=fingerprint,
         address_street=b.address_street,
         city=b.city,
         state=b.state,
         zip_code=b.zip_code,
     )
-    db.add(new_borrower)
-    db.flush()
-    return new_borrower
 
 
-def create_application(db: Session, request: ApplicationRequest) -> Application:
+def find_or_create_borrower(
+        db: Session,
+        b: BorrowerRequest,
+        ssn: Optional[SSNMaterial] = None
+) -> Borrower:
     """
-    Create application with credit check performed at application time.
+    Check if borrower exists by matching ALL fields, via their fingerprint.
+    If exact match found, reuse, Otherwise create new borrower.
+    This preserves historical borrower state for each application.
+
+    ssn is the request's already hashed SSN (api.crypto); the SSN is only
+    encrypted if a new borrower row is written. During a hash key rotation
+    a row not yet rewritten is still found by its old fingerprint.
     """
-    borrower = find_or_create_borrower(db, request.borrower)
+    if ssn is None:
+        ssn = prepare_ssn(b.ssn)
+    fingerprint, *previous = borrower_fingerprints(b, ssn)
+    by_fingerprint = select(Borrower).where(Borrower.fingerprint == fingerprint)
+
+    if previous:
+        existing = _borrowers_by_fingerprint(db, [fingerprint, *previous])
+        match = next((existing[fp] for fp in (fingerprint, *previous) if fp in existing), None)
+    else:
+        match = db.execute(by_fingerprint).scalar_one_or_none()
+    if match:
+        return match
+
+    _upsert_borrowers(db, [_new_borrower_row(b, ssn, fingerprint)])
+    return db.execute(by_fingerprint).scalar_one()
 
-    # Credit check happens per application
-    open_credit_lines = randint(0, 100)
 
+def decision_values(requested_amount: Decimal, open_credit_lines: int) -> dict:
+    """
+    Run the decision rules: the Application column values they determine.
+    Decimals are at the columns' scale, as the database returns them, so a
+    saved record renders like a fetched one without being read back.
+    """
     # Calculate offer based on application's open credit lines and request amount
     loan_decision = compute_offer(
-        requested_amount=request.requested_amount,
+        requested_amount=requested_amount,
         open_credit_lines=open_credit_lines
     )
 
-    application_record = Application(
-            borrower_id=borrower.id,
-            requested_amount=Decimal(request.requested_amount),
-            application_status=loan_decision.status,
-            reason=loan_decision.reason,
-            open_credit_lines=open_credit_lines,
-            # Offer fields (nullable if denied)
-            interest_rate=(
-                Decimal(str(loan_decision.offer.interest_rate))
-                if loan_decision.offer else None
-            ),
-            term_months=(loan_decision.offer.term_months if loan_decision.offer else None),
-            monthly_payment=(
-                Decimal(loan_decision.offer.monthly_payment)
-                if loan_decision.offer else None
-            ),
+    return dict(
+        requested_amount=Decimal(requested_amount).quantize(_CENT),
+        application_status=loan_decision.status,
+        reason=loan_decision.reason,
+        open_credit_lines=open_credit_lines,
+        # Offer fields (nullable if denied)
+        interest_rate=(
+            Decimal(str(loan_decision.offer.interest_rate)).quantize(_CENT)
+            if loan_decision.offer else None
+        ),
+        term_months=(loan_decision.offer.term_months if loan_decision.offer else None),
+        monthly_payment=(
+            Decimal(loan_decision.offer.monthly_payment).quantize(_CENT)
+            if loan_decision.offer else None
+        ),
+    )
+
+
+def build_application_record(
+        borrower: Borrower,
+        request: ApplicationRequest,
+        open_credit_lines: int
+) -> Application:
+    """
+    Run the decision rules and build the (unsaved) Application row. Its
+    application_id carries the borrower's shard bucket (api.sharding).
+    """
+    return Application(
+        borrower_id=borrower.id,
+        application_id=generate_uuid(prefix="application", bucket=bucket_of_hash(borrower.ssn_hash)),
+        **decision_values(request.requested_amount, open_credit_lines)
+    )
+
+
+def create_application(
+        db: Session,
+        request: ApplicationRequest,
+        ssn: Optional[SSNMaterial] = None,
+        open_credit_lines: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
+        idempotency_hash: Optional[str] = None,
+        commit: bool = True
+) -> Application:
+    """
+    Create application with credit check performed at application time.
+    open_credit_lines is the result of the credit check (api.credit), done
+    by the caller before any database work; the random stub when omitted.
+    A claimed idempotency_key (api.idempotency) is completed with the
+    response in the same transaction; with idempotency_hash, the key was
+    claimed on another shard and a completed copy is stored here.
+
+    The generated columns (id, application_id, created_at) are set by the
+    flush, so the returned record is complete without a refresh(). With
+    commit=False it is left flushed in the caller's transaction.
+    """
+    with stage("borrower_lookup"):
+        borrower = find_or_create_borrower(db, request.borrower, ssn)
+
+    # Credit check happens per application
+    if open_credit_lines is None:
+        open_credit_lines = randint(0, 100)
+
+    with stage("decision"):
+        application_record = build_application_record(borrower, request, open_credit_lines)
+
+    with stage("commit"):
+        db.add(application_record)
+        db.flush()
+        # Dashboard counters move in the same transaction as the insert
+        record_decisions(db, [application_record])
+        if idempotency_key is not None:
+            store_response(db, idempotency_key, application_record, idempotency_hash)
+        if commit:
+            db.commit()
+    return application_record
+
+
+def create_applications_grouped(db: Session, writes: List[tuple]) -> List[Union[Application, Exception]]:
+    """
+    Group commit (api.group_commit): the create_application calls of many
+    requests in one transaction. writes holds each call's arguments after
+    db. Each one runs in a savepoint, so a failing write only fails itself.
+    Returns one entry per write: the saved Application or its exception.
+    """
+    results: List[Union[Application, Exception]] = []
+    for args in writes:
+        try:
+            with db.begin_nested():
+                results.append(create_application(db, *args, commit=False))
+        except (ValueError, SQLAlchemyError) as e:
+            results.append(e)
+    with stage("group_commit"):
+        db.commit()
+    return results
+
+
+def find_or_create_borrowers(
+        db: Session,
+        borrowers: List[BorrowerRequest],
+        ssns: List[SSNMaterial]
+) -> List[Borrower]:
+    """
+    Bulk version of find_or_create_borrower.
+    Probes the fingerprint index with one IN query per chunk and upserts
+    all missing borrowers in one statement.
+    Identical borrowers inside the same batch share one new row.
+    """
+    candidates = [borrower_fingerprints(b, ssn) for b, ssn in zip(borrowers, ssns)]
+    known = _borrowers_by_fingerprint(db, {fp for fps in candidates for fp in fps})
+
+    # Each borrower resolves to its first stored fingerprint, else the current one
+    fingerprints = [next((fp for fp in fps if fp in known), fps[0]) for fps in candidates]
+
+    missing = {}
+    for b, ssn, fingerprint in zip(borrowers, ssns, fingerprints):
+        if fingerprint not in known and fingerprint not in missing:
+            missing[fingerprint] = (b, ssn)
+
+    if missing:
+        # Only new borrowers need ciphertext; encrypt them together
+        crypto_service.encrypt_many([ssn for _, ssn in missing.values()])
+        _upsert_borrowers(db, [
+            _new_borrower_row(b, ssn, fingerprint) for fingerprint, (b, ssn) in missing.items()
+        ])
+        known.update(_borrowers_by_fingerprint(db, set(missing)))
+
+    return [known[fingerprint] for fingerprint in fingerprints]
+
+
+def _borrowers_by_fingerprint(db: Session, fingerprints) -> dict:
+    found = {}
+    fingerprints = list(fingerprints)
+    for start in range(0, len(fingerprints), BORROWER_LOOKUP_CHUNK_SIZE):
+        chunk = fingerprints[start:start + BORROWER_LOOKUP_CHUNK_SIZE]
+        for row in db.execute(select(Borrower).where(Borrower.fingerprint.in_(chunk))).scalars():
+            found[row.fingerprint] = row
+    return found
+
+
+# Columns needed to build an ApplicationResponse, see api.responses
+APPLICATION_RESPONSE_COLUMNS = (
+    Application.application_id,
+    Application.application_status,
+    Application.open_credit_lines,
+    Application.requested_amount,
+    Application.interest_rate,
+    Application.term_months,
+    Application.monthly_payment,
+    Application.reason,
+)
+
+# Built once: a Core select over the table columns, so executing it skips
+# both statement construction and ORM result loading.
+_applications = Application.__table__
+_APPLICATION_VALUES_QUERY = (
+    select(*(_applications.c[column.key] for column in APPLICATION_RESPONSE_COLUMNS))
+    .where(_applications.c.application_id == bindparam("application_id"))
+)
+
+
+def fetch_application_values(db: Session, application_id: str) -> Optional[tuple]:
+    """
+    Response column values of an application, or None.
+    Selects only those columns, so no ORM entity is built or tracked.
+    """
+    return db.connection().execute(_APPLICATION_VALUES_QUERY, {"application_id": application_id}).first()
+
+
+def create_applications_batch(
+        db: Session,
+        requests: List[ApplicationRequest],
+        ssns: Optional[List[Union[SSNMaterial, ValueError]]] = None,
+        open_credit_lines: Optional[List[Union[int, Exception]]] = None
+) -> List[Union[Application, Exception]]:
+    """
+    Create many applications in a single transaction.
+
+    Borrowers are resolved in bulk and all rows are committed once.
+    Returns one entry per request, in order: the saved Application,
+    or the exception that made that item fail. Failed items never
+    roll back the successful ones.
+
+    ssns and open_credit_lines, when given, hold one entry per request
+    (from CryptoService.prepare_many and the credit check provider); an
+    exception in either fails that item.
+    """
+    results: List[Union[Application, Exception, None]] = [None] * len(requests)
+    if ssns is None:
+        ssns = crypto_service.prepare_many([request.borrower.ssn for request in requests])
+    if open_credit_lines is None:
+        open_credit_lines = [randint(0, 100) for _ in requests]
+
+    # Per-item preparation: anything failing here only affects its own item
+    pending = []
+    for i, (request, ssn, credit) in enumerate(zip(requests, ssns, open_credit_lines)):
+        if isinstance(ssn, Exception):
+            results[i] = ssn
+        elif isinstance(credit, Exception):
+            results[i] = credit
+        else:
+            pending.append((i, request, ssn))
+
+    if not pending:
+        return results
+
+    try:
+        borrowers = find_or_create_borrowers(
+            db,
+            [request.borrower for _, request, _ in pending],
+            [ssn for _, _, ssn in pending],
         )
+        records = []
+        for (i, request, _), borrower in zip(pending, borrowers):
+            try:
+                record = build_application_record(borrower, request, open_credit_lines[i])
+            except ValueError as e:
+                results[i] = e
+                continue
+            records.append((i, record))
+
+        db.add_all([record for _, record in records])
+        db.flush()
+        record_decisions(db, [record for _, record in records])
+        db.commit()
+    except SQLAlchemyError:
+        # Some row was rejected by the database: redo the batch one item at a
+        # time inside savepoints so only the offending items fail.
+        db.rollback()
+        return _create_applications_one_by_one(db, requests, ssns, open_credit_lines, results)
+
+    for i, record in records:
+        results[i] = record
+    return results
 
-    db.add(application_record)
+
+def _create_applications_one_by_one(db: Session, requests, ssns, open_credit_lines, results) -> list:
+    """Slow path for create_applications_batch, still a single commit."""
+    saved = []
+    for i, request in enumerate(requests):
+        if results[i] is not None:
+            continue
+        try:
+            with db.begin_nested():
+                borrower = find_or_create_borrower(db, request.borrower, ssns[i])
+                record = build_application_record(borrower, request, open_credit_lines[i])
+                db.add(record)
+                db.flush()
+                record_decisions(db, [record])
+            saved.append((i, record))
+        except (ValueError, SQLAlchemyError) as e:
+            results[i] = e
     db.commit()
-    db.refresh(application_record)
-    return application_record
\ No newline at end of file
+
+    for i, record in saved:
+        results[i] = record
+    return results
+
+
+# Async versions. They run the sync helpers above through AsyncSession.run_sync,
+# so the logic lives in one place while every statement is awaited on the
+# async driver instead of blocking a thread. The request path calls
+# database.run_db instead, which takes either kind of session.
+
+async def find_or_create_borrower_async(
+        db: AsyncSession,
+        b: BorrowerRequest,
+        ssn: Optional[SSNMaterial] = None
+) -> Borrower:
+    """Async version of find_or_create_borrower."""
+    return await db.run_sync(find_or_create_borrower, b, ssn)
+
+
+async def create_application_async(
+        db: AsyncSession,
+        request: ApplicationRequest,
+        ssn: Optional[SSNMaterial] = None,
+        open_credit_lines: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
+        idempotency_hash: Optional[str] = None,
+        commit: bool = True
+) -> Application:
+    """Async version of create_application."""
+    return await db.run_sync(
+        create_application, request, ssn, open_credit_lines, idempotency_key, idempotency_hash, commit
+    )
+
+
+async def create_applications_batch_async(
+        db: AsyncSession,
+        requests: List[ApplicationRequest],
+        ssns: Optional[List[Union[SSNMaterial, ValueError]]] = None,
+        open_credit_lines: Optional[List[Union[int, Exception]]] = None
+) -> List[Union[Application, Exception]]:
+    """Async version of create_applications_batch."""
+    return await db.run_sync(create_applications_batch, requests, ssns, open_credit_lines)
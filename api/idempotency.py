@@ -0,0 +1,329 @@
+"""
+Idempotency keys for POST /applications.
+
+A client sending `Idempotency-Key: <key>` gets the same response for every
+retry of the same request, and the application is created only once:
+
+  1. The key is claimed by inserting a row without a response.
+  2. The application is created; the rendered response is stored on the
+     key's row in the same transaction (create_application(idempotency_key=)),
+     so a key is never completed without its application or vice versa.
+  3. Retries find the stored response, in the in-memory front cache or in
+     the table, and return it without running the decision pipeline.
+
+A retry arriving while the first request is still running waits for it:
+on an in-process event, or by polling the row when the first request is
+on another worker. A failed request releases its claim so it can be
+retried. Reusing a key with a different payload is an error (422).
+
+With several shards (api.sharding) a key's row lives on the shard its key
+hashes to, whatever the payload, so a key reused for another borrower is
+still found. When the application is written on another shard, a completed
+copy of the key's row is written with it, in its transaction, and the
+key's own row is completed right after (complete_key). If that fails, the
+request still succeeds: a retry (same payload, so same borrower shard)
+finds the copy, replays it and completes the key's row.
+
+Environment:
+    IDEMPOTENCY_TTL_SECONDS             86400  keys older than this are forgotten
+    IDEMPOTENCY_LOCK_SECONDS            30     a claim without response is abandoned after this
+    IDEMPOTENCY_WAIT_SECONDS            10     how long a concurrent retry waits (then 409)
+    IDEMPOTENCY_CACHE_MAX_SIZE          10000
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS  3600   background purge of expired keys (0 = off)
+
+Purge expired keys by hand:
+    python -m api.idempotency purge
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import Engine, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.cache import LRUResponseCache, MISS
+from api.database import run_db
+from api.metrics import registry
+from api.models import IdempotencyKey
+from api.responses import application_response_content, application_values, render_json
+from api.utils import load_env_file
+
+MAX_KEY_LENGTH = 255
+
+# claim_key() results besides a StoredResponse
+CLAIMED = object()
+IN_PROGRESS = object()
+
+IDEMPOTENCY_REQUESTS = registry.counter(
+    "idempotency_requests_total", "POST /applications with an Idempotency-Key, by outcome.", ("result",)
+)
+
+
+class IdempotencyError(Exception):
+    """The key can't be used for this request right now."""
+
+
+class IdempotencyKeyMismatch(IdempotencyError):
+    """The key was already used with a different payload."""
+
+
+class IdempotencyInProgress(IdempotencyError):
+    """The first request with this key is still running."""
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    request_hash: str
+    status_code: int
+    body: bytes
+
+
+def request_hash(payload, ssn_hash: str) -> str:
+    """
+    sha256 of the validated payload, to tell a retry from a reused key. The
+    SSN is replaced by its keyed ssn_hash (api.security): a plain hash of
+    the raw SSN could be brute-forced from the table.
+    """
+    borrower = payload.borrower.model_copy(update={"ssn": ssn_hash})
+    masked = payload.model_copy(update={"borrower": borrower})
+    return hashlib.sha256(masked.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def _row(db: Session, key: str):
+    table = IdempotencyKey.__table__
+    return db.execute(select(table).where(table.c.key == key)).first()
+
+
+def claim_key(db: Session, key: str, hash_: str, ttl: float, lock_timeout: float):
+    """
+    CLAIMED if this request now owns the key, the StoredResponse of a
+    completed request, or IN_PROGRESS while another request holds the claim.
+    Expired keys and abandoned claims are taken over.
+    """
+    table = IdempotencyKey.__table__
+    now = datetime.utcnow()
+    row = _row(db, key)
+    if row is None:
+        try:
+            db.execute(table.insert().values(key=key, request_hash=hash_, created_at=now))
+            db.commit()
+            return CLAIMED
+        except IntegrityError:
+            # Claimed by a concurrent request in between
+            db.rollback()
+            row = _row(db, key)
+
+    age = (now - row.created_at).total_seconds()
+    completed = row.response_body is not None
+    if age < (ttl if completed else lock_timeout):
+        if row.request_hash != hash_:
+            raise IdempotencyKeyMismatch(key)
+        if completed:
+            return StoredResponse(row.request_hash, row.status_code, row.response_body)
+        return IN_PROGRESS
+
+    taken = db.execute(
+        update(table)
+        .where(table.c.key == key, table.c.created_at == row.created_at)
+        .values(request_hash=hash_, created_at=now, application_id=None, status_code=None, response_body=None)
+    ).rowcount
+    db.commit()
+    return CLAIMED if taken else IN_PROGRESS
+
+
+def store_response(db: Session, key: str, application, request_hash: Optional[str] = None) -> bytes:
+    """
+    Complete a claimed key with the 201 response of a flushed application,
+    in the caller's transaction. Returns the rendered body.
+
+    With request_hash the key was claimed on another shard: a completed
+    copy of its row is written here instead (see completed_copy).
+    """
+    # The flushed record holds the values at column scale, as a GET renders them
+    body = render_json(application_response_content(application_values(application)))
+    if request_hash is None:
+        _set_response(db, key, application.application_id, body)
+        return body
+    table = IdempotencyKey.__table__
+    values = dict(request_hash=request_hash, created_at=datetime.utcnow(),
+                  application_id=application.application_id, status_code=201, response_body=body)
+    # A copy left from an expired earlier use of the key is replaced
+    if not db.execute(update(table).where(table.c.key == key).values(**values)).rowcount:
+        db.execute(table.insert().values(key=key, **values))
+    return body
+
+
+def completed_copy(db: Session, key: str, hash_: str, ttl: float):
+    """The unexpired completed copy of a key for this payload on the borrower's shard, or None."""
+    row = _row(db, key)
+    if row is None or row.response_body is None or row.request_hash != hash_:
+        return None
+    if (datetime.utcnow() - row.created_at).total_seconds() >= ttl:
+        return None
+    return row
+
+
+def complete_key(db: Session, key: str, application_id: str, body: bytes) -> None:
+    """store_response for an application committed on another shard, in a transaction of its own."""
+    _set_response(db, key, application_id, body)
+    db.commit()
+
+
+def _set_response(db: Session, key: str, application_id: str, body: bytes) -> None:
+    table = IdempotencyKey.__table__
+    db.execute(
+        update(table)
+        .where(table.c.key == key)
+        .values(application_id=application_id, status_code=201, response_body=body)
+    )
+
+
+def release_key(db: Session, key: str) -> None:
+    """Drop an unfinished claim so the request can be retried."""
+    table = IdempotencyKey.__table__
+    # The failed request may have left its transaction open
+    db.rollback()
+    db.execute(delete(table).where(table.c.key == key, table.c.response_body.is_(None)))
+    db.commit()
+
+
+def purge_expired(engine: Engine, ttl: float) -> int:
+    """Delete keys older than the TTL. Returns the number deleted."""
+    table = IdempotencyKey.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    with engine.begin() as conn:
+        return conn.execute(delete(table).where(table.c.created_at < cutoff)).rowcount
+
+
+class IdempotencyStore:
+    """Front cache and in-flight tracking in front of the idempotency_keys table."""
+
+    def __init__(self, ttl: float = 86400.0, lock_timeout: float = 30.0, wait: float = 10.0,
+                 cache_max_size: int = 10000, poll_interval: float = 0.05):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self._cache = LRUResponseCache(max_size=cache_max_size, ttl=min(ttl, 300.0))
+        self._inflight: Dict[str, asyncio.Event] = {}
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyStore":
+        env = os.environ
+        return cls(
+            ttl=float(env.get("IDEMPOTENCY_TTL_SECONDS", 86400)),
+            lock_timeout=float(env.get("IDEMPOTENCY_LOCK_SECONDS", 30)),
+            wait=float(env.get("IDEMPOTENCY_WAIT_SECONDS", 10)),
+            cache_max_size=int(env.get("IDEMPOTENCY_CACHE_MAX_SIZE", 10000)),
+        )
+
+    def _cached(self, key: str, hash_: str) -> Optional[StoredResponse]:
+        stored = self._cache.get(key)
+        if stored is MISS:
+            return None
+        if stored.request_hash != hash_:
+            raise IdempotencyKeyMismatch(key)
+        return stored
+
+    async def begin(self, db, key: str, hash_: str, copy_db=None) -> Optional[StoredResponse]:
+        """
+        The stored response to replay, or None when this request owns the key
+        and must run, then call finish(). Waits while another request with the
+        same key is running; raises IdempotencyInProgress if that takes too long.
+        copy_db is the borrower's shard when it isn't the key's (see
+        store_response): an unfinished key is looked up there too.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait
+        while True:
+            stored = self._cached(key, hash_)
+            if stored is not None:
+                IDEMPOTENCY_REQUESTS.inc("replayed")
+                return stored
+
+            event = self._inflight.get(key)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    IDEMPOTENCY_REQUESTS.inc("in_progress")
+                    raise IdempotencyInProgress(key)
+                continue
+
+            # Registered before the claim so duplicates in this process wait on it
+            event = self._inflight[key] = asyncio.Event()
+            try:
+                result = await run_db(db, claim_key, key, hash_, self.ttl, self.lock_timeout)
+                if copy_db is not None and not isinstance(result, StoredResponse):
+                    copy = await run_db(copy_db, completed_copy, key, hash_, self.ttl)
+                    if copy is not None:
+                        # The first request committed without completing the key: do it for it
+                        await run_db(db, complete_key, key, copy.application_id, copy.response_body)
+                        result = StoredResponse(hash_, 201, copy.response_body)
+            except BaseException:
+                self._done(key)
+                raise
+            if result is CLAIMED:
+                IDEMPOTENCY_REQUESTS.inc("claimed")
+                return None
+            self._done(key)
+
+            if isinstance(result, StoredResponse):
+                self._cache.set(key, result)
+                IDEMPOTENCY_REQUESTS.inc("replayed")
+                return result
+            # IN_PROGRESS on another worker: poll its row
+            if loop.time() >= deadline:
+                IDEMPOTENCY_REQUESTS.inc("in_progress")
+                raise IdempotencyInProgress(key)
+            await asyncio.sleep(self.poll_interval)
+
+    async def finish(self, db, key: str, hash_: str, body: Optional[bytes]) -> None:
+        """
+        End a claimed request: cache its stored 201 body, or release the
+        claim when it failed. Wakes up the requests waiting for it.
+        """
+        try:
+            if body is not None:
+                self._cache.set(key, StoredResponse(hash_, 201, body))
+            else:
+                await run_db(db, release_key, key)
+        finally:
+            self._done(key)
+
+    def _done(self, key: str) -> None:
+        event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    async def purge_periodically(self, engine: Engine, interval: float) -> None:
+        """Background task: purge expired keys every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(purge_expired, engine, self.ttl)
+
+
+def main():
+    load_env_file()
+    parser = argparse.ArgumentParser(description="Maintain the idempotency keys of POST /applications.")
+    parser.add_argument("command", choices=("purge",))
+    args = parser.parse_args()
+
+    from api.sharding import default_shards
+
+    if args.command == "purge":
+        ttl = IdempotencyStore.from_env().ttl
+        purged = sum(purge_expired(engine, ttl) for engine in default_shards().engines)
+        print(f"Purged {purged} expired idempotency keys.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Listing and export of applications.
+
+GET /applications pages newest first with keyset (cursor) pagination: the
+cursor holds the (created_at, id) of the last row sent, and the next page
+starts strictly after it. Every page is an index range scan on one of the
+composite indexes of Application, however deep the client pages, unlike
+OFFSET which reads and discards every skipped row.
+
+With several shards (api.sharding) every shard's page is read concurrently
+and the pages are merged. Rows are then ordered by (created_at, shard, id),
+and the cursor also holds the shard of the last row; on one shard that is
+the same order and the same cursor as before.
+
+GET /applications/export streams the same rows as NDJSON or CSV straight
+from a database cursor, EXPORT_CHUNK_SIZE rows at a time, so memory use does
+not depend on how many applications match.
+
+GET /borrowers/{borrower_id}/applications is one person's history. A new
+Borrower row is written whenever their details change, so it pages through
+the applications of every row sharing the borrower's ssn_hash (found with
+its index), in the same single joined query as the listing: no lazy load
+per borrower row.
+"""
+import base64
+import csv
+import heapq
+import io
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import Engine, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from api.constants import EXPORT_CHUNK_SIZE
+from api.crypto import prepare_ssn
+from api.helpers import APPLICATION_RESPONSE_COLUMNS
+from api.models import Application, ApplicationStatus, ApplicationStatusReason, Borrower
+from api.responses import application_list_item_content, render_json
+from api.security import decrypt_ssn, rotation_in_progress
+
+# APPLICATION_RESPONSE_COLUMNS, then the keyset and the borrower's public id
+LISTING_COLUMNS = APPLICATION_RESPONSE_COLUMNS + (
+    Application.created_at,
+    Application.id,
+    Borrower.borrower_id,
+)
+
+CSV_HEADER = (
+    "application_id", "borrower_id", "created_at", "decision", "open_credit_lines",
+    "requested_amount", "interest_rate", "term_months", "monthly_payment", "reason",
+)
+
+
+@dataclass(frozen=True)
+class ApplicationFilters:
+    status: Optional[ApplicationStatus] = None
+    reason: Optional[ApplicationStatusReason] = None
+    borrower_id: Optional[str] = None       # public borrower_id
+    created_from: Optional[datetime] = None  # inclusive
+    created_to: Optional[datetime] = None    # exclusive
+    ssn_hashes: Optional[Tuple[str, ...]] = None  # every snapshot of a person
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """created_at is stored as naive UTC; compare like with like."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# (created_at, id, shard) of the last row sent; (created_at, id) on shard 0
+Position = Union[Tuple[datetime, int, int], Tuple[datetime, int]]
+
+
+def encode_cursor(created_at: datetime, row_id: int, shard: int = 0) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}" + (f"|{shard}" if shard else "")
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Position:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, row_id, *shard = raw.split("|")
+        if len(shard) > 1:
+            raise ValueError(raw)
+        return datetime.fromisoformat(created_at), int(row_id), int(shard[0]) if shard else 0
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _after_condition(after: Position, shard: int):
+    """Rows of `shard` that come after the cursor position in (created_at, shard, id) order."""
+    created_at, row_id, *rest = after
+    cursor_shard = rest[0] if rest else 0
+    if shard == cursor_shard:
+        return tuple_(Application.created_at, Application.id) < (created_at, row_id)
+    if shard < cursor_shard:
+        return Application.created_at <= created_at
+    return Application.created_at < created_at
+
+
+def listing_query(filters: ApplicationFilters, after: Optional[Position] = None, shard: int = 0):
+    """Matching rows of a shard, newest first, optionally strictly after a cursor position."""
+    query = select(*LISTING_COLUMNS).join(Borrower, Application.borrower_id == Borrower.id)
+    if filters.status is not None:
+        query = query.where(Application.application_status == filters.status)
+    if filters.reason is not None:
+        query = query.where(Application.reason == filters.reason)
+    if filters.borrower_id is not None:
+        query = query.where(Borrower.borrower_id == filters.borrower_id)
+    if filters.ssn_hashes is not None:
+        snapshots = select(Borrower.id).where(Borrower.ssn_hash.in_(filters.ssn_hashes))
+        query = query.where(Application.borrower_id.in_(snapshots))
+    if filters.created_from is not None:
+        query = query.where(Application.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.where(Application.created_at < filters.created_to)
+    if after is not None:
+        query = query.where(_after_condition(after, shard))
+    return query.order_by(Application.created_at.desc(), Application.id.desc())
+
+
+def fetch_shard_rows(db: Session, filters: ApplicationFilters, limit: int,
+                     after: Optional[Position] = None, shard: int = 0) -> list:
+    """A shard's part of a page: its first limit + 1 rows after the cursor."""
+    # One extra row tells whether there is a next page
+    return db.connection().execute(listing_query(filters, after, shard).limit(limit + 1)).all()
+
+
+def merge_pages(rows_by_shard: Dict[int, list], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """The page made of the newest rows of every shard, and the cursor of the next one."""
+    if len(rows_by_shard) == 1:
+        (shard, rows), = rows_by_shard.items()
+        tagged = [(row, shard) for row in rows]
+    else:
+        tagged = sorted(
+            ((row, shard) for shard, rows in rows_by_shard.items() for row in rows),
+            key=lambda item: (item[0].created_at, item[1], item[0].id),
+            reverse=True,
+        )
+    next_cursor = None
+    if len(tagged) > limit:
+        tagged = tagged[:limit]
+        row, shard = tagged[-1]
+        next_cursor = encode_cursor(row.created_at, row.id, shard)
+    return [application_list_item_content(row) for row, _ in tagged], next_cursor
+
+
+def fetch_application_page(
+        db: Session,
+        filters: ApplicationFilters,
+        limit: int,
+        cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of applications as JSON-ready dicts, and the cursor of the
+    next page (None when this is the last one).
+    """
+    after = decode_cursor(cursor) if cursor else None
+    return merge_pages({0: fetch_shard_rows(db, filters, limit, after)}, limit)
+
+
+def borrower_ssn_hashes(db: Session, borrower_id: str) -> Optional[Tuple[str, ...]]:
+    """
+    The ssn_hash values a person's borrower rows can have, from one of the
+    rows' public borrower_id; None if there is no such borrower. During a
+    hash key rotation rows not yet rewritten still have the hash under a
+    retired key, so those are included.
+    """
+    row = db.connection().execute(
+        select(Borrower.ssn_hash, Borrower.ssn_encrypted).where(Borrower.borrower_id == borrower_id)
+    ).first()
+    if row is None:
+        return None
+    if not rotation_in_progress():
+        return (row.ssn_hash,)
+    ssn = prepare_ssn(decrypt_ssn(row.ssn_encrypted))
+    return tuple(dict.fromkeys((row.ssn_hash, *ssn.hash_candidates)))
+
+
+def fetch_borrower_history_page(
+        db: Session,
+        borrower_id: str,
+        limit: int,
+        cursor: Optional[str] = None
+) -> Optional[Tuple[List[dict], Optional[str]]]:
+    """
+    One page of a person's applications across all their borrower rows,
+    newest first, like fetch_application_page. None if the borrower
+    doesn't exist.
+    """
+    ssn_hashes = borrower_ssn_hashes(db, borrower_id)
+    if ssn_hashes is None:
+        return None
+    return fetch_application_page(db, ApplicationFilters(ssn_hashes=ssn_hashes), limit, cursor)
+
+
+def _csv_values(row) -> tuple:
+    (application_id, status, open_credit_lines, requested_amount,
+     interest_rate, term_months, monthly_payment, reason, created_at, _, borrower_id) = row
+    return (
+        application_id, borrower_id, created_at.isoformat(), status.value, open_credit_lines,
+        requested_amount, interest_rate, term_months, monthly_payment,
+        reason.value if reason is not None else None,
+    )
+
+
+def render_ndjson_chunk(rows) -> bytes:
+    return b"".join(render_json(application_list_item_content(row)) + b"\n" for row in rows)
+
+
+def render_csv_chunk(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_HEADER)
+    writer.writerows(_csv_values(row) for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def iter_export(engine: Engine, filters: ApplicationFilters, fmt: str,
+                chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Export chunks from a server-side cursor on its own connection.
+    A sync generator: Starlette iterates it in the thread pool.
+    """
+    if fmt == "csv":
+        yield render_csv_chunk((), header=True)
+    render = render_csv_chunk if fmt == "csv" else render_ndjson_chunk
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(listing_query(filters))
+        for rows in result.partitions():
+            yield render(rows)
+
+
+def iter_export_merged(engines: Sequence[Engine], filters: ApplicationFilters, fmt: str,
+                       chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    iter_export over every shard: a cursor per shard, merged in listing
+    order, so memory still doesn't depend on the number of rows.
+    """
+    if fmt == "csv":
+        yield render_csv_chunk((), header=True)
+    render = render_csv_chunk if fmt == "csv" else render_ndjson_chunk
+    def keyed(conn, shard):
+        result = conn.execution_options(yield_per=chunk_size).execute(listing_query(filters))
+        return ((row.created_at, shard, row.id, row) for row in result)
+
+    connections = [engine.connect() for engine in engines]
+    try:
+        streams = [keyed(conn, shard) for shard, conn in enumerate(connections)]
+        chunk = []
+        for *_, row in heapq.merge(*streams, key=lambda item: item[:3], reverse=True):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield render(chunk)
+                chunk = []
+        if chunk:
+            yield render(chunk)
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+async def aiter_export(engine: AsyncEngine, filters: ApplicationFilters, fmt: str,
+                       chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Async version of iter_export, streaming from the async driver."""
+    if fmt == "csv":
+        yield render_csv_chunk((), header=True)
+    render = render_csv_chunk if fmt == "csv" else render_ndjson_chunk
+    async with engine.connect() as conn:
+        result = await conn.stream(listing_query(filters).execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield render(rows)
@@ -1,103 +1,615 @@
-from fastapi import FastAPI, HTTPException, Depends
+"""
+The loan application API.
+
+create_app(settings) builds an app; the module level `app` is the one
+configured by the environment (`uvicorn api.main:app`). Importing this
+module doesn't touch the database: each app's startup (lifespan) connects,
+checks the schema and warms up, once per worker process. Schema changes
+are applied with `python -m api.migrations`. Serve on every core with
+`python -m api.serve` (see api/serve.py). With DATABASE_SHARD_URLS rows are
+spread over several databases (see api/sharding.py).
+
+Importing this module doesn't read .env either: `python -m api.serve` does,
+and uvicorn does with `--env-file .env`.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.archive import ApplicationArchive
+from api.cache import MISS, NOT_FOUND, build_response_cache
+from api.credit import CreditCheckError, build_credit_provider
+from api.crypto import crypto_service
+from api.constants import LIST_PAGE_SIZE, MAX_LIST_PAGE_SIZE, STATS_DEFAULT_DAYS, STATS_MAX_DAYS
+from api.database import get_db, run_db
+from api.group_commit import WriteCoalescer
+from api.helpers import create_application, create_applications_batch, fetch_application_values
+from api.idempotency import (
+    MAX_KEY_LENGTH,
+    IdempotencyInProgress,
+    IdempotencyKeyMismatch,
+    IdempotencyStore,
+    complete_key,
+    request_hash,
+)
+from api.listing import (
+    ApplicationFilters,
+    aiter_export,
+    decode_cursor,
+    fetch_borrower_history_page,
+    fetch_shard_rows,
+    iter_export,
+    iter_export_merged,
+    merge_pages,
+    to_naive_utc,
+)
+from api.metrics import CONTENT_TYPE, MetricsMiddleware, count_decision, registry, stage
+from api.models import Base, Application, ApplicationStatus, ApplicationStatusReason
+from api.profiling import ProfilingMiddleware
+from api.quotes import QuoteService
+from api.responses import FastJSONResponse, application_response_content, application_values, render_json
+from api.rules.decision_table import decision_rules
+from api.schemas import (
+    ApplicationResponse,
+    ApplicationRequest,
+    ApplicationListResponse,
+    BatchApplicationRequest,
+    BatchApplicationResponse,
+    BatchApplicationResult,
+    QuoteRequest,
+    QuoteResponse,
+    StatsResponse,
+)
+from api.security import load_keys
+from api.settings import AppSettings
+from api.sharding import ShardedDatabase, ShardSessions
+from api.stats import read_stats_rows, summarize_stats
+from pydantic import BaseModel, EmailStr, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Services below are shared by every app of the process (one per worker)
+
+# Response cache for GET /applications/{application_id}
+application_cache = build_response_cache()
+
+# Credit bureau client (CREDIT_PROVIDER), shared by all requests
+credit_provider = build_credit_provider()
+
+# Idempotency-Key handling for POST /applications
+idempotency_store = IdempotencyStore.from_env()
+
+# Group commit of concurrent application writes (GROUP_COMMIT), off by default
+write_coalescer = WriteCoalescer.from_env()
 
-from api.helpers import create_application
-from api.models import Base, Application, ApplicationStatus
-from api.schemas import ApplicationResponse, ApplicationRequest, OfferResponse
-from pydantic import BaseModel, EmailStr
+# What-if pricing for POST /quotes, memoized per decision table
+quote_service = QuoteService()
 
-# Load vars from .env
-load_dotenv()
+# Monthly partitions of archived applications (ARCHIVE_DIR), read-only
+archive = ApplicationArchive.from_env()
 
-# DB SETUP
-DATABASE_URL = "sqlite:///./app.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# Databases (shards) of the app serving in this process, set by create_app()
+database: Optional[ShardedDatabase] = None
 
-# CREATE TABLES
-Base.metadata.create_all(bind=engine)
 
-def get_db():
-    """Database session dependency."""
-    db = SessionLocal()
+# Scrape-time metrics: read from the pool, the cache and the bureau client
+def _pool_samples():
+    stats = database.pool_stats() if database is not None else {}
+    return {(state,): stats[state] for state in ("size", "checkedin", "checkedout", "overflow") if state in stats}
+
+
+def _cache_samples():
+    stats = application_cache.stats()
+    return {("hit",): stats["hits"], ("negative_hit",): stats["negative_hits"], ("miss",): stats["misses"]}
+
+
+def _credit_samples():
+    stats = credit_provider.stats()
+    return {(result,): stats[f"cache_{result}s"] for result in ("hit", "miss") if f"cache_{result}s" in stats}
+
+
+registry.callback("db_pool_connections", "Request engine's pool connections by state.", "gauge",
+                  ("state",), _pool_samples)
+registry.callback("application_cache_lookups_total", "GET /applications/{id} cache lookups by result.",
+                  "counter", ("result",), _cache_samples)
+registry.callback("credit_cache_lookups_total", "Credit bureau cache lookups by result.",
+                  "counter", ("result",), _credit_samples)
+
+
+# A submission that is never stored, to exercise the request path at startup
+_WARM_UP_REQUEST = {
+    "borrower": {
+        "first_name": "Warm", "last_name": "Up", "email": "warm.up@example.com", "phone": "555-123-4567",
+        "ssn": "000-00-0000", "address_street": "1 Main St", "city": "New York", "state": "NY",
+        "zip_code": "10001",
+    },
+    "requested_amount": "25000",
+}
+
+
+def _rehearse_submission(session) -> None:
+    # A full submission rolled back: first use of the validators, SSN crypto,
+    # decision rules and encoder, and every statement compiled into the
+    # engine's cache
+    request = ApplicationRequest.model_validate(_WARM_UP_REQUEST)
+    fetch_application_values(session, "warm-up")
     try:
-        yield db
+        record = create_application(session, request, crypto_service.prepare(request.borrower.ssn), 0, commit=False)
+        render_json(application_response_content(application_values(record)))
     finally:
-        db.close()
+        session.rollback()
 
-# API SETUP
-app = FastAPI()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def _warm_request_path(db: ShardedDatabase) -> None:
+    sessions = db.sessions()
+    try:
+        for session in sessions.all():
+            await run_db(session, _rehearse_submission)
+    finally:
+        await sessions.close()
+
+
+async def _warm_routes(app: FastAPI) -> None:
+    # FastAPI prepares its routes' dependency trees on the first request it routes
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/health", "raw_path": b"/health", "root_path": "", "query_string": b"", "headers": [],
+        "client": None, "server": ("warm-up", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def warm_up(app: FastAPI) -> dict:
+    """
+    Pay the one-time costs before the first request, and fail fast on a
+    broken setup (missing keys, tables or rules). Returns the seconds each
+    step took.
+    """
+    db: ShardedDatabase = app.state.database
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(name):
+        nonlocal start
+        now = time.perf_counter()
+        timings[name] = now - start
+        start = now
+
+    load_keys()
+    decision_rules.table()
+    lap("keys_and_rules")
+    missing = await asyncio.to_thread(db.missing_tables, Base.metadata)
+    if missing:
+        detail = ", ".join(f"shard {shard}: {sorted(tables)}" for shard, tables in missing.items())
+        raise RuntimeError(f"Database is missing tables ({detail}): run `python -m api.migrations`")
+    lap("schema_check")
+    await db.warm_pool()
+    lap("pool")
+    await _warm_request_path(db)
+    lap("request_path")
+    await _warm_routes(app)
+    lap("routes")
+    return timings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings: AppSettings = app.state.settings
+    db: ShardedDatabase = app.state.database
+    if settings.create_schema:
+        for engine in db.engines:
+            await asyncio.to_thread(Base.metadata.create_all, bind=engine)
+    if settings.warm_up:
+        timings = await warm_up(app)
+        logger.info("Warmed up in %.1f ms: %s", sum(timings.values()) * 1000,
+                    ", ".join(f"{name} {seconds * 1000:.1f}" for name, seconds in timings.items()))
+    purges = []
+    if settings.idempotency_purge_interval > 0:
+        # Every shard stores the keys of its buckets
+        purges = [
+            asyncio.create_task(idempotency_store.purge_periodically(engine, settings.idempotency_purge_interval))
+            for engine in db.engines
+        ]
+    yield
+    for purge in purges:
+        purge.cancel()
+    # Close the bureau client's pooled connections. The provider is shared by
+    # every app of the process and reopens them for the next one that starts
+    await credit_provider.aclose()
+    await db.dispose()
+    archive.close()
+
 
-@app.get("/health")
-def health():
+router = APIRouter()
+
+
+def create_app(settings: Optional[AppSettings] = None) -> FastAPI:
+    """
+    An app for `settings` (default: from the environment). Builds objects
+    only; connecting and warming up happen in its lifespan.
+    """
+    global database
+    settings = settings or AppSettings.from_env()
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.database = database = ShardedDatabase.from_settings(
+        settings.storage, settings.shard_urls, use_async=settings.db_async, map_path=settings.shard_map_path
+    )
+    app.include_router(router)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(MetricsMiddleware)
+    # Sampling profiler (PROFILE_SAMPLE_RATE / PROFILE_TOKEN), not installed when off
+    if settings.profiling.enabled:
+        app.add_middleware(ProfilingMiddleware, settings=settings.profiling)
+    return app
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+    )
+
+
+@router.get("/health")
+async def health(request: Request):
     """Health check endpoint."""
-    return {"ok": True}
+    return {
+        "ok": True,
+        "db_pool": request.app.state.database.pool_stats(),
+        "application_cache": application_cache.stats(),
+        "credit": credit_provider.stats(),
+        "decision_table": decision_rules.stats(),
+        "quote_cache": quote_service.stats(),
+        "group_commit": write_coalescer.stats(),
+        "archive": archive.stats(),
+    }
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Request, stage latency, pool and cache metrics in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
 
 
-@app.post("/applications", response_model=ApplicationResponse, status_code=201)
-def post_application(payload: ApplicationRequest, db: Session = Depends(get_db)):
-    """Submit a new application."""
+@router.get("/stats", response_model=StatsResponse)
+async def get_stats(
+        from_day: Optional[date] = None,
+        to_day: Optional[date] = None,
+        db: ShardSessions = Depends(get_db),
+):
+    """
+    Decision statistics per day (UTC) over [from_day, to_day], by default
+    the last 30 days. Read from the maintained counters, not the
+    applications, of every shard at once.
+    """
+    to_day = to_day or datetime.utcnow().date()
+    from_day = from_day or to_day - timedelta(days=STATS_DEFAULT_DAYS - 1)
+    if from_day > to_day:
+        raise HTTPException(status_code=400, detail="from_day must not be after to_day")
+    if (to_day - from_day).days >= STATS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {STATS_MAX_DAYS} days per request")
+    rows = await asyncio.gather(*(run_db(session, read_stats_rows, from_day, to_day) for session in db.all()))
+    stats = summarize_stats([row for shard_rows in rows for row in shard_rows], from_day, to_day)
+    return FastJSONResponse(render_json(stats))
+
+
+@router.post("/applications", response_model=ApplicationResponse, status_code=201)
+async def post_application(
+        payload: ApplicationRequest,
+        db: ShardSessions = Depends(get_db),
+        idempotency_key: Optional[str] = Header(None, min_length=1, max_length=MAX_KEY_LENGTH),
+):
+    """
+    Submit a new application.
+    Retries sending the same Idempotency-Key get the first response back
+    and never create a second application.
+    """
     try:
-        app_row: Application = create_application(db, payload)
-        resp = ApplicationResponse(
-            application_id=app_row.application_id,
-            decision=app_row.application_status,
-            open_credit_lines=app_row.open_credit_lines,
-            offer=(
-                OfferResponse(
-                    total_amount=app_row.requested_amount,
-                    interest_rate=app_row.interest_rate,
-                    term_months=app_row.term_months,
-                    monthly_payment=app_row.monthly_payment,
-                )
-                if app_row.application_status is ApplicationStatus.APPROVED
-                else None
-            ),
-            reason=(app_row.reason if app_row.application_status is ApplicationStatus.DENIED else None),
-        )
-        return resp
+        # SSN normalized and hashed once for the whole request (off the loop with CRYPTO_WORKERS)
+        ssn = await crypto_service.prepare_async(payload.borrower.ssn)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if idempotency_key is None:
+        return await _submit_application(payload, db, ssn)
+    # On the key's own shard, whatever the payload: a key reused for another SSN is found
+    key_shard, shard = db.shard_of_key(idempotency_key), db.shard_of_hash(ssn.ssn_hash)
+    session = db.session(key_shard)
+    # Else the borrower's shard gets a completed copy of the key (api.idempotency)
+    copy_session = db.session(shard) if key_shard != shard else None
 
+    payload_hash = request_hash(payload, ssn.ssn_hash)
+    try:
+        stored = await idempotency_store.begin(session, idempotency_key, payload_hash, copy_session)
+    except IdempotencyKeyMismatch:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress",
+                            headers={"Retry-After": "1"})
+    if stored is not None:
+        return FastJSONResponse(stored.body, status_code=stored.status_code, headers={"Idempotent-Replayed": "true"})
+
+    response = None
+    try:
+        response = await _submit_application(payload, db, ssn, idempotency_key, payload_hash)
+        return response
+    finally:
+        await idempotency_store.finish(session, idempotency_key, payload_hash, response.body if response else None)
+
+
+async def _submit_application(
+        payload: ApplicationRequest,
+        db: ShardSessions,
+        ssn,
+        idempotency_key: Optional[str] = None,
+        payload_hash: Optional[str] = None
+):
+    shard = db.shard_of_hash(ssn.ssn_hash)
+    key_shard = db.shard_of_key(idempotency_key) if idempotency_key is not None else shard
+    # Completed in the application's transaction: the key's row, or a copy of it
+    copy_hash = payload_hash if key_shard != shard else None
+    try:
+        # Bureau call before any DB work: no pooled connection waits on it
+        with stage("credit_check"):
+            open_credit_lines = await credit_provider.open_credit_lines(ssn)
+        if write_coalescer.enabled:
+            # Written in a session of the coalescer's, not this request's
+            app_row: Application = await write_coalescer.create_application(
+                db.factory(shard), payload, ssn, open_credit_lines, idempotency_key, copy_hash
+            )
+        else:
+            app_row = await run_db(
+                db.session(shard), create_application, payload, ssn, open_credit_lines, idempotency_key, copy_hash
+            )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except CreditCheckError:
+        raise HTTPException(status_code=503, detail="Credit check unavailable")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    # Committed: nothing below may turn it into an error the client would retry
+    count_decision(app_row)
+    body = render_json(application_response_content(application_values(app_row)))
+    if copy_hash is not None:
+        try:
+            await run_db(db.session(key_shard), complete_key, idempotency_key, app_row.application_id, body)
+        except Exception:
+            # A retry completes it from the copy on the borrower's shard
+            logger.warning("Idempotency-Key not completed on shard %d", key_shard, exc_info=True)
+    await application_cache.set_async(app_row.application_id, body)
+    return FastJSONResponse(body, status_code=201)
 
-@app.get("/applications/{application_id}", response_model=ApplicationResponse)
-def get_application(application_id: str, db: Session = Depends(get_db)):
-    """Retrieve an existing loan application by Application ID."""
 
-    row = db.execute(
-        select(Application).where(Application.application_id == application_id)
-    ).scalar_one_or_none()
+@router.post("/applications/batch", response_model=BatchApplicationResponse)
+async def post_applications_batch(payload: BatchApplicationRequest, db: ShardSessions = Depends(get_db)):
+    """
+    Submit many applications at once.
+    Every item gets its own result: the created application or an error.
+    Valid items are committed together in one transaction per shard, the
+    shards concurrently.
+    """
+    results = [BatchApplicationResult(index=i) for i in range(len(payload.applications))]
 
-    if not row:
-        raise HTTPException(status_code=404, detail="Application not found")
+    valid = []
+    for i, item in enumerate(payload.applications):
+        try:
+            valid.append((i, ApplicationRequest.model_validate(item)))
+        except ValidationError as e:
+            results[i].error = _validation_message(e)
 
-    resp = ApplicationResponse(
-        application_id=row.application_id,
-        decision=row.application_status,
-        open_credit_lines=row.open_credit_lines,
-        offer=(
-            OfferResponse(
-                total_amount=row.requested_amount,
-                interest_rate=row.interest_rate,
-                term_months=row.term_months,
-                monthly_payment=row.monthly_payment,
-            )
-            if row.application_status is ApplicationStatus.APPROVED
-            else None
-        ),
-        reason=(row.reason if row.application_status is ApplicationStatus.DENIED else None),
+    requests = [request for _, request in valid]
+    try:
+        ssns = crypto_service.prepare_many([request.borrower.ssn for request in requests])
+        credit = await credit_provider.open_credit_lines_many(ssns)
+        # Items with an invalid SSN only fail: any shard does
+        by_shard = defaultdict(list)
+        for j, ssn in enumerate(ssns):
+            by_shard[0 if isinstance(ssn, Exception) else db.shard_of_hash(ssn.ssn_hash)].append(j)
+        written = await asyncio.gather(*(
+            run_db(db.session(shard), create_applications_batch,
+                   [requests[j] for j in items], [ssns[j] for j in items], [credit[j] for j in items])
+            for shard, items in by_shard.items()
+        ))
+        outcomes = [None] * len(requests)
+        for items, shard_outcomes in zip(by_shard.values(), written):
+            for j, outcome in zip(items, shard_outcomes):
+                outcomes[j] = outcome
+    except Exception:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    for (i, _), outcome in zip(valid, outcomes):
+        if isinstance(outcome, Application):
+            count_decision(outcome)
+            content = application_response_content(application_values(outcome))
+            results[i].application = ApplicationResponse.model_validate(content)
+            await application_cache.set_async(outcome.application_id, render_json(content))
+        elif isinstance(outcome, ValueError):
+            results[i].error = str(outcome)
+        elif isinstance(outcome, CreditCheckError):
+            results[i].error = "Credit check unavailable"
+        else:
+            results[i].error = "Unable to save application"
+
+    failed = sum(1 for r in results if r.error is not None)
+    return BatchApplicationResponse(
+        succeeded=len(results) - failed,
+        failed=failed,
+        results=results,
+    )
+
+
+@router.post("/quotes", response_model=QuoteResponse)
+async def post_quotes(payload: QuoteRequest):
+    """
+    Price a grid of amounts against credit line counts without applying:
+    each quote is what POST /applications would decide. Nothing is stored.
+    With include_schedule, quotes are streamed as NDJSON and each approved
+    one carries its amortization schedule.
+    """
+    try:
+        if payload.include_schedule:
+            quotes = quote_service.quotes(payload.amounts, payload.open_credit_lines)
+            return StreamingResponse(quote_service.iter_ndjson(quotes), media_type="application/x-ndjson")
+        return FastJSONResponse(quote_service.render(payload.amounts, payload.open_credit_lines))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def application_filters(
+        status: Optional[ApplicationStatus] = None,
+        reason: Optional[ApplicationStatusReason] = None,
+        borrower_id: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+) -> ApplicationFilters:
+    """Query filters shared by the listing and the export."""
+    return ApplicationFilters(
+        status=status,
+        reason=reason,
+        borrower_id=borrower_id,
+        created_from=to_naive_utc(created_from),
+        created_to=to_naive_utc(created_to),
     )
-    return resp
+
+
+@router.get("/applications", response_model=ApplicationListResponse)
+async def list_applications(
+        filters: ApplicationFilters = Depends(application_filters),
+        limit: int = Query(LIST_PAGE_SIZE, ge=1, le=MAX_LIST_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        db: ShardSessions = Depends(get_db),
+):
+    """
+    List applications, newest first, with optional filters.
+    Follow next_cursor to get the following page.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Each shard's first rows, read concurrently, then merged
+    rows = await asyncio.gather(*(
+        run_db(session, fetch_shard_rows, filters, limit, after, shard) for shard, session in enumerate(db.all())
+    ))
+    items, next_cursor = merge_pages(dict(enumerate(rows)), limit)
+    return FastJSONResponse(render_json({"items": items, "next_cursor": next_cursor}))
+
+
+@router.get("/applications/export")
+async def export_applications(
+        request: Request,
+        filters: ApplicationFilters = Depends(application_filters),
+        format: Literal["ndjson", "csv"] = "ndjson",
+        db: ShardSessions = Depends(get_db),
+):
+    """
+    Stream every matching application as NDJSON or CSV, newest first.
+    Rows come from a database cursor in chunks, never all at once.
+    """
+    # The stream outlives the request's session: it opens its own connection
+    if db.count > 1:
+        # A cursor per shard, merged; through the sync engines in both modes
+        chunks = iter_export_merged(request.app.state.database.engines, filters, format)
+    elif isinstance(db.session(), AsyncSession):
+        chunks = aiter_export(db.session().bind, filters, format)
+    else:
+        chunks = iter_export(db.session().get_bind(), filters, format)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="applications.{format}"'}
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+@router.get("/applications/{application_id}", response_model=ApplicationResponse)
+async def get_application(application_id: str, db: ShardSessions = Depends(get_db)):
+    """
+    Retrieve an existing loan application by Application ID.
+    Served from the response cache, or from a column projection rendered
+    straight to JSON (no ORM entity, no response_model round trip). The ID
+    names its shard; the others are only read when it isn't there.
+    """
+    cached = await application_cache.get_async(application_id)
+    if cached is NOT_FOUND:
+        raise HTTPException(status_code=404, detail="Application not found")
+    if cached is not MISS:
+        return FastJSONResponse(cached)
+
+    home, *others = db.shards_for_id(application_id)
+    values = await run_db(db.session(home), fetch_application_values, application_id)
+    if not values and others:
+        # Not moved yet by a rebalance, or an ID from before sharding
+        found = await asyncio.gather(*(
+            run_db(db.session(shard), fetch_application_values, application_id) for shard in others
+        ))
+        values = next((value for value in found if value), None)
+    if not values:
+        # Older applications were moved to the archive (api.archive)
+        values = await asyncio.to_thread(_fetch_archived, application_id, [home, *others])
+
+    if not values:
+        await application_cache.set_not_found_async(application_id)
+        raise HTTPException(status_code=404, detail="Application not found")
+
+    body = render_json(application_response_content(values))
+    await application_cache.set_async(application_id, body)
+    return FastJSONResponse(body)
+
+
+def _fetch_archived(application_id: str, shards: list) -> Optional[tuple]:
+    for shard in shards:
+        values = archive.shard(shard).fetch_application_values(application_id)
+        if values:
+            return values
+    return None
+
+
+@router.get("/borrowers/{borrower_id}/applications", response_model=ApplicationListResponse)
+async def list_borrower_applications(
+        borrower_id: str,
+        limit: int = Query(LIST_PAGE_SIZE, ge=1, le=MAX_LIST_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        db: ShardSessions = Depends(get_db),
+):
+    """
+    Every application of the person behind a borrower_id, newest first,
+    across all their borrower snapshots (same SSN, older details).
+    Follow next_cursor to get the following page. A person's rows are all
+    on the shard their borrower_id names.
+    """
+    page = None
+    try:
+        for shard in db.shards_for_id(borrower_id):
+            page = await run_db(db.session(shard), fetch_borrower_history_page, borrower_id, limit, cursor)
+            if page is not None:
+                break
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Borrower not found")
+    items, next_cursor = page
+    return FastJSONResponse(render_json({"items": items, "next_cursor": next_cursor}))
+
+
+# `uvicorn api.main:app`; `uvicorn --factory api.main:create_app` builds it in the worker instead
+app = create_app()
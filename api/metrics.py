@@ -0,0 +1,228 @@
+"""
+In-process metrics, served in the Prometheus text format at GET /metrics.
+
+Recording is a few integer updates under a per-metric lock: histograms keep
+cumulative counts per fixed bucket, nothing is aggregated or formatted until
+something scrapes. Values that already live elsewhere (DB pool usage, cache
+and credit bureau counters) are read by callbacks at scrape time only.
+
+Stages of POST /applications, in loan_stage_duration_seconds{stage=...}:
+    validation       pydantic validation of an ApplicationRequest
+    ssn_crypto       SSN normalize + hash, and encryption of a new borrower's SSN
+    credit_check     the credit bureau call
+    borrower_lookup  find_or_create_borrower (includes encrypting a new borrower's SSN)
+    decision         compute_offer and building the application row
+    commit           flush, dashboard counters and commit
+
+Metrics are per process: with several workers, scrape each one.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Tuple
+
+# Seconds; request stages range from microseconds (pricing) to seconds (bureau)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_label_values", "_start")
+
+    def __init__(self, histogram: "Histogram", label_values: Tuple):
+        self._histogram = histogram
+        self._label_values = label_values
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, *self._label_values)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket..., count above the last bucket, sum]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[i] += 1
+            state[-1] += value
+
+    def time(self, *label_values) -> _Timer:
+        """Context manager observing the duration of its block."""
+        return _Timer(self, label_values)
+
+    def count(self, *label_values) -> int:
+        state = self._values.get(label_values)
+        return sum(state[:-1]) if state else 0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        for label_values, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, label_values)} {_number(state[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}"
+
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback at scrape time."""
+
+    def __init__(self, name: str, help: str, kind: str, labels: Tuple[str, ...],
+                 collect: Callable[[], Dict[Tuple, float]]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = labels
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for label_values, value in sorted(self.collect().items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, kind: str, labels: Tuple[str, ...],
+                 collect: Callable[[], Dict[Tuple, float]]) -> CallbackMetric:
+        return self._add(CallbackMetric(name, help, kind, labels, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "loan_stage_duration_seconds", "Time spent in each stage of an application.", ("stage",)
+)
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+DECISIONS = registry.counter(
+    "loan_decisions_total", "Created applications by decision and denial reason.", ("status", "reason")
+)
+
+
+def stage(name: str) -> _Timer:
+    """Time a block as one stage: `with stage("commit"): ...`"""
+    return STAGE_SECONDS.time(name)
+
+
+def count_decision(application) -> None:
+    reason = application.reason.name.lower() if application.reason is not None else ""
+    DECISIONS.inc(application.application_status.value, reason)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting requests and timing them per route
+    template (/applications/{application_id}), never per raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method, path)
+            HTTP_REQUESTS.inc(method, path, str(status))
@@ -0,0 +1,147 @@
+"""
+Schema migrations: create the schema of a new database, or bring one
+created before a change to api.models up to date. Every step is
+idempotent. Run before starting the API, which doesn't create tables.
+
+Usage:
+    python -m api.migrations
+"""
+from sqlalchemy import Engine, inspect, select, text, update, delete
+
+from api.models import Application, Base, Borrower, DailyDecisionStats
+
+BACKFILL_CHUNK_SIZE = 1000
+
+# What a borrower snapshot was told apart by before the fingerprint
+_SNAPSHOT_COLUMNS = (
+    "ssn_hash", "first_name", "last_name", "email", "phone",
+    "address_street", "city", "state", "zip_code",
+)
+
+
+def _snapshot(row) -> tuple:
+    return tuple(getattr(row, column) for column in _SNAPSHOT_COLUMNS)
+
+
+def merge_borrower(conn, duplicate_id: int, keep_id: int) -> None:
+    """Move a duplicate borrower's applications to keep_id and delete it."""
+    conn.execute(
+        update(Application.__table__)
+        .where(Application.borrower_id == duplicate_id)
+        .values(borrower_id=keep_id)
+    )
+    conn.execute(delete(Borrower.__table__).where(Borrower.id == duplicate_id))
+
+
+def add_borrower_fingerprint(engine: Engine, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """
+    Add borrowers.fingerprint, backfill it and create its unique index.
+
+    The backfill walks the table by primary key in chunks, one short
+    transaction per chunk. A row identical to an earlier snapshot is
+    merged into it (its applications are moved). A row that only
+    normalizes to the same fingerprint (other case or spacing) was a
+    separate snapshot before and stays one: its fingerprint is left NULL,
+    which the unique index allows, and new submissions reuse the earlier row.
+
+    Returns the number of rows backfilled or merged.
+    """
+    # Local import: api.helpers pulls in the security/rules modules
+    from api.helpers import borrower_fingerprint
+
+    columns = {c["name"] for c in inspect(engine).get_columns("borrowers")}
+    if "fingerprint" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE borrowers ADD COLUMN fingerprint VARCHAR(64)"))
+
+    backfilled = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Borrower.__table__)
+                .where(Borrower.id > last_id, Borrower.fingerprint.is_(None))
+                .order_by(Borrower.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            fingerprints = {row.id: borrower_fingerprint(row, row.ssn_hash) for row in rows}
+            owners = {owner.fingerprint: owner for owner in conn.execute(
+                select(Borrower.__table__)
+                .where(Borrower.fingerprint.in_(set(fingerprints.values())))
+            )}
+
+            for row in rows:
+                fingerprint = fingerprints[row.id]
+                owner = owners.get(fingerprint)
+                if owner is None:
+                    conn.execute(
+                        update(Borrower.__table__)
+                        .where(Borrower.id == row.id)
+                        .values(fingerprint=fingerprint)
+                    )
+                    owners[fingerprint] = row
+                elif _snapshot(owner) == _snapshot(row):
+                    merge_borrower(conn, row.id, owner.id)
+                else:
+                    continue
+                backfilled += 1
+
+            last_id = rows[-1].id
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_borrowers_fingerprint ON borrowers (fingerprint)"
+        ))
+    return backfilled
+
+
+LISTING_INDEXES = (
+    "ix_applications_created_at_id",
+    "ix_applications_status_created_at_id",
+    "ix_applications_borrower_created_at_id",
+)
+
+
+def add_application_listing_indexes(engine: Engine) -> None:
+    """Create the composite indexes behind GET /applications pagination."""
+    for index in Application.__table__.indexes:
+        if index.name in LISTING_INDEXES:
+            index.create(bind=engine, checkfirst=True)
+
+
+def backfill_decision_stats(engine: Engine) -> bool:
+    """
+    Fill daily_decision_stats for a database that has applications from
+    before the table existed. Returns True if it was backfilled.
+    """
+    from api.stats import rebuild_stats
+
+    with engine.connect() as conn:
+        has_stats = conn.execute(select(DailyDecisionStats.id).limit(1)).first() is not None
+        has_applications = conn.execute(select(Application.id).limit(1)).first() is not None
+    if has_stats or not has_applications:
+        return False
+    rebuild_stats(engine)
+    return True
+
+
+def upgrade(engine: Engine) -> None:
+    """Create missing tables, then run every migration step in order."""
+    Base.metadata.create_all(bind=engine)
+    add_borrower_fingerprint(engine)
+    add_application_listing_indexes(engine)
+    backfill_decision_stats(engine)
+
+
+if __name__ == "__main__":
+    from api.sharding import default_shards
+    from api.utils import load_env_file
+
+    load_env_file()
+    # Every shard (api.sharding) has the full schema
+    for engine in default_shards().engines:
+        upgrade(engine)
+    print("Database schema is up to date.")
@@ -1,8 +1,9 @@
 from typing import List
 import enum
-from sqlalchemy import String, Integer, Float, Text, DateTime, CheckConstraint, ForeignKey, Numeric, Enum
+from sqlalchemy import String, Integer, Float, Text, Date, DateTime, CheckConstraint, ForeignKey, LargeBinary, Numeric, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
 from api.utils import generate_uuid
 
 class Base(DeclarativeBase):
@@ -44,6 +45,9 @@ class Borrower(Base):
 
     ssn_encrypted: Mapped[str] = mapped_column(String, nullable=False)
     ssn_hash: Mapped[str] = mapped_column(String(64), index=True, nullable=False)   # hex sha256 → 64 chars
+    # sha256 over the normalized borrower fields, see api.helpers.borrower_fingerprint.
+    # Nullable only so older databases can add it before the backfill (api.migrations).
+    fingerprint: Mapped[str] = mapped_column(String(64), unique=True, index=True, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     updated: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
@@ -80,4 +84,48 @@ class Application(Base):
         CheckConstraint('term_months > 0 AND term_months <= 360', name='valid_term'),
         CheckConstraint('interest_rate >= 0 AND interest_rate <= 99.99', name='valid_interest_rate'),
         CheckConstraint('open_credit_lines >= 0 AND open_credit_lines <= 100', name='open_credit_lines_range'),
+        # Keyset pagination for GET /applications: newest first, id breaks ties
+        Index('ix_applications_created_at_id', 'created_at', 'id'),
+        Index('ix_applications_status_created_at_id', 'application_status', 'created_at', 'id'),
+        Index('ix_applications_borrower_created_at_id', 'borrower_id', 'created_at', 'id'),
     )
+
+
+class DailyDecisionStats(Base):
+    """
+    Decision counters per day and bucket (status, denial reason, term),
+    kept up to date by api.stats in the same transaction as every
+    application insert.
+    """
+    __tablename__ = "daily_decision_stats"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    application_status: Mapped[ApplicationStatus] = mapped_column(Enum(ApplicationStatus), nullable=False)
+    # Not nullable so the bucket can be a unique key: "" when approved / 0 when denied
+    reason: Mapped[str] = mapped_column(String(64), nullable=False, default="")  # ApplicationStatusReason name
+    term_months: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    applications: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    requested_amount: Mapped[Decimal] = mapped_column(Numeric(16, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('day', 'application_status', 'reason', 'term_months', name='uq_daily_decision_stats_bucket'),
+    )
+
+
+class IdempotencyKey(Base):
+    """
+    Idempotency-Key of a POST /applications: claimed (no response yet) when
+    the request starts, completed with the response in the same transaction
+    as the application it created. See api.idempotency.
+    """
+    __tablename__ = "idempotency_keys"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    key: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)  # sha256 of the validated payload
+    application_id: Mapped[str] = mapped_column(String(50), nullable=True)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=True)
+    response_body: Mapped[bytes] = mapped_column(LargeBinary, nullable=True)
+    # When the key was (re)claimed: TTL expiry and abandoned claims go by it
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True, nullable=False)
@@ -0,0 +1,185 @@
+"""
+Opt-in sampling profiler for live requests.
+
+A sampled request starts a background thread that snapshots the Python
+stacks of every thread (the event loop and the threadpool running sync DB
+work) every PROFILE_INTERVAL_MS. When the response is done the stacks are
+written in the collapsed format ("frame;frame;frame count" per line), which
+flamegraph.pl, speedscope and inferno read directly.
+
+Frames are recorded as function name, file and first line of the function:
+the sampler only reads code objects, never frame locals or arguments, so
+SSNs and other request data can't end up in a profile. File names carry the
+route template and status, not the raw path.
+
+Environment (profiling is off unless a rate or a token is set):
+    PROFILE_SAMPLE_RATE     0       fraction of requests to profile
+    PROFILE_TOKEN           unset   profile any request sending it in X-Profile-Token
+    PROFILE_DIR             profiles
+    PROFILE_INTERVAL_MS     2
+    PROFILE_MAX_FILES       100     oldest profiles are deleted beyond either cap
+    PROFILE_MAX_BYTES       52428800
+
+One request is profiled at a time; samples include whatever else the
+process runs meanwhile, so profile under representative, not peak, load.
+"""
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+TOKEN_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Leaf frames of a thread that is just waiting for work
+IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get")}
+
+_UNSAFE_CHARS_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+@dataclass(frozen=True)
+class ProfilingSettings:
+    sample_rate: float = 0.0
+    token: Optional[str] = None
+    directory: str = "profiles"
+    interval_ms: float = 2.0
+    max_files: int = 100
+    max_bytes: int = 50 * 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> "ProfilingSettings":
+        env = os.environ
+        defaults = cls()
+        return cls(
+            sample_rate=float(env.get("PROFILE_SAMPLE_RATE", defaults.sample_rate)),
+            token=env.get("PROFILE_TOKEN") or None,
+            directory=env.get("PROFILE_DIR", defaults.directory),
+            interval_ms=float(env.get("PROFILE_INTERVAL_MS", defaults.interval_ms)),
+            max_files=int(env.get("PROFILE_MAX_FILES", defaults.max_files)),
+            max_bytes=int(env.get("PROFILE_MAX_BYTES", defaults.max_bytes)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.token is not None
+
+
+def _frame_label(code) -> str:
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """Counts the collapsed stacks of all other threads until stopped."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                leaf = frame.f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+                self.samples[";".join(reversed(stack))] += 1
+
+
+def render_collapsed(samples: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+def enforce_limits(directory: Path, max_files: int, max_bytes: int) -> None:
+    """Delete the oldest profiles until both caps hold."""
+    profiles = sorted(directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime)
+    sizes = [p.stat().st_size for p in profiles]
+    total = sum(sizes)
+    while profiles and (len(profiles) > max_files or total > max_bytes):
+        total -= sizes.pop(0)
+        profiles.pop(0).unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware profiling sampled requests. Requests that are not
+    sampled cost one random() call (plus a header scan with PROFILE_TOKEN set).
+    """
+
+    def __init__(self, app, settings: ProfilingSettings):
+        self.app = app
+        self.settings = settings
+        self._busy = threading.Lock()
+        self._token = settings.token.encode() if settings.token else None
+
+    def _wants_profile(self, scope) -> bool:
+        if self._token is not None:
+            for name, value in scope["headers"]:
+                if name == TOKEN_HEADER:
+                    return hmac.compare_digest(value, self._token)
+        return self.settings.sample_rate > 0 and random.random() < self.settings.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        # One profile at a time: concurrent samplers would record each other
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            status = 500
+            started = time.time()
+            name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(started))}-{int(started * 1000) % 1000:03d}"
+
+            async def send_wrapper(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, name.encode())]
+                await send(message)
+
+            sampler = StackSampler(self.settings.interval_ms / 1000)
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                samples = sampler.stop()
+                self._write(name, scope, status, time.time() - started, samples)
+        finally:
+            self._busy.release()
+
+    def _write(self, name: str, scope, status: int, elapsed: float, samples: Counter) -> None:
+        route = getattr(scope.get("route"), "path", "unmatched")
+        slug = _UNSAFE_CHARS_RE.sub("_", route).strip("_") or "root"
+        directory = Path(self.settings.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{name}-{scope['method']}-{slug}-{status}-{elapsed * 1000:.0f}ms.collapsed"
+        path.write_text(render_collapsed(samples))
+        enforce_limits(directory, self.settings.max_files, self.settings.max_bytes)
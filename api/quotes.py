@@ -0,0 +1,150 @@
+"""
+What-if pricing for POST /quotes.
+
+A quote is what compute_offer would decide for an amount and a number of
+open credit lines, without a borrower, a credit check or a database write.
+A request prices a whole grid (every amount against every credit line
+count) in one vectorized compute_offers call.
+
+Rendered grids are memoized by their inputs: a pricing page asking the
+same grid again gets the stored bytes. Only the bytes are kept, only for
+grids up to QUOTE_CACHE_MAX_CELLS, and QUOTE_CACHE_MAX_BYTES bounds them
+all, so distinct grids can't pile up in memory. Memoized grids belong to
+one decision table and are dropped when the table is reloaded.
+
+Amortization schedules are only built when asked for (include_schedule),
+one quote at a time while the NDJSON response is streamed, so a large grid
+of 360-month loans is never held in memory as a whole.
+"""
+from decimal import Decimal
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api.cache import LRUResponseCache, MISS
+from api.constants import MAX_QUOTE_CELLS, QUOTE_CACHE_MAX_BYTES, QUOTE_CACHE_MAX_CELLS, QUOTE_CACHE_MAX_SIZE
+from api.models import ApplicationStatus
+from api.responses import render_json
+from api.rules.decision_table import DecisionTable, decision_rules
+from api.rules.offer_batch import compute_offers
+from api.rules.pricing import amortization_schedule
+
+CENT = Decimal("0.01")
+
+
+def quote_grid(amounts: Sequence[Decimal], open_credit_lines: Sequence[int], table: DecisionTable) -> List[dict]:
+    """
+    JSON-ready quotes for every (amount, credit lines) pair, row-major:
+    all credit line counts of the first amount, then the next amount.
+    """
+    decisions = compute_offers(
+        np.repeat(np.asarray(amounts, dtype=object), len(open_credit_lines)),
+        np.tile(np.asarray(open_credit_lines, dtype=np.int64), len(amounts)),
+        table=table,
+    )
+    quotes = []
+    i = 0
+    for amount in amounts:
+        for lines in open_credit_lines:
+            approved = decisions.status[i] is ApplicationStatus.APPROVED
+            quotes.append({
+                "requested_amount": str(amount),
+                "open_credit_lines": lines,
+                "decision": decisions.status[i].value,
+                # Same offer shape as application responses
+                "offer": (
+                    {
+                        "total_amount": str(amount),
+                        "interest_rate": float(decisions.interest_rate[i]),
+                        "term_months": int(decisions.term_months[i]),
+                        "monthly_payment": str(Decimal(int(decisions.monthly_payment_cents[i])).scaleb(-2)),
+                    }
+                    if approved
+                    else None
+                ),
+                "reason": None if approved else decisions.reason[i].value,
+            })
+            i += 1
+    return quotes
+
+
+def schedule_content(offer: dict) -> List[dict]:
+    """The amortization schedule of an offer, JSON-ready."""
+    rows = amortization_schedule(Decimal(offer["total_amount"]), offer["interest_rate"], offer["term_months"])
+    return [
+        {
+            "month": row.month,
+            "payment": str(row.payment),
+            "principal": str(row.principal),
+            "interest": str(row.interest),
+            "balance": str(row.balance),
+        }
+        for row in rows
+    ]
+
+
+class QuoteService:
+    """Prices quote grids, memoizing them per decision table."""
+
+    def __init__(
+            self,
+            max_cells: int = MAX_QUOTE_CELLS,
+            cache_max_size: int = QUOTE_CACHE_MAX_SIZE,
+            cache_max_bytes: int = QUOTE_CACHE_MAX_BYTES,
+            cache_max_cells: int = QUOTE_CACHE_MAX_CELLS
+    ):
+        self.max_cells = max_cells
+        self.cache_max_cells = cache_max_cells
+        # Grids only go stale with the table, which clears the cache
+        self._cache = LRUResponseCache(max_size=cache_max_size, ttl=float("inf"), max_bytes=cache_max_bytes)
+        self._table: Optional[DecisionTable] = None
+
+    def _current_table(self) -> DecisionTable:
+        table = decision_rules.table()
+        if table is not self._table:
+            self._cache.clear()
+            self._table = table
+        return table
+
+    def _grid(self, amounts: Sequence[Decimal],
+              open_credit_lines: Optional[Sequence[int]]) -> Tuple[DecisionTable, List[Decimal], List[int]]:
+        table = self._current_table()
+        if open_credit_lines is None:
+            open_credit_lines = table.credit_line_samples()
+        amounts = [Decimal(amount).quantize(CENT) for amount in amounts]
+        if len(amounts) * len(open_credit_lines) > self.max_cells:
+            raise ValueError(f"A quote grid can have at most {self.max_cells} cells")
+        return table, amounts, list(open_credit_lines)
+
+    def quotes(self, amounts: Sequence[Decimal], open_credit_lines: Optional[Sequence[int]] = None) -> List[dict]:
+        """
+        The quotes of a grid. Without credit line counts, every credit line
+        tier of the table is quoted. Raises ValueError for a grid over max_cells.
+        """
+        table, amounts, open_credit_lines = self._grid(amounts, open_credit_lines)
+        return quote_grid(amounts, open_credit_lines, table)
+
+    def render(self, amounts: Sequence[Decimal], open_credit_lines: Optional[Sequence[int]] = None) -> bytes:
+        """The rendered {"quotes": [...]} body of a grid, memoized. Raises like quotes()."""
+        table, amounts, open_credit_lines = self._grid(amounts, open_credit_lines)
+        key = ",".join(map(str, amounts)) + "|" + ",".join(map(str, open_credit_lines))
+        cached = self._cache.get(key)
+        if cached is not MISS:
+            return cached
+
+        body = render_json({"quotes": quote_grid(amounts, open_credit_lines, table)})
+        if len(amounts) * len(open_credit_lines) <= self.cache_max_cells:
+            self._cache.set(key, body)
+        return body
+
+    def iter_ndjson(self, quotes: List[dict]) -> Iterator[bytes]:
+        """One JSON line per quote; approved quotes get their schedule, built as they are sent."""
+        for quote in quotes:
+            schedule = schedule_content(quote["offer"]) if quote["offer"] is not None else None
+            yield render_json(dict(quote, schedule=schedule)) + b"\n"
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -0,0 +1,88 @@
+"""
+Fast response serialization for the application endpoints.
+
+Responses are built straight from the selected column values into a JSON-ready
+dict and encoded with orjson (stdlib json if orjson isn't installed), skipping
+ORM hydration and the response_model validate/serialize round trip. The output
+is the same JSON as ApplicationResponse.
+"""
+import json
+
+from starlette.responses import Response
+
+from api.models import ApplicationStatus
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def render_json(content) -> bytes:
+    """Encode a JSON-ready value to bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson. Pre-rendered bytes are sent as-is."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return render_json(content)
+
+
+def application_values(app_row) -> tuple:
+    """Column values of an Application row, in APPLICATION_RESPONSE_COLUMNS order."""
+    return (
+        app_row.application_id,
+        app_row.application_status,
+        app_row.open_credit_lines,
+        app_row.requested_amount,
+        app_row.interest_rate,
+        app_row.term_months,
+        app_row.monthly_payment,
+        app_row.reason,
+    )
+
+
+def application_response_content(values: tuple) -> dict:
+    """
+    The one mapping from application column values to the public
+    ApplicationResponse shape (as a JSON-ready dict).
+    """
+    (application_id, status, open_credit_lines, requested_amount,
+     interest_rate, term_months, monthly_payment, reason) = values
+
+    approved = status is ApplicationStatus.APPROVED
+    return {
+        "application_id": application_id,
+        "decision": status.value,
+        "open_credit_lines": open_credit_lines,
+        "offer": (
+            {
+                # Decimals are sent as strings, floats as numbers, like pydantic does
+                "total_amount": str(requested_amount),
+                "interest_rate": float(interest_rate),
+                "term_months": term_months,
+                "monthly_payment": str(monthly_payment),
+            }
+            if approved
+            else None
+        ),
+        "reason": (reason.value if status is ApplicationStatus.DENIED and reason is not None else None),
+    }
+
+
+def application_list_item_content(row) -> dict:
+    """
+    JSON-ready dict of a listing row: the ApplicationResponse columns
+    followed by created_at, id and the borrower's public borrower_id.
+    """
+    content = application_response_content(tuple(row[:8]))
+    content["borrower_id"] = row[10]
+    content["created_at"] = row[8].isoformat()
+    return content
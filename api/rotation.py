@@ -0,0 +1,158 @@
+"""
+Online SSN key rotation.
+
+1. Put the new Fernet key first in SSN_ENC_KEY, keeping the old ones after
+   it, move the old SSN_HASH_KEY into SSN_HASH_KEY_PREVIOUS and set the new
+   one. Restart the API: new rows use the new keys, and borrowers stored
+   under the old ones are still decrypted and found (api.security).
+2. Run this job. It walks the borrowers table by primary key in small
+   chunks and rewrites ssn_encrypted, ssn_hash and fingerprint of every row
+   still under an old key. Each chunk is read and re-encrypted outside any
+   write transaction, then written in one short transaction, so live
+   requests only ever wait for a few hundred row updates. A pause between
+   chunks throttles the job.
+3. Once the job reports completion, drop the old keys from the environment.
+4. With several shards (api.sharding), the new hashes move borrowers to
+   other buckets: run `python -m api.sharding rebalance`.
+
+Progress is saved to a checkpoint file after every chunk (one per shard);
+an interrupted run resumes where it stopped. The file is removed when the
+run completes.
+
+Usage:
+    python -m api.rotation [--chunk-size 500] [--pause 0.05] [--checkpoint rotation.checkpoint.json]
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import Engine, select, update
+
+from api.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from api.migrations import merge_borrower
+from api.models import Borrower
+from api.security import decrypt_ssn_with_key_status, encrypt_normalized_ssn, hash_normalized_ssn
+from api.utils import load_env_file
+
+ROTATION_CHUNK_SIZE = 500
+DEFAULT_CHECKPOINT = "rotation.checkpoint.json"
+
+
+@dataclass
+class RotationProgress:
+    last_id: int = 0
+    scanned: int = 0
+    rewritten: int = 0
+    merged: int = 0
+
+
+def _rotated_values(row) -> Optional[dict]:
+    """New column values for a row still under an old key, else None."""
+    # Local import: api.helpers pulls in the rules modules
+    from api.helpers import borrower_fingerprint
+
+    ssn, current_ciphertext = decrypt_ssn_with_key_status(row.ssn_encrypted)
+    ssn_hash = hash_normalized_ssn(ssn)
+    if current_ciphertext and ssn_hash == row.ssn_hash:
+        return None
+    return dict(
+        ssn_encrypted=row.ssn_encrypted if current_ciphertext else encrypt_normalized_ssn(ssn),
+        ssn_hash=ssn_hash,
+        # A snapshot kept apart by the fingerprint backfill (NULL) stays apart
+        fingerprint=borrower_fingerprint(row, ssn_hash) if row.fingerprint is not None else None,
+    )
+
+
+def _write_chunk(engine: Engine, changes: dict, progress: RotationProgress) -> None:
+    """
+    Apply {row: new values} in one transaction. A row whose new fingerprint
+    already belongs to another borrower is a duplicate across key
+    generations and is merged into it.
+    """
+    with engine.begin() as conn:
+        owners = dict(conn.execute(
+            select(Borrower.fingerprint, Borrower.id)
+            .where(Borrower.fingerprint.in_({values["fingerprint"] for values in changes.values()}))
+        ).all())
+        for row, values in changes.items():
+            keep_id = owners.get(values["fingerprint"]) if values["fingerprint"] is not None else None
+            if keep_id is not None and keep_id != row.id:
+                merge_borrower(conn, row.id, keep_id)
+                progress.merged += 1
+                continue
+            result = conn.execute(
+                update(Borrower.__table__)
+                # Guard against a concurrent rewrite of the same row
+                .where(Borrower.id == row.id, Borrower.ssn_encrypted == row.ssn_encrypted)
+                .values(**values)
+            )
+            if result.rowcount:
+                owners[values["fingerprint"]] = row.id
+                progress.rewritten += 1
+
+
+def rotate_borrower_keys(
+        engine: Engine,
+        chunk_size: int = ROTATION_CHUNK_SIZE,
+        pause: float = 0.05,
+        checkpoint: Optional[str] = None,
+        max_chunks: Optional[int] = None
+) -> RotationProgress:
+    """
+    Re-encrypt and re-hash every borrower under the current keys.
+    max_chunks stops early (the checkpoint is kept), mostly for tests.
+    Returns the progress counters of the whole run, including resumed parts.
+    """
+    progress = load_checkpoint(checkpoint, RotationProgress)
+    table = Borrower.__table__
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.ssn_encrypted, table.c.ssn_hash, table.c.fingerprint,
+                       table.c.first_name, table.c.last_name, table.c.email, table.c.phone,
+                       table.c.address_street, table.c.city, table.c.state, table.c.zip_code)
+                .where(table.c.id > progress.last_id)
+                .order_by(table.c.id)
+                .limit(chunk_size)
+            ).all()
+        if not rows:
+            clear_checkpoint(checkpoint)
+            break
+
+        # Crypto happens here, before the write transaction starts
+        changes = {row: values for row in rows if (values := _rotated_values(row)) is not None}
+        if changes:
+            _write_chunk(engine, changes, progress)
+
+        progress.scanned += len(rows)
+        progress.last_id = rows[-1].id
+        save_checkpoint(checkpoint, progress)
+        chunks += 1
+        if pause:
+            time.sleep(pause)
+    return progress
+
+
+def main():
+    load_env_file()
+    parser = argparse.ArgumentParser(description="Re-encrypt borrower SSNs under the current keys.")
+    parser.add_argument("--chunk-size", type=int, default=ROTATION_CHUNK_SIZE)
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between chunks")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    args = parser.parse_args()
+
+    from api.sharding import default_shards
+
+    for shard, engine in enumerate(default_shards().engines):
+        checkpoint = f"{args.checkpoint}.shard{shard}" if shard else args.checkpoint
+        progress = rotate_borrower_keys(engine, args.chunk_size, args.pause, checkpoint)
+        print(
+            f"Shard {shard}: scanned {progress.scanned} borrowers: {progress.rewritten} rewritten, "
+            f"{progress.merged} merged into an existing borrower."
+        )
+
+
+if __name__ == "__main__":
+    main()
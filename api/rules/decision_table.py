@@ -0,0 +1,291 @@
+"""
+Declarative loan decision table, compiled for O(log n) lookups.
+
+The rules live in a JSON file (api/rules/decision_table.json by default,
+DECISION_TABLE_PATH to override):
+
+    amount_bands        name -> interval of requested amounts, e.g. "[10000, 50000]"
+    credit_line_bands   name -> interval of open credit lines, e.g. "[0, 10)"
+    rules               {"amount": band or "*", "credit_lines": band or "*",
+                         "approve": {"interest_rate": 10.0, "term_months": 36}}
+                        or {..., "deny": "<ApplicationStatusReason name>"}
+    default             outcome when no rule matches, {"deny": "OTHER"}
+
+Rules are checked in order and the first match wins, like an if-chain.
+At load the band endpoints of each axis are merged into one sorted list of
+cut points; the outcome of every (amount segment, credit line segment) cell
+is resolved once into a grid. A decision is then two bisects and an index.
+
+The file is re-read when it changes (checked at most every
+DECISION_TABLE_RELOAD_SECONDS, default 1, negative to never reload). The
+new table is compiled aside and swapped in with one assignment: requests
+already holding the old table finish with it, and a file that doesn't
+compile is reported and ignored, keeping the previous table.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.models import ApplicationStatus, ApplicationStatusReason
+from api.rules.pricing import annuity_factor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "decision_table.json")
+
+_NUMBER = r"[-+]?\d+(?:\.\d+)?"
+_INTERVAL_RE = re.compile(rf"^\s*([\[(])\s*(-inf|{_NUMBER})\s*,\s*(\+?inf|{_NUMBER})\s*([\])])\s*$")
+
+# A cut is a (value, side) pair between two segments of an axis. Side 0 puts
+# the value itself in the segment above the cut, side 1 in the one below.
+# A value x falls in segment bisect_right(cuts, (x, 0)).
+Cut = Tuple[Decimal, int]
+
+
+@dataclass(frozen=True)
+class Interval:
+    low: Optional[Decimal]   # None: unbounded
+    high: Optional[Decimal]
+    low_closed: bool
+    high_closed: bool
+
+    @classmethod
+    def parse(cls, text: str) -> "Interval":
+        match = _INTERVAL_RE.match(text)
+        if not match:
+            raise ValueError(f"Invalid interval {text!r}, expected e.g. '[10000, 50000)'")
+        opening, low, high, closing = match.groups()
+        interval = cls(
+            low=None if low == "-inf" else Decimal(low),
+            high=None if high.lstrip("+") == "inf" else Decimal(high),
+            low_closed=opening == "[",
+            high_closed=closing == "]",
+        )
+        if interval.low is not None and interval.high is not None:
+            empty = interval.low > interval.high or (
+                interval.low == interval.high and not (interval.low_closed and interval.high_closed)
+            )
+            if empty:
+                raise ValueError(f"Empty interval {text!r}")
+        return interval
+
+    @property
+    def lower_cut(self) -> Optional[Cut]:
+        return None if self.low is None else (self.low, 0 if self.low_closed else 1)
+
+    @property
+    def upper_cut(self) -> Optional[Cut]:
+        return None if self.high is None else (self.high, 1 if self.high_closed else 0)
+
+
+@dataclass(frozen=True)
+class Outcome:
+    status: ApplicationStatus
+    reason: Optional[ApplicationStatusReason]
+    interest_rate: Optional[float] = None
+    term_months: Optional[int] = None
+
+    @classmethod
+    def parse(cls, spec: dict) -> "Outcome":
+        if ("approve" in spec) == ("deny" in spec):
+            raise ValueError(f"Outcome needs exactly one of 'approve' or 'deny': {spec}")
+        if "deny" in spec:
+            try:
+                reason = ApplicationStatusReason[spec["deny"]]
+            except KeyError:
+                raise ValueError(f"Unknown denial reason {spec['deny']!r}") from None
+            return cls(ApplicationStatus.DENIED, reason)
+
+        offer = spec["approve"]
+        rate, term = float(offer["interest_rate"]), int(offer["term_months"])
+        if not 0 <= rate <= 99.99:
+            raise ValueError(f"interest_rate out of range: {rate}")
+        if not 0 < term <= 360:
+            raise ValueError(f"term_months out of range: {term}")
+        return cls(ApplicationStatus.APPROVED, None, rate, term)
+
+
+def _cut_code(cut: Cut, scale: int) -> int:
+    """Integer image of a cut for the vectorized lookup: 2 * value * scale + side."""
+    value, side = cut
+    scaled = value * scale
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f"Band endpoint {value} is finer than 1/{scale}")
+    return 2 * int(scaled) + side
+
+
+class _Axis:
+    """The named bands of one input, merged into sorted cuts."""
+
+    def __init__(self, bands: Dict[str, str], scale: int):
+        if not bands:
+            raise ValueError("Every axis needs at least one band")
+        self.bands = {name: Interval.parse(text) for name, text in bands.items()}
+        cuts = set()
+        for interval in self.bands.values():
+            cuts.update(cut for cut in (interval.lower_cut, interval.upper_cut) if cut is not None)
+        # Vectorized lookups get integer values * scale (cents for amounts)
+        self.codes = np.array([_cut_code(cut, scale) for cut in sorted(cuts)], dtype=np.int64)
+        if scale == 1:
+            # Integer inputs compare much faster against int than Decimal
+            cuts = {(int(value), side) for value, side in cuts}
+        self.cuts: List[Cut] = sorted(cuts)
+
+    @property
+    def segments(self) -> int:
+        return len(self.cuts) + 1
+
+    def covered(self, name: str) -> range:
+        """Segments inside a band ("*": all)."""
+        if name == "*":
+            return range(self.segments)
+        if name not in self.bands:
+            raise ValueError(f"Unknown band {name!r}")
+        interval = self.bands[name]
+        # Cut values compare equal whether stored as Decimal or int
+        first = 0 if interval.lower_cut is None else self.cuts.index(interval.lower_cut) + 1
+        last = len(self.cuts) if interval.upper_cut is None else self.cuts.index(interval.upper_cut)
+        return range(first, last + 1)
+
+    def segment(self, value) -> int:
+        return bisect_right(self.cuts, (value, 0))
+
+    def smallest_members(self) -> List[int]:
+        """The smallest non-negative integer of every segment that has one."""
+        members = []
+        for k in range(self.segments):
+            if k == 0:
+                candidate = 0
+            else:
+                value, side = self.cuts[k - 1]
+                candidate = max(int(value) + side, 0)
+            if self.segment(candidate) == k:
+                members.append(candidate)
+        return members
+
+
+class DecisionTable:
+    """A compiled decision table: evaluate with outcome() or outcome_indexes()."""
+
+    def __init__(self, spec: dict, source: str = "<dict>"):
+        self.source = source
+        self._amounts = _Axis(spec["amount_bands"], scale=100)
+        self._lines = _Axis(spec["credit_line_bands"], scale=1)
+
+        default = Outcome.parse(spec.get("default", {"deny": "OTHER"}))
+        grid = [[None] * self._lines.segments for _ in range(self._amounts.segments)]
+        for rule in spec["rules"]:
+            outcome = Outcome.parse(rule)
+            for row in self._amounts.covered(rule.get("amount", "*")):
+                for col in self._lines.covered(rule.get("credit_lines", "*")):
+                    if grid[row][col] is None:
+                        grid[row][col] = outcome
+        self._grid: List[List[Outcome]] = [[cell or default for cell in row] for row in grid]
+
+        self.outcomes: List[Outcome] = sorted(
+            {cell for row in self._grid for cell in row},
+            key=lambda o: (o.status.value, o.reason.name if o.reason else "", o.interest_rate or 0, o.term_months or 0),
+        )
+        index = {outcome: i for i, outcome in enumerate(self.outcomes)}
+        self._outcome_grid = np.array([[index[cell] for cell in row] for row in self._grid], dtype=np.int64)
+
+        # Approvals never pay for the annuity exponentiation
+        for outcome in self.outcomes:
+            if outcome.status is ApplicationStatus.APPROVED:
+                annuity_factor(outcome.interest_rate, outcome.term_months)
+
+    @classmethod
+    def load(cls, path: str) -> "DecisionTable":
+        with open(path) as f:
+            spec = json.load(f)
+        try:
+            return cls(spec, source=path)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid decision table {path}: {e!r}") from e
+
+    def credit_line_samples(self) -> List[int]:
+        """One credit line count per credit line segment: every tier of the table."""
+        return self._lines.smallest_members()
+
+    def outcome(self, requested_amount, open_credit_lines: int) -> Outcome:
+        return self._grid[self._amounts.segment(requested_amount)][self._lines.segment(open_credit_lines)]
+
+    def outcome_indexes(self, amount_cents: np.ndarray, open_credit_lines: np.ndarray) -> np.ndarray:
+        """Vectorized outcome(): indexes into self.outcomes."""
+        rows = np.searchsorted(self._amounts.codes, 2 * amount_cents, side="right")
+        cols = np.searchsorted(self._lines.codes, 2 * open_credit_lines, side="right")
+        return self._outcome_grid[rows, cols]
+
+
+class DecisionRules:
+    """The decision table in use, reloaded when its file changes."""
+
+    def __init__(self, path: str = DEFAULT_PATH, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stat = self._file_stat()
+        self._table = DecisionTable.load(path)
+        self._next_check = time.monotonic() + check_interval
+
+    @classmethod
+    def from_env(cls) -> "DecisionRules":
+        return cls(
+            path=os.environ.get("DECISION_TABLE_PATH", DEFAULT_PATH),
+            check_interval=float(os.environ.get("DECISION_TABLE_RELOAD_SECONDS", 1)),
+        )
+
+    def _file_stat(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def table(self) -> DecisionTable:
+        """The current table. Callers keep the returned table for a whole decision."""
+        if 0 <= self.check_interval and self._next_check <= time.monotonic():
+            self.reload_if_changed()
+        return self._table
+
+    def reload_if_changed(self) -> bool:
+        # One thread reloads; the others go on with the current table
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            stat = None
+            try:
+                stat = self._file_stat()
+                if stat == self._stat:
+                    return False
+                table = DecisionTable.load(self.path)
+            except (OSError, ValueError) as e:
+                # Keep serving the last good table until the file is fixed
+                if self.last_error != str(e):
+                    logger.error("Decision table %s not reloaded: %s", self.path, e)
+                self.last_error = str(e)
+                if stat is not None:
+                    # Don't recompile the same broken file on every check
+                    self._stat = stat
+                return False
+            self._table, self._stat = table, stat
+            self.reloads += 1
+            self.last_error = None
+            return True
+        finally:
+            self._lock.release()
+
+    def stats(self) -> dict:
+        return {"path": self.path, "reloads": self.reloads, "last_error": self.last_error}
+
+
+decision_rules = DecisionRules.from_env()
@@ -1,20 +1,10 @@
 from dataclasses import dataclass
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from typing import Optional
 
-from api.constants import (
-    MIN_LOAN_AMOUNT,
-    MAX_LOAN_AMOUNT,
-    MIN_CREDIT_LINES_TIER_1,
-    MIN_CREDIT_LINES_TIER_2,
-    MAX_CREDIT_LINES_TIER_2,
-    TIER_1_TERM,
-    TIER_1_RATE,
-    TIER_2_TERM,
-    TIER_2_RATE,
-    MAX_CREDIT_LINES
-)
 from api.models import ApplicationStatus, ApplicationStatusReason
+from api.rules.decision_table import DecisionTable, decision_rules
+from api.rules.pricing import monthly_payment_cents
 
 @dataclass
 class Offer:
@@ -47,27 +37,21 @@ def compute_monthly_payment(principal: Decimal, interest_rate: float, term_month
       if r == 0: M = P / n
       else:      M = P * r / (1 - (1 + r)^(-n)),
       where r = (annual_rate_pct / 100) / 12
-    """
-    if term_months <= 0:
-        raise ValueError("term_months must be > 0")
-
-    principal = Decimal(principal)
-    monthly_rate = (Decimal(interest_rate) / Decimal("100")) / Decimal("12")
-
-    if monthly_rate == 0:
-        monthly_payment = principal / term_months
-    else:
-        # M = P * r / (1 - (1 + r)^(-n))
-        one = Decimal(1)
-        denom = one - (one + monthly_rate) ** (Decimal(-term_months))
-        monthly_payment = principal * monthly_rate / denom
 
-    return monthly_payment.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    The annuity factor per (rate, term) comes from the cached table in
+    api.rules.pricing; the payment itself is exact integer-cents math.
+    """
+    cents = monthly_payment_cents(principal, interest_rate, term_months)
+    return Decimal(cents).scaleb(-2)
 
-def compute_offer(requested_amount: Decimal, open_credit_lines: int) -> LoanDecision:
+def compute_offer(requested_amount: Decimal, open_credit_lines: int,
+                  table: Optional[DecisionTable] = None) -> LoanDecision:
     """
     Compute loan offer based on business rules.
 
+    The rules are the decision table (api.rules.decision_table), by default
+    the one currently loaded from its file.
+
     Args:
         requested_amount: loan amount (>= 0)
         open_credit_lines: number of credit lines (>= 0)
@@ -75,50 +59,17 @@ def compute_offer(requested_amount: Decimal, open_credit_lines: int) -> LoanDeci
     Returns:
         LoanDecision
     """
-    decision = LoanDecision(
-        status=ApplicationStatus.DENIED,
-        reason= ApplicationStatusReason.OTHER,
-        offer=None
-    )
-
     if open_credit_lines < 0:
         raise ValueError("open_credit_lines cannot be negative")
 
-    # Rule 1: amount bounds
-    if requested_amount < MIN_LOAN_AMOUNT or requested_amount > MAX_LOAN_AMOUNT:
-        return LoanDecision(
-            status=ApplicationStatus.DENIED,
-            offer=None,
-            reason=ApplicationStatusReason.REQUEST_AMOUNT_OUT_OF_BOUNDS
-        )
-
-    # Rule 4: >50 lines → deny
-    if open_credit_lines > MAX_CREDIT_LINES:
-        return LoanDecision(status=ApplicationStatus.DENIED,
-                            offer=None,
-                            reason=ApplicationStatusReason.CREDIT_LINES_OUT_OF_BOUNDS
-                            )
-
-    # Rule 2: <10 lines → 36mo at 10%
-    if open_credit_lines < MIN_CREDIT_LINES_TIER_1:
-        term = TIER_1_TERM
-        rate = TIER_1_RATE
-        monthly_payment = compute_monthly_payment(requested_amount, rate, term)
-        return LoanDecision(
-            status=ApplicationStatus.APPROVED,
-            offer=Offer(requested_amount, rate, term, monthly_payment),
-            reason=None
-        )
-
-    # Rule 3: 10..50 lines → 24mo at 20%
-    if MIN_CREDIT_LINES_TIER_2 <= open_credit_lines <= MAX_CREDIT_LINES_TIER_2:
-        term = TIER_2_TERM
-        rate = TIER_2_RATE
-        monthly_payment = compute_monthly_payment(requested_amount, rate, term)
-        return LoanDecision(status=ApplicationStatus.APPROVED,
-                            offer=Offer(requested_amount, rate, term, monthly_payment),
-                            reason=None
-                            )
-
-    # fallback if none of the above are valid
-    return decision
+    outcome = (table or decision_rules.table()).outcome(requested_amount, open_credit_lines)
+
+    if outcome.status is ApplicationStatus.DENIED:
+        return LoanDecision(status=ApplicationStatus.DENIED, offer=None, reason=outcome.reason)
+
+    monthly_payment = compute_monthly_payment(requested_amount, outcome.interest_rate, outcome.term_months)
+    return LoanDecision(
+        status=ApplicationStatus.APPROVED,
+        offer=Offer(requested_amount, outcome.interest_rate, outcome.term_months, monthly_payment),
+        reason=None
+    )
@@ -0,0 +1,122 @@
+"""
+Integer-cents pricing core.
+
+The annuity factor r / (1 - (1 + r)^(-n)) only depends on the (rate, term)
+pair, and the configured tiers only produce a handful of those. Each factor
+is computed once with Decimal, stored as an exact integer ratio, and every
+payment after that is plain integer arithmetic in cents.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN, localcontext
+from functools import lru_cache
+from typing import Iterator, NamedTuple, Tuple
+
+from api.constants import TIER_1_RATE, TIER_1_TERM, TIER_2_RATE, TIER_2_TERM
+
+# Digits kept for the annuity factor. Well beyond the 28 significant digits
+# of the default Decimal context, so rounding to cents is never affected.
+FACTOR_PRECISION = 50
+FACTOR_SCALE = 10 ** 40
+
+# (rate, term) pairs produced by the tiers in api.constants
+CONFIGURED_TERMS: Tuple[Tuple[float, int], ...] = (
+    (TIER_1_RATE, TIER_1_TERM),
+    (TIER_2_RATE, TIER_2_TERM),
+)
+
+
+class AnnuityFactor(NamedTuple):
+    """Monthly payment per unit of principal, as numerator / denominator."""
+    numerator: int
+    denominator: int
+
+
+@lru_cache(maxsize=256)
+def annuity_factor(interest_rate: float, term_months: int) -> AnnuityFactor:
+    """
+    Annuity factor for a (rate, term) pair. This is the only place that
+    does arbitrary-precision exponentiation; results are cached.
+    """
+    if term_months <= 0:
+        raise ValueError("term_months must be > 0")
+
+    with localcontext() as ctx:
+        ctx.prec = FACTOR_PRECISION
+        monthly_rate = (Decimal(interest_rate) / Decimal("100")) / Decimal("12")
+        if monthly_rate == 0:
+            # M = P / n, kept exact
+            return AnnuityFactor(1, term_months)
+        one = Decimal(1)
+        factor = monthly_rate / (one - (one + monthly_rate) ** (Decimal(-term_months)))
+        scaled = (factor * FACTOR_SCALE).to_integral_value(rounding=ROUND_HALF_EVEN)
+    return AnnuityFactor(int(scaled), FACTOR_SCALE)
+
+
+def _round_half_up_div(numerator: int, denominator: int) -> int:
+    """numerator / denominator rounded to an integer, ties away from zero."""
+    sign = -1 if (numerator < 0) != (denominator < 0) else 1
+    numerator, denominator = abs(numerator), abs(denominator)
+    return sign * ((2 * numerator + denominator) // (2 * denominator))
+
+
+def monthly_payment_cents(principal: Decimal, interest_rate: float, term_months: int) -> int:
+    """
+    Amortized monthly payment in integer cents, ROUND_HALF_UP.
+
+    principal may be any Decimal/int; it is used as an exact ratio so
+    amounts with sub-cent digits are still priced exactly.
+    """
+    factor = annuity_factor(interest_rate, term_months)
+    p_num, p_den = Decimal(principal).as_integer_ratio()
+    return _round_half_up_div(p_num * 100 * factor.numerator, p_den * factor.denominator)
+
+
+class ScheduleRow(NamedTuple):
+    month: int
+    payment: Decimal
+    principal: Decimal
+    interest: Decimal
+    balance: Decimal
+
+
+def amortization_schedule(principal: Decimal, interest_rate: float, term_months: int) -> Iterator[ScheduleRow]:
+    """
+    Month by month split of the monthly payment into interest and principal,
+    generated lazily. Interest is charged on the remaining balance and
+    rounded to cents (half up); the last payment absorbs the rounding so the
+    balance ends at exactly zero.
+    """
+    payment = monthly_payment_cents(principal, interest_rate, term_months)
+    rate_num, rate_den = Decimal(interest_rate).as_integer_ratio()
+    p_num, p_den = Decimal(principal).as_integer_ratio()
+    balance = _round_half_up_div(p_num * 100, p_den)
+
+    for month in range(1, term_months + 1):
+        # balance * (rate / 100 / 12), in cents
+        interest = _round_half_up_div(balance * rate_num, rate_den * 1200)
+        paid = balance + interest if month == term_months else min(payment, balance + interest)
+        balance -= paid - interest
+        yield ScheduleRow(
+            month,
+            Decimal(paid).scaleb(-2),
+            Decimal(paid - interest).scaleb(-2),
+            Decimal(interest).scaleb(-2),
+            Decimal(balance).scaleb(-2),
+        )
+
+
+def annuity_cache_info() -> dict:
+    """Size and hit rate of the annuity factor cache."""
+    info = annuity_factor.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+
+# Pre-warm the configured tiers so approvals never pay for the exponentiation
+for _rate, _term in CONFIGURED_TERMS:
+    annuity_factor(_rate, _term)
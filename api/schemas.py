@@ -1,8 +1,11 @@
 from decimal import Decimal
-from typing import Optional
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, EmailStr, constr, Field
+from pydantic import BaseModel, EmailStr, condecimal, conint, constr, Field, model_validator
 
+from api.constants import MAX_BATCH_SIZE, MAX_QUOTE_AMOUNT, MAX_QUOTE_AMOUNTS, MAX_QUOTE_CREDIT_LINES
+from api.metrics import stage
 from api.models import ApplicationStatus
 
 
@@ -23,6 +26,13 @@ class ApplicationRequest(BaseModel):
     borrower: BorrowerRequest
     requested_amount: Decimal = Field(gt=0, decimal_places=2)
 
+    @model_validator(mode="wrap")
+    @classmethod
+    def _timed(cls, data, handler):
+        # The validation stage of the request metrics (api.metrics)
+        with stage("validation"):
+            return handler(data)
+
 
 class OfferResponse(BaseModel):
     total_amount: Decimal
@@ -39,4 +49,86 @@ class ApplicationResponse(BaseModel):
     offer: Optional[OfferResponse] = None
     reason: Optional[str] = None
 
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+class BatchApplicationRequest(BaseModel):
+    # Items are validated one by one against ApplicationRequest so that a
+    # single bad item is reported in its own result instead of failing the batch.
+    applications: List[Dict[str, Any]] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class BatchApplicationResult(BaseModel):
+    index: int
+    application: Optional[ApplicationResponse] = None
+    error: Optional[str] = None
+
+
+class BatchApplicationResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchApplicationResult]
+
+
+class ApplicationListItem(ApplicationResponse):
+    borrower_id: str
+    created_at: datetime
+
+
+class ApplicationListResponse(BaseModel):
+    items: List[ApplicationListItem]
+    # Pass as ?cursor= to get the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+class DecisionSummary(BaseModel):
+    applications: int
+    approved: int
+    denied: int
+    approval_rate: float
+    denials_by_reason: Dict[str, int]
+    tier_mix: Dict[str, int]
+    approved_principal: Decimal
+
+
+class DailyDecisionSummary(DecisionSummary):
+    day: date
+
+
+class StatsResponse(BaseModel):
+    from_day: date
+    to_day: date
+    totals: DecisionSummary
+    days: List[DailyDecisionSummary]
+
+
+class QuoteRequest(BaseModel):
+    # Every amount is quoted against every credit line count
+    amounts: List[condecimal(gt=0, le=MAX_QUOTE_AMOUNT, decimal_places=2)] = Field(min_length=1, max_length=MAX_QUOTE_AMOUNTS)
+    # Default: one count per credit line tier of the decision rules
+    open_credit_lines: Optional[List[conint(ge=0, le=100)]] = Field(
+        default=None, min_length=1, max_length=MAX_QUOTE_CREDIT_LINES
+    )
+    # Stream NDJSON quotes, each approved one with its amortization schedule
+    include_schedule: bool = False
+
+
+class AmortizationRow(BaseModel):
+    month: int
+    payment: Decimal
+    principal: Decimal
+    interest: Decimal
+    balance: Decimal
+
+
+class Quote(BaseModel):
+    requested_amount: Decimal
+    open_credit_lines: int
+    decision: ApplicationStatus
+    offer: Optional[OfferResponse] = None
+    reason: Optional[str] = None
+    schedule: Optional[List[AmortizationRow]] = None
+
+
+class QuoteResponse(BaseModel):
+    # Row-major: all credit line counts of the first amount, then the next
+    quotes: List[Quote]
@@ -1,29 +1,45 @@
 import hmac, os, re
 from hashlib import sha256
-from cryptography.fernet import Fernet, InvalidToken
+from typing import List, Tuple
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
-SSN_ENC_KEY_ENV  = "SSN_ENC_KEY"   # 32-byte urlsafe base64 key (Fernet)
+# Key rotation: SSN_ENC_KEY may list several comma-separated Fernet keys,
+# newest first. The first one encrypts, any of them decrypts.
+# SSN_HASH_KEY is the current HMAC key; SSN_HASH_KEY_PREVIOUS lists retired
+# ones (comma-separated) whose hashes are still accepted on lookup until
+# api.rotation has rewritten every borrower.
+SSN_ENC_KEY_ENV  = "SSN_ENC_KEY"   # 32-byte urlsafe base64 key(s) (Fernet)
 SSN_HASH_KEY_ENV = "SSN_HASH_KEY"  # HMAC key (arbitrary bytes)
+SSN_HASH_KEY_PREVIOUS_ENV = "SSN_HASH_KEY_PREVIOUS"
 
 _ssn_fernet = None
+_primary_fernet = None
 _hash_key = None
+_previous_hash_keys = None
 
 SSN_RE = re.compile(r"^\d{9}$|^\d{3}-\d{2}-\d{4}$")
+_SSN_SEPARATORS_RE = re.compile(r"[-\s]")
+_SSN_DIGITS_RE = re.compile(r"\d{9}")
 
-def _normalize_ssn(ssn: str) -> str:
+def normalize_ssn(ssn: str) -> str:
     # remove dashes/spaces so formats compare the same
-    s = re.sub(r"[-\s]", "", ssn)
-    if not re.fullmatch(r"\d{9}", s):
+    s = _SSN_SEPARATORS_RE.sub("", ssn)
+    if not _SSN_DIGITS_RE.fullmatch(s):
         raise ValueError("Invalid SSN format")
     return s
 
-def _get_fernet() -> Fernet:
-    global _ssn_fernet
+def _split_keys(value: str) -> List[str]:
+    return [k.strip() for k in value.split(",") if k.strip()]
+
+def _get_fernet() -> MultiFernet:
+    global _ssn_fernet, _primary_fernet
     if _ssn_fernet is None:
-        key = os.environ.get(SSN_ENC_KEY_ENV)
-        if not key:
+        keys = _split_keys(os.environ.get(SSN_ENC_KEY_ENV, ""))
+        if not keys:
             raise RuntimeError(f"Missing env {SSN_ENC_KEY_ENV}")
-        _ssn_fernet = Fernet(key.encode("utf-8"))
+        fernets = [Fernet(k.encode("utf-8")) for k in keys]
+        _primary_fernet = fernets[0]
+        _ssn_fernet = MultiFernet(fernets)
     return _ssn_fernet
 
 def _get_hash_key() -> bytes:
@@ -35,14 +51,60 @@ def _get_hash_key() -> bytes:
         _hash_key = k.encode("utf-8")
     return _hash_key
 
-def hash_ssn(ssn: str) -> str:
-    s = _normalize_ssn(ssn)
+def _get_previous_hash_keys() -> Tuple[bytes, ...]:
+    global _previous_hash_keys
+    if _previous_hash_keys is None:
+        keys = _split_keys(os.environ.get(SSN_HASH_KEY_PREVIOUS_ENV, ""))
+        _previous_hash_keys = tuple(k.encode("utf-8") for k in keys)
+    return _previous_hash_keys
+
+def rotation_in_progress() -> bool:
+    """True while retired hash keys are configured (rows may still carry their hashes)."""
+    return bool(_get_previous_hash_keys())
+
+def load_keys() -> None:
+    """Load every key now (app startup) instead of on the first SSN; fails on missing keys."""
+    _get_fernet()
+    _get_hash_key()
+    _get_previous_hash_keys()
+
+def reload_keys() -> None:
+    """Forget cached keys so the next call re-reads the environment."""
+    global _ssn_fernet, _primary_fernet, _hash_key, _previous_hash_keys
+    _ssn_fernet = _primary_fernet = _hash_key = _previous_hash_keys = None
+
+def hash_normalized_ssn(s: str) -> str:
     hk = _get_hash_key()
     mac = hmac.new(hk, s.encode("utf-8"), sha256).hexdigest()  # 64 hex chars
     return mac
 
-def encrypt_ssn(ssn: str) -> str:
-    s = _normalize_ssn(ssn)
+def previous_normalized_ssn_hashes(s: str) -> Tuple[str, ...]:
+    # hashes under retired keys, still valid for lookups during a rotation
+    data = s.encode("utf-8")
+    return tuple(hmac.new(k, data, sha256).hexdigest() for k in _get_previous_hash_keys())
+
+def encrypt_normalized_ssn(s: str) -> str:
     f = _get_fernet()
     token = f.encrypt(s.encode("utf-8"))  # bytes
     return token.decode("utf-8")          # store as text
+
+def decrypt_ssn(token: str) -> str:
+    try:
+        return _get_fernet().decrypt(token.encode("utf-8")).decode("utf-8")
+    except InvalidToken as e:
+        raise ValueError("SSN ciphertext does not match any configured key") from e
+
+def decrypt_ssn_with_key_status(token: str) -> Tuple[str, bool]:
+    # (ssn, True if the newest key produced the token), one decryption
+    # in the common case where it did
+    _get_fernet()
+    try:
+        return _primary_fernet.decrypt(token.encode("utf-8")).decode("utf-8"), True
+    except InvalidToken:
+        return decrypt_ssn(token), False
+
+def hash_ssn(ssn: str) -> str:
+    return hash_normalized_ssn(normalize_ssn(ssn))
+
+def encrypt_ssn(ssn: str) -> str:
+    return encrypt_normalized_ssn(normalize_ssn(ssn))
@@ -0,0 +1,140 @@
+"""
+Serve the API on every core: a pre-forking master for uvicorn workers.
+
+The master imports the app once (preload) and binds the listening socket,
+then forks the workers. They share the imported code copy-on-write, so a
+worker starts in milliseconds instead of re-importing everything, and they
+accept connections from the same socket. Each worker runs the app's
+startup (api.main.lifespan) after the fork: database connections, the
+pool warm-up and the bureau client are never shared between processes.
+
+A worker that exits is replaced. A worker failing at startup (missing
+keys, tables or rules) stops the whole server instead of being restarted
+in a loop. SIGTERM or SIGINT shut the workers down gracefully.
+
+Usage:
+    python -m api.serve [--host 127.0.0.1] [--port 8000] [--workers N]
+
+    WEB_CONCURRENCY     number of workers (default: one per CPU)
+
+Apply schema changes first: python -m api.migrations
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+from api.utils import load_env_file
+
+logger = logging.getLogger("api.serve")
+
+# A worker exiting sooner than this after its fork failed at startup
+STARTUP_GRACE_SECONDS = 10.0
+
+
+def default_workers() -> int:
+    return int(os.environ.get("WEB_CONCURRENCY") or os.cpu_count() or 1)
+
+
+def bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="on", log_level=log_level))
+    server.run(sockets=[sock])
+    if not server.started:
+        # Startup failed (uvicorn logged why)
+        sys.exit(3)
+
+
+def serve(host: str, port: int, workers: int, log_level: str = "info") -> int:
+    """Run until stopped. Returns the exit status."""
+    # Preload: every worker inherits the imported modules and the app object
+    from api.main import app
+
+    sock = bind(host, port)
+    if workers <= 1 or not hasattr(os, "fork"):
+        run_worker(app, sock, log_level)
+        return 0
+
+    children: Dict[int, float] = {}  # pid -> fork time
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                for signum in (signal.SIGTERM, signal.SIGINT):
+                    signal.signal(signum, signal.SIG_DFL)
+                run_worker(app, sock, log_level)
+                status = 0
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 1
+            finally:
+                os._exit(status)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.warning("Serving on http://%s:%d with %d workers (master pid %d)", host, port, workers, os.getpid())
+    for _ in range(workers):
+        spawn()
+
+    status = 0
+    while children:
+        try:
+            pid, wait_status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(wait_status)
+        if time.monotonic() - started < STARTUP_GRACE_SECONDS and code != 0:
+            logger.error("Worker %d failed at startup (exit %d), stopping", pid, code)
+            status = 1
+            stop(signal.SIGTERM, None)
+            continue
+        logger.warning("Worker %d exited (%d), starting a new one", pid, code)
+        spawn()
+    sock.close()
+    return status
+
+
+def main() -> int:
+    load_env_file()
+    parser = argparse.ArgumentParser(description="Serve the API with pre-forked uvicorn workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    return serve(args.host, args.port, args.workers, args.log_level)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
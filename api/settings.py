@@ -0,0 +1,56 @@
+"""
+Settings of one app instance, for api.main.create_app.
+
+    DB_ASYNC                            off   AsyncSession on aiosqlite (see api.database)
+    DB_CREATE_SCHEMA                    off   create missing tables at startup (throwaway
+                                              databases); otherwise run api.migrations first
+    STARTUP_WARM_UP                     on    open the pool, load the SSN keys and exercise
+                                              the request path before serving
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS  3600  background purge of expired keys (0 = off)
+
+plus the storage (api.storage), sharding (api.sharding: DATABASE_SHARD_URLS,
+SHARD_MAP_PATH) and profiler (api.profiling) variables.
+"""
+import os
+from dataclasses import dataclass, field, replace
+from typing import Optional, Tuple
+
+from api.database import async_db_from_env
+from api.profiling import ProfilingSettings
+from api.sharding import shard_map_path_from_env, shard_urls_from_env
+from api.storage import StorageSettings
+
+
+def _flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class AppSettings:
+    storage: StorageSettings = field(default_factory=StorageSettings)
+    # Databases of shards 1.. (shard 0 is storage.url) and their bucket map
+    shard_urls: Tuple[str, ...] = ()
+    shard_map_path: Optional[str] = None
+    db_async: bool = False
+    create_schema: bool = False
+    warm_up: bool = True
+    idempotency_purge_interval: float = 3600.0
+    profiling: ProfilingSettings = field(default_factory=ProfilingSettings)
+
+    @classmethod
+    def from_env(cls, **overrides) -> "AppSettings":
+        """Settings from the environment; keyword arguments win."""
+        settings = cls(
+            storage=StorageSettings.from_env(),
+            shard_urls=shard_urls_from_env(),
+            shard_map_path=shard_map_path_from_env(),
+            db_async=async_db_from_env(),
+            create_schema=_flag("DB_CREATE_SCHEMA", False),
+            warm_up=_flag("STARTUP_WARM_UP", True),
+            idempotency_purge_interval=float(os.environ.get("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", 3600)),
+            profiling=ProfilingSettings.from_env(),
+        )
+        return replace(settings, **overrides)
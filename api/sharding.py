@@ -0,0 +1,496 @@
+"""
+Hash sharding over several databases, for write throughput.
+
+SQLite has one writer per database file. With DATABASE_SHARD_URLS the rows
+are spread over several databases (shards), each with its own writer:
+
+  - A borrower's ssn_hash picks one of SHARD_BUCKETS buckets, and the shard
+    map assigns every bucket to a shard (by default bucket modulo the
+    number of shards). The borrower rows of that SSN, their applications
+    and the applications' daily counters all live on that shard, so a
+    submission is one transaction on one database.
+  - An Idempotency-Key record lives on the shard of its key's own bucket
+    (sha256 of the key), so every request reusing a key finds it, whatever
+    its SSN (see api.idempotency).
+  - New application_ids and borrower_ids carry their bucket
+    (api.utils.generate_uuid), so a GET goes straight to the right shard.
+    IDs from before sharding have no bucket: shard 0 (the original
+    database) is tried first, then the others.
+  - The listing, the export, /stats and the batch API fan out over every
+    shard concurrently and merge the results.
+
+get_db (api.database) gives a request a ShardSessions: a session per shard,
+opened when the request first uses it.
+
+Adding shards:
+  1. Without a SHARD_MAP_PATH file the default map over the configured
+     shards is used: first pin it with `python -m api.sharding plan
+     --shards <current count>`.
+  2. Add the new database to DATABASE_SHARD_URLS and create its schema
+     (python -m api.migrations migrates every shard).
+  3. `python -m api.sharding plan --shards N` saves a map that moves the
+     fewest buckets onto the new shards.
+  4. Restart the API: new writes follow the new map.
+  5. `python -m api.sharding rebalance` moves the rows of every reassigned
+     bucket (resumable), then the Idempotency-Key records.
+Until 5. is done, a GET missing on the bucket's shard tries the others, and
+a returning borrower gets a new borrower row on the new shard, merged with
+the old one when it is moved. A hash key rotation (api.rotation) changes
+ssn_hash and so buckets: rebalance after it too.
+
+Environment:
+    DATABASE_SHARD_URLS  (none)          more shards after DATABASE_URL (shard 0), comma-separated
+    SHARD_MAP_PATH       shard_map.json  the bucket -> shard map (absent: the default one)
+
+Usage:
+    python -m api.sharding plan --shards N
+    python -m api.sharding rebalance [--chunk-size 500] [--pause 0.05] [--checkpoint FILE]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Engine, delete, exists, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from api.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from api.constants import SHARD_BUCKETS
+from api.database import Database, async_db_from_env, default_database
+from api.models import Application, Borrower, IdempotencyKey
+from api.stats import record_decisions
+from api.storage import StorageSettings
+from api.utils import id_bucket, load_env_file
+
+DEFAULT_SHARD_MAP_PATH = "shard_map.json"
+REBALANCE_CHUNK_SIZE = 500
+DEFAULT_CHECKPOINT = "rebalance.checkpoint.json"
+
+
+def bucket_of_hash(ssn_hash: str) -> int:
+    return int(ssn_hash[:8], 16) % SHARD_BUCKETS
+
+
+def bucket_of_key(key: str) -> int:
+    """Bucket of an Idempotency-Key."""
+    return bucket_of_hash(hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+
+def shard_urls_from_env() -> Tuple[str, ...]:
+    """The shards after shard 0 (DATABASE_URL)."""
+    return tuple(url.strip() for url in os.environ.get("DATABASE_SHARD_URLS", "").split(",") if url.strip())
+
+
+def shard_map_path_from_env() -> str:
+    return os.environ.get("SHARD_MAP_PATH") or DEFAULT_SHARD_MAP_PATH
+
+
+class ShardMap:
+    """The shard of every bucket."""
+
+    def __init__(self, buckets: Sequence[int]):
+        if len(buckets) != SHARD_BUCKETS:
+            raise ValueError(f"A shard map assigns exactly {SHARD_BUCKETS} buckets, got {len(buckets)}")
+        self.buckets = tuple(buckets)
+        self.shards = max(self.buckets) + 1
+
+    @classmethod
+    def default(cls, shards: int) -> "ShardMap":
+        return cls([bucket % shards for bucket in range(SHARD_BUCKETS)])
+
+    @classmethod
+    def load(cls, path: Optional[str], shards: int) -> "ShardMap":
+        """The map saved at path, or the default one over `shards` databases."""
+        if path and os.path.exists(path):
+            with open(path) as f:
+                shard_map = cls(json.load(f)["buckets"])
+        else:
+            shard_map = cls.default(shards)
+        if shard_map.shards > shards:
+            raise ValueError(f"Shard map {path} uses {shard_map.shards} shards, only {shards} configured")
+        return shard_map
+
+    def save(self, path: str) -> None:
+        # Atomic, like api.checkpoint: a reader never sees half a map
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"buckets": list(self.buckets)}, f)
+        os.replace(tmp, path)
+
+    def shard_of_hash(self, ssn_hash: str) -> int:
+        return self.buckets[bucket_of_hash(ssn_hash)]
+
+    def shard_of_key(self, key: str) -> int:
+        return self.buckets[bucket_of_key(key)]
+
+    def shard_of_id(self, public_id: str) -> Optional[int]:
+        """Shard of the bucket in an application_id or borrower_id; None for IDs without one."""
+        bucket = id_bucket(public_id)
+        return self.buckets[bucket] if bucket is not None and bucket < SHARD_BUCKETS else None
+
+    def rebalanced(self, shards: int) -> "ShardMap":
+        """This map spread evenly over `shards` shards, moving as few buckets as possible."""
+        buckets = list(self.buckets)
+        owned = defaultdict(list)
+        for bucket, shard in enumerate(buckets):
+            owned[shard].append(bucket)
+
+        def quota(shard: int) -> int:
+            if shard >= shards:
+                return 0
+            return SHARD_BUCKETS // shards + (1 if shard < SHARD_BUCKETS % shards else 0)
+
+        spare = []
+        for shard in range(max(self.shards, shards)):
+            while len(owned[shard]) > quota(shard):
+                spare.append(owned[shard].pop())
+        for shard in range(shards):
+            while len(owned[shard]) < quota(shard):
+                bucket = spare.pop()
+                buckets[bucket] = shard
+                owned[shard].append(bucket)
+        return ShardMap(buckets)
+
+
+class ShardSessions:
+    """
+    The sessions of one request (from get_db): one per shard, opened on
+    first use, all closed when the request is done.
+    """
+
+    def __init__(self, factories: Sequence[Callable], shard_map: ShardMap):
+        self._factories = factories
+        self.map = shard_map
+        self._open: Dict[int, object] = {}
+
+    @property
+    def count(self) -> int:
+        return len(self._factories)
+
+    def factory(self, shard: int = 0) -> Callable:
+        """The sessionmaker of a shard, for sessions that outlive the request (api.group_commit)."""
+        return self._factories[shard]
+
+    def session(self, shard: int = 0):
+        db = self._open.get(shard)
+        if db is None:
+            db = self._open[shard] = self._factories[shard]()
+        return db
+
+    def shard_of_hash(self, ssn_hash: str) -> int:
+        return self.map.shard_of_hash(ssn_hash)
+
+    def shard_of_key(self, key: str) -> int:
+        return self.map.shard_of_key(key)
+
+    def for_ssn_hash(self, ssn_hash: str):
+        """The session of the shard holding a borrower's rows."""
+        return self.session(self.shard_of_hash(ssn_hash))
+
+    def shards_for_id(self, public_id: str) -> List[int]:
+        """Shards to look for an ID on, most likely first: its bucket's, else shard 0."""
+        home = self.map.shard_of_id(public_id)
+        home = 0 if home is None or home >= self.count else home
+        return [home] + [shard for shard in range(self.count) if shard != home]
+
+    def all(self) -> list:
+        """A session on every shard, for fan-out reads."""
+        return [self.session(shard) for shard in range(self.count)]
+
+    async def close(self) -> None:
+        for db in self._open.values():
+            if isinstance(db, AsyncSession):
+                await db.close()
+            else:
+                await run_in_threadpool(db.close)
+        self._open.clear()
+
+
+class ShardedDatabase:
+    """The Database of every shard, and the map routing rows to them."""
+
+    def __init__(self, shards: List[Database], shard_map: ShardMap):
+        if shard_map.shards > len(shards):
+            raise ValueError(f"The shard map uses {shard_map.shards} shards, only {len(shards)} configured")
+        self.shards = shards
+        self.map = shard_map
+
+    @classmethod
+    def from_settings(
+            cls,
+            storage: StorageSettings,
+            shard_urls: Sequence[str] = (),
+            use_async: bool = False,
+            map_path: Optional[str] = None
+    ) -> "ShardedDatabase":
+        """Shard 0 at storage.url, then one per shard URL, all with storage's pool and pragmas."""
+        urls = (storage.url, *shard_urls)
+        databases = [Database(replace(storage, url=url), use_async=use_async) for url in urls]
+        return cls(databases, ShardMap.load(map_path, len(urls)))
+
+    @property
+    def use_async(self) -> bool:
+        return self.shards[0].use_async
+
+    @property
+    def engines(self) -> List[Engine]:
+        """The sync engine of every shard (scripts, exports, background jobs)."""
+        return [database.engine for database in self.shards]
+
+    def sessions(self) -> ShardSessions:
+        factories = [
+            database.AsyncSessionLocal if self.use_async else database.SessionLocal
+            for database in self.shards
+        ]
+        return ShardSessions(factories, self.map)
+
+    def missing_tables(self, metadata) -> Dict[int, set]:
+        """Tables each shard doesn't have, for the shards missing any."""
+        missing = {shard: database.missing_tables(metadata) for shard, database in enumerate(self.shards)}
+        return {shard: tables for shard, tables in missing.items() if tables}
+
+    async def warm_pool(self) -> int:
+        return sum([await database.warm_pool() for database in self.shards])
+
+    def pool_stats(self) -> dict:
+        """Pool usage summed over the shards (empty until the engines are built)."""
+        total = {}
+        for stats in (database.pool_stats() for database in self.shards):
+            for name, value in stats.items():
+                total[name] = total.get(name, 0) + value if isinstance(value, int) else value
+        return total
+
+    async def dispose(self) -> None:
+        for database in self.shards:
+            await database.dispose()
+
+
+_default: Optional[ShardedDatabase] = None
+
+
+def default_shards() -> ShardedDatabase:
+    """Every shard configured by the environment, for scripts; shard 0 is api.database's."""
+    global _default
+    if _default is None:
+        first = default_database()
+        urls = shard_urls_from_env()
+        others = [Database(replace(first.settings, url=url), use_async=async_db_from_env()) for url in urls]
+        _default = ShardedDatabase([first, *others], ShardMap.load(shard_map_path_from_env(), 1 + len(urls)))
+    return _default
+
+
+# Rebalancing
+
+@dataclass
+class RebalanceProgress:
+    shard: int = 0     # the shard being scanned
+    last_id: int = 0   # its last borrower scanned
+    scanned: int = 0
+    moved_borrowers: int = 0
+    moved_applications: int = 0
+    merged: int = 0
+    moved_keys: int = 0
+
+
+def _fetch(conn, table, column, values) -> List[dict]:
+    if not values:
+        return []
+    return [dict(row) for row in conn.execute(select(table).where(column.in_(values))).mappings()]
+
+
+def move_borrowers(source: Engine, target: Engine, borrower_ids: List[int]) -> Tuple[int, int, int]:
+    """
+    Move borrower rows with their applications and daily counters from
+    source to target. Target is committed first; a copy already there (an
+    interrupted move) is reused, so moving again is safe. A borrower whose
+    fingerprint target already has is merged into that row. Returns
+    (borrowers, applications, merged) moved.
+    """
+    borrowers_table, applications_table = Borrower.__table__, Application.__table__
+    with source.connect() as conn:
+        borrowers = _fetch(conn, borrowers_table, borrowers_table.c.id, borrower_ids)
+        applications = _fetch(conn, applications_table, applications_table.c.borrower_id, borrower_ids)
+        application_ids = [row["application_id"] for row in applications]
+
+    merged = 0
+    with Session(target) as db:
+        target_ids = {}
+        for row in borrowers:
+            same = [borrowers_table.c.borrower_id == row["borrower_id"]]
+            if row["fingerprint"] is not None:
+                same.append(borrowers_table.c.fingerprint == row["fingerprint"])
+            existing = db.execute(
+                select(borrowers_table.c.id, borrowers_table.c.borrower_id).where(or_(*same))
+            ).first()
+            if existing is None:
+                values = {name: value for name, value in row.items() if name != "id"}
+                target_ids[row["id"]] = db.execute(insert(borrowers_table).values(**values)).inserted_primary_key[0]
+            else:
+                target_ids[row["id"]] = existing.id
+                merged += existing.borrower_id != row["borrower_id"]
+        present = set(db.execute(
+            select(applications_table.c.application_id).where(applications_table.c.application_id.in_(application_ids))
+        ).scalars()) if application_ids else set()
+        copies = [
+            dict({name: value for name, value in row.items() if name != "id"}, borrower_id=target_ids[row["borrower_id"]])
+            for row in applications if row["application_id"] not in present
+        ]
+        if copies:
+            db.execute(insert(applications_table), copies)
+            record_decisions(db, copies)
+        db.commit()
+
+    with Session(source) as db:
+        if applications:
+            db.execute(delete(applications_table).where(applications_table.c.id.in_([row["id"] for row in applications])))
+            record_decisions(db, applications, sign=-1)
+        # Unless an application was added meanwhile; the next run moves it
+        db.execute(delete(borrowers_table).where(
+            borrowers_table.c.id.in_(borrower_ids),
+            ~exists().where(applications_table.c.borrower_id == borrowers_table.c.id),
+        ))
+        db.commit()
+    return len(borrowers), len(applications), merged
+
+
+def move_keys(engines: Sequence[Engine], shard_map: ShardMap, chunk_size: int = REBALANCE_CHUNK_SIZE) -> int:
+    """
+    Move every Idempotency-Key record not on the shard of its key's bucket,
+    completed copies (api.idempotency) included. Target is committed first
+    and a key already there wins, unless it is an unfinished claim the
+    moved record completes, so moving again is safe. Returns the number of
+    records moved.
+    """
+    # Local import: api.helpers needs this module
+    from api.helpers import insert_ignoring_conflicts
+
+    table = IdempotencyKey.__table__
+    moved = 0
+    for shard, source in enumerate(engines):
+        last_id = 0
+        while True:
+            with source.connect() as conn:
+                rows = [dict(row) for row in conn.execute(
+                    select(table).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+                ).mappings()]
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            misplaced = defaultdict(list)
+            for row in rows:
+                target = shard_map.shard_of_key(row["key"])
+                if target != shard:
+                    misplaced[target].append(row)
+            for target, keys in misplaced.items():
+                with Session(engines[target]) as db:
+                    for row in keys:
+                        if row["response_body"] is not None:
+                            db.execute(update(table).where(
+                                table.c.key == row["key"],
+                                table.c.request_hash == row["request_hash"],
+                                table.c.response_body.is_(None),
+                            ).values(application_id=row["application_id"], status_code=row["status_code"],
+                                     response_body=row["response_body"]))
+                    insert_ignoring_conflicts(db, IdempotencyKey, [
+                        {name: value for name, value in row.items() if name != "id"} for row in keys
+                    ], "key")
+                    db.commit()
+                with source.begin() as conn:
+                    conn.execute(delete(table).where(table.c.id.in_([row["id"] for row in keys])))
+                moved += len(keys)
+    return moved
+
+
+def rebalance(
+        engines: Sequence[Engine],
+        shard_map: ShardMap,
+        chunk_size: int = REBALANCE_CHUNK_SIZE,
+        pause: float = 0.05,
+        checkpoint: Optional[str] = None,
+        max_chunks: Optional[int] = None
+) -> RebalanceProgress:
+    """
+    Move every borrower (and what belongs to it) not on the shard the map
+    assigns its ssn_hash to, then the Idempotency-Key records (move_keys).
+    Walks each shard's borrowers by primary key in chunks; max_chunks stops
+    early (the checkpoint is kept), mostly for tests.
+    """
+    progress = load_checkpoint(checkpoint, RebalanceProgress)
+    table = Borrower.__table__
+    chunks = 0
+    while progress.shard < len(engines) and (max_chunks is None or chunks < max_chunks):
+        source = engines[progress.shard]
+        with source.connect() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.ssn_hash)
+                .where(table.c.id > progress.last_id)
+                .order_by(table.c.id)
+                .limit(chunk_size)
+            ).all()
+        if not rows:
+            progress.shard, progress.last_id = progress.shard + 1, 0
+            save_checkpoint(checkpoint, progress)
+            continue
+
+        misplaced = defaultdict(list)
+        for row in rows:
+            shard = shard_map.shard_of_hash(row.ssn_hash)
+            if shard != progress.shard:
+                misplaced[shard].append(row.id)
+        for shard, borrower_ids in misplaced.items():
+            borrowers, applications, merged = move_borrowers(source, engines[shard], borrower_ids)
+            progress.moved_borrowers += borrowers
+            progress.moved_applications += applications
+            progress.merged += merged
+
+        progress.scanned += len(rows)
+        progress.last_id = rows[-1].id
+        save_checkpoint(checkpoint, progress)
+        chunks += 1
+        if pause:
+            time.sleep(pause)
+    if progress.shard >= len(engines):
+        progress.moved_keys += move_keys(engines, shard_map, chunk_size)
+        clear_checkpoint(checkpoint)
+    return progress
+
+
+def main():
+    load_env_file()
+    parser = argparse.ArgumentParser(description="Plan and apply shard rebalancing.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    plan = commands.add_parser("plan", help="save a map spreading the buckets over N shards")
+    plan.add_argument("--shards", type=int, required=True)
+    move = commands.add_parser("rebalance", help="move rows to the shards the map assigns them to")
+    move.add_argument("--chunk-size", type=int, default=REBALANCE_CHUNK_SIZE)
+    move.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between chunks")
+    move.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    args = parser.parse_args()
+
+    path = shard_map_path_from_env()
+    if args.command == "plan":
+        current = ShardMap.load(path, max(args.shards, 1 + len(shard_urls_from_env())))
+        new = current.rebalanced(args.shards)
+        moved = sum(1 for old, shard in zip(current.buckets, new.buckets) if old != shard)
+        new.save(path)
+        print(f"Saved {path}: {args.shards} shards, {moved} of {SHARD_BUCKETS} buckets reassigned. "
+              f"Restart the API, then run `python -m api.sharding rebalance`.")
+        return
+
+    shards = default_shards()
+    progress = rebalance(shards.engines, shards.map, args.chunk_size, args.pause, args.checkpoint)
+    print(
+        f"Scanned {progress.scanned} borrowers: {progress.moved_borrowers} moved with "
+        f"{progress.moved_applications} applications, {progress.merged} merged into an existing borrower; "
+        f"{progress.moved_keys} idempotency keys moved."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Decision statistics for the dashboards.
+
+daily_decision_stats holds one row per day and bucket (status, denial
+reason, term) with the number of applications and their requested amount.
+record_decisions() adds every new application to its bucket in the same
+transaction as the insert, so the counters never drift from the base table
+and a rolled back insert is never counted. GET /stats then reads a few rows
+per day instead of aggregating the whole applications table.
+
+Each shard (api.sharding) counts its own applications; GET /stats sums the
+shards' rows. Rebuild the table from scratch, or check it against the base
+table and the archived applications (api.archive), on every shard:
+    python -m api.stats rebuild
+    python -m api.stats verify      (exit status 1 on mismatch)
+"""
+import argparse
+import sys
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import Engine, delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from api.constants import TIER_1_TERM, TIER_2_TERM
+from api.models import Application, ApplicationStatus, ApplicationStatusReason, DailyDecisionStats
+from api.utils import load_env_file
+
+# (day, status, reason name or "", term_months or 0)
+Bucket = Tuple[date, ApplicationStatus, str, int]
+
+TIER_BY_TERM = {TIER_1_TERM: "tier_1", TIER_2_TERM: "tier_2"}
+
+
+def _bucket(created_at: datetime, status, reason, term_months) -> Bucket:
+    return (created_at.date(), status, reason.name if reason is not None else "", term_months or 0)
+
+
+def decision_deltas(applications: Iterable, sign: int = 1) -> Dict[Bucket, Tuple[int, Decimal]]:
+    """
+    Aggregate applications (Application rows, or dicts of their columns)
+    into (count, requested amount) per bucket; sign=-1 for applications
+    being removed.
+    """
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for app in applications:
+        if isinstance(app, dict):
+            key = _bucket(app["created_at"], app["application_status"], app["reason"], app["term_months"])
+            amount = app["requested_amount"]
+        else:
+            key = _bucket(app.created_at, app.application_status, app.reason, app.term_months)
+            amount = app.requested_amount
+        delta = deltas[key]
+        delta[0] += sign
+        delta[1] += sign * Decimal(amount)
+    return {key: (count, amount) for key, (count, amount) in deltas.items()}
+
+
+def record_decisions(db: Session, applications: Iterable, sign: int = 1) -> None:
+    """
+    Add applications to the daily counters, inside the caller's transaction
+    (or take them off with sign=-1, when api.sharding moves them away).
+    Application rows must be flushed (created_at is set at flush time).
+    """
+    deltas = decision_deltas(applications, sign)
+    if not deltas:
+        return
+    rows = [
+        dict(day=day, application_status=status, reason=reason, term_months=term,
+             applications=count, requested_amount=amount)
+        for (day, status, reason, term), (count, amount) in deltas.items()
+    ]
+    table = DailyDecisionStats.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite_insert if dialect == "sqlite" else pg_insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["day", "application_status", "reason", "term_months"],
+            set_=dict(
+                applications=table.c.applications + stmt.excluded.applications,
+                requested_amount=table.c.requested_amount + stmt.excluded.requested_amount,
+            ),
+        )
+        db.execute(stmt, rows)
+    else:
+        for row in rows:
+            updated = db.execute(
+                update(table)
+                .where(table.c.day == row["day"], table.c.application_status == row["application_status"],
+                       table.c.reason == row["reason"], table.c.term_months == row["term_months"])
+                .values(applications=table.c.applications + row["applications"],
+                        requested_amount=table.c.requested_amount + row["requested_amount"])
+            )
+            if not updated.rowcount:
+                db.execute(insert(table), [row])
+
+
+def _empty_summary() -> dict:
+    return {
+        "applications": 0,
+        "approved": 0,
+        "denied": 0,
+        "approval_rate": 0.0,
+        "denials_by_reason": {reason.value: 0 for reason in ApplicationStatusReason},
+        "tier_mix": {tier: 0 for tier in TIER_BY_TERM.values()},
+        "approved_principal": Decimal(0),
+    }
+
+
+def _add(summary: dict, status, reason: str, term: int, count: int, amount) -> None:
+    summary["applications"] += count
+    if status is ApplicationStatus.APPROVED:
+        summary["approved"] += count
+        tier = TIER_BY_TERM.get(term, f"term_{term}")
+        summary["tier_mix"][tier] = summary["tier_mix"].get(tier, 0) + count
+        summary["approved_principal"] += Decimal(amount)
+    else:
+        summary["denied"] += count
+        if reason:
+            summary["denials_by_reason"][ApplicationStatusReason[reason].value] += count
+
+
+def _finish(summary: dict) -> dict:
+    if summary["applications"]:
+        summary["approval_rate"] = summary["approved"] / summary["applications"]
+    summary["approved_principal"] = str(summary["approved_principal"].quantize(Decimal("0.01")))
+    return summary
+
+
+def read_stats_rows(db: Session, from_day: date, to_day: date) -> list:
+    """The counter rows of [from_day, to_day], for summarize_stats."""
+    table = DailyDecisionStats.__table__
+    return db.connection().execute(
+        select(table.c.day, table.c.application_status, table.c.reason, table.c.term_months,
+               table.c.applications, table.c.requested_amount)
+        .where(table.c.day >= from_day, table.c.day <= to_day)
+        .order_by(table.c.day)
+    ).all()
+
+
+def summarize_stats(rows: Iterable, from_day: date, to_day: date) -> dict:
+    """
+    Totals and per-day summaries of counter rows (from any number of
+    shards), as a JSON-ready dict.
+    """
+    totals, days = _empty_summary(), {}
+    for day, status, reason, term, count, amount in sorted(rows, key=lambda row: row[0]):
+        if day not in days:
+            days[day] = _empty_summary()
+        _add(days[day], status, reason, term, count, amount)
+        _add(totals, status, reason, term, count, amount)
+
+    return {
+        "from_day": from_day.isoformat(),
+        "to_day": to_day.isoformat(),
+        "totals": _finish(totals),
+        "days": [dict(day=day.isoformat(), **_finish(summary)) for day, summary in days.items()],
+    }
+
+
+def read_stats(db: Session, from_day: date, to_day: date) -> dict:
+    """
+    Totals and per-day summaries for [from_day, to_day], as a JSON-ready
+    dict. Reads only the counters of those days.
+    """
+    return summarize_stats(read_stats_rows(db, from_day, to_day), from_day, to_day)
+
+
+def compute_buckets(conn) -> Dict[Bucket, Tuple[int, Decimal]]:
+    """The counters recomputed from the applications table (full scan)."""
+    day = func.date(Application.created_at)
+    rows = conn.execute(
+        select(day, Application.application_status, Application.reason, Application.term_months,
+               func.count(), func.sum(Application.requested_amount))
+        .group_by(day, Application.application_status, Application.reason, Application.term_months)
+    ).all()
+    buckets = {}
+    for row_day, status, reason, term, count, amount in rows:
+        if isinstance(row_day, str):  # SQLite's date() returns text
+            row_day = date.fromisoformat(row_day)
+        key = (row_day, status, reason.name if reason is not None else "", term or 0)
+        buckets[key] = (count, Decimal(amount).quantize(Decimal("0.01")))
+    return buckets
+
+
+def merge_buckets(buckets: Dict[Bucket, Tuple[int, Decimal]], more: Dict[Bucket, Tuple[int, Decimal]]) -> None:
+    """Add the counters of `more` into `buckets`."""
+    for key, (count, amount) in more.items():
+        total_count, total_amount = buckets.get(key, (0, Decimal(0)))
+        buckets[key] = (total_count + count, total_amount + amount)
+
+
+def expected_buckets(conn, archive=None) -> Dict[Bucket, Tuple[int, Decimal]]:
+    """compute_buckets, plus the archived applications (an api.archive.ApplicationArchive)."""
+    buckets = compute_buckets(conn)
+    if archive is not None:
+        merge_buckets(buckets, archive.compute_buckets())
+    return buckets
+
+
+def stored_buckets(conn) -> Dict[Bucket, Tuple[int, Decimal]]:
+    table = DailyDecisionStats.__table__
+    return {
+        (row.day, row.application_status, row.reason, row.term_months):
+            (row.applications, Decimal(row.requested_amount).quantize(Decimal("0.01")))
+        for row in conn.execute(select(table)) if row.applications
+    }
+
+
+def rebuild_stats(engine: Engine, archive=None) -> int:
+    """Replace the counters with a full recomputation. Returns the number of buckets."""
+    with engine.begin() as conn:
+        buckets = expected_buckets(conn, archive)
+        conn.execute(delete(DailyDecisionStats.__table__))
+        if buckets:
+            conn.execute(insert(DailyDecisionStats.__table__), [
+                dict(day=day, application_status=status, reason=reason, term_months=term,
+                     applications=count, requested_amount=amount)
+                for (day, status, reason, term), (count, amount) in buckets.items()
+            ])
+    return len(buckets)
+
+
+def verify_stats(engine: Engine, archive=None) -> List[str]:
+    """Differences between the counters and the base table; empty when they agree."""
+    with engine.connect() as conn:
+        expected, stored = expected_buckets(conn, archive), stored_buckets(conn)
+    problems = []
+    for key in sorted(expected.keys() | stored.keys(), key=lambda k: (k[0], k[1].value, k[2], k[3])):
+        if expected.get(key) != stored.get(key):
+            day, status, reason, term = key
+            problems.append(
+                f"{day} {status.value} reason={reason or '-'} term={term}: "
+                f"stored {stored.get(key)}, expected {expected.get(key)}"
+            )
+    return problems
+
+
+def main():
+    load_env_file()
+    parser = argparse.ArgumentParser(description="Maintain the daily decision statistics.")
+    parser.add_argument("command", choices=("rebuild", "verify"))
+    args = parser.parse_args()
+
+    from api.archive import ApplicationArchive
+    from api.sharding import default_shards
+
+    archive = ApplicationArchive.from_env()
+    engines = default_shards().engines
+    if args.command == "rebuild":
+        buckets = sum(rebuild_stats(engine, archive.shard(shard)) for shard, engine in enumerate(engines))
+        print(f"Rebuilt {buckets} daily buckets.")
+        return
+    problems = []
+    for shard, engine in enumerate(engines):
+        prefix = f"shard {shard}: " if len(engines) > 1 else ""
+        problems += [prefix + problem for problem in verify_stats(engine, archive.shard(shard))]
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    print("Daily decision statistics match the applications table.")
+
+
+if __name__ == "__main__":
+    main()
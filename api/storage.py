@@ -0,0 +1,149 @@
+"""
+Storage configuration: database URL, connection pool and SQLite pragmas.
+
+Everything is read from the environment so the API and the tests build their
+engines the same way:
+
+    DATABASE_URL            sqlite:///./app.db
+    DB_POOL_SIZE            5
+    DB_MAX_OVERFLOW         10
+    DB_POOL_TIMEOUT         30 (seconds)
+    SQLITE_JOURNAL_MODE     WAL     (readers don't block behind the writer)
+    SQLITE_SYNCHRONOUS      NORMAL  (safe with WAL, one fsync per checkpoint)
+    SQLITE_BUSY_TIMEOUT_MS  5000    (wait for the write lock instead of failing)
+    SQLITE_MMAP_SIZE        268435456 (bytes)
+    SQLITE_CACHE_SIZE       -65536  (negative = KiB, i.e. 64 MiB)
+
+The pragmas are applied to every new pooled connection.
+"""
+import os
+from dataclasses import dataclass, replace
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_LEVELS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+@dataclass(frozen=True)
+class StorageSettings:
+    url: str = "sqlite:///./app.db"
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 268435456
+    sqlite_cache_size: int = -65536
+
+    def __post_init__(self):
+        # Pragmas can't take bound parameters, so only allow known values
+        if self.sqlite_journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError(f"Invalid SQLITE_JOURNAL_MODE: {self.sqlite_journal_mode}")
+        if self.sqlite_synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Invalid SQLITE_SYNCHRONOUS: {self.sqlite_synchronous}")
+
+    @classmethod
+    def from_env(cls, **overrides) -> "StorageSettings":
+        """Settings from the environment; keyword arguments win over env vars."""
+        env = os.environ
+        defaults = cls()
+        settings = cls(
+            url=env.get("DATABASE_URL", defaults.url),
+            pool_size=int(env.get("DB_POOL_SIZE", defaults.pool_size)),
+            max_overflow=int(env.get("DB_MAX_OVERFLOW", defaults.max_overflow)),
+            pool_timeout=float(env.get("DB_POOL_TIMEOUT", defaults.pool_timeout)),
+            sqlite_journal_mode=env.get("SQLITE_JOURNAL_MODE", defaults.sqlite_journal_mode),
+            sqlite_synchronous=env.get("SQLITE_SYNCHRONOUS", defaults.sqlite_synchronous),
+            sqlite_busy_timeout_ms=int(env.get("SQLITE_BUSY_TIMEOUT_MS", defaults.sqlite_busy_timeout_ms)),
+            sqlite_mmap_size=int(env.get("SQLITE_MMAP_SIZE", defaults.sqlite_mmap_size)),
+            sqlite_cache_size=int(env.get("SQLITE_CACHE_SIZE", defaults.sqlite_cache_size)),
+        )
+        return replace(settings, **overrides)
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.url.startswith("sqlite")
+
+    @property
+    def is_memory(self) -> bool:
+        return self.is_sqlite and (":memory:" in self.url or self.url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:"))
+
+    @property
+    def async_url(self) -> str:
+        """Same database through the async driver."""
+        if self.url.startswith("sqlite://"):
+            return self.url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+        if self.url.startswith("postgresql://"):
+            return self.url.replace("postgresql://", "postgresql+asyncpg://", 1)
+        return self.url
+
+    def pragmas(self) -> list:
+        """PRAGMA statements run on every new SQLite connection."""
+        statements = [
+            f"PRAGMA busy_timeout = {int(self.sqlite_busy_timeout_ms)}",
+            f"PRAGMA synchronous = {self.sqlite_synchronous.upper()}",
+            f"PRAGMA cache_size = {int(self.sqlite_cache_size)}",
+            f"PRAGMA mmap_size = {int(self.sqlite_mmap_size)}",
+        ]
+        if not self.is_memory:
+            statements.insert(0, f"PRAGMA journal_mode = {self.sqlite_journal_mode.upper()}")
+        return statements
+
+
+def _engine_kwargs(settings: StorageSettings, overrides: dict) -> dict:
+    kwargs = {}
+    if settings.is_sqlite:
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if "poolclass" not in overrides and not settings.is_memory:
+        kwargs.update(
+            pool_size=settings.pool_size,
+            max_overflow=settings.max_overflow,
+            pool_timeout=settings.pool_timeout,
+        )
+    kwargs.update(overrides)
+    return kwargs
+
+
+def _install_pragmas(engine: Engine, settings: StorageSettings) -> None:
+    if not settings.is_sqlite:
+        return
+    statements = settings.pragmas()
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def create_engine_from_settings(settings: StorageSettings, **overrides) -> Engine:
+    """Sync engine with the configured pool and pragmas."""
+    engine = create_engine(settings.url, **_engine_kwargs(settings, overrides))
+    _install_pragmas(engine, settings)
+    return engine
+
+
+def create_async_engine_from_settings(settings: StorageSettings, **overrides) -> AsyncEngine:
+    """Async engine with the configured pool and pragmas."""
+    engine = create_async_engine(settings.async_url, **_engine_kwargs(settings, overrides))
+    _install_pragmas(engine.sync_engine, settings)
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    """Current connection pool usage for a sync or async engine."""
+    if isinstance(engine, AsyncEngine):
+        engine = engine.sync_engine
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method is not None:
+            stats[name] = method()
+    return stats
@@ -0,0 +1,67 @@
+"""
+Local stand-in for the credit bureau, for tests and benchmarks.
+
+    with run_bureau(latency=0.05, jitter=0.02) as bureau:
+        provider = HTTPCreditCheck(bureau.url)
+
+Answers POST /credit-check with a deterministic open_credit_lines per SSN
+after a configurable delay, and can fail every Nth call with a 503.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from hashlib import sha256
+
+import uvicorn
+from fastapi import FastAPI, Response
+
+
+def expected_open_credit_lines(ssn: str) -> int:
+    return int(sha256(ssn.encode("utf-8")).hexdigest(), 16) % 101
+
+
+class Bureau:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, fail_every: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_every = fail_every
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url = None
+        self.app = FastAPI()
+        self.app.post("/credit-check")(self.credit_check)
+
+    async def credit_check(self, body: dict, response: Response):
+        self.calls += 1
+        call = self.calls
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+            if self.fail_every and call % self.fail_every == 0:
+                response.status_code = 503
+                return {"detail": "unavailable"}
+            return {"open_credit_lines": expected_open_credit_lines(body["ssn"])}
+        finally:
+            self.in_flight -= 1
+
+
+@contextmanager
+def run_bureau(**options):
+    """Serve a Bureau on a free local port in a background thread."""
+    bureau = Bureau(**options)
+    server = uvicorn.Server(uvicorn.Config(bureau.app, host="127.0.0.1", port=0, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    bureau.url = f"http://127.0.0.1:{port}"
+    try:
+        yield bureau
+    finally:
+        server.should_exit = True
+        thread.join()
@@ -1,45 +1,92 @@
 # tests/conftest.py
 import os
 import pytest
+from cryptography.fernet import Fernet
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-from api.main import app, get_db
+from api import security
+from api.main import app, application_cache, get_db, idempotency_store
 from api.models import Base
+from api.sharding import ShardMap, ShardSessions
+from api.storage import StorageSettings, create_async_engine_from_settings, create_engine_from_settings
 
 TEST_DATABASE_URL = "sqlite:///./test_app.db"
 
+# Throwaway SSN keys so tests that create borrowers don't need a .env file
+os.environ.setdefault("SSN_ENC_KEY", Fernet.generate_key().decode("utf-8"))
+os.environ.setdefault("SSN_HASH_KEY", "test-hash-key")
 
-@pytest.fixture(scope="function")
-def test_db():
-    """Create a fresh test database for each test."""
-    engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="function", params=["sync", "async"])
+def test_db(request):
+    """
+    Create a fresh test database for each test.
+    Every test runs twice: with the sync Session and the async (DB_ASYNC) session.
+    The yielded sessionmaker is always sync, for direct assertions.
+    """
+    # Same pool and pragma settings as the app, only the URL differs
+    settings = StorageSettings.from_env(url=TEST_DATABASE_URL)
+    engine = create_engine_from_settings(settings)
+    TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
     # Create schema
     Base.metadata.create_all(bind=engine)
 
-    # Dependency override
-    def override_get_db():
-        db = TestSessionLocal()
+    # NullPool: aiosqlite connections are bound to the TestClient's event loop
+    async_engine = create_async_engine_from_settings(settings, poolclass=NullPool)
+    TestAsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=async_engine)
+
+    # Dependency override: a single shard on the test database
+    factory = TestAsyncSessionLocal if request.param == "async" else TestSessionLocal
+
+    async def override_get_db():
+        sessions = ShardSessions([factory], ShardMap.default(1))
         try:
-            yield db
+            yield sessions
         finally:
-            db.close()
+            await sessions.close()
 
     app.dependency_overrides[get_db] = override_get_db
 
+    # Cached responses from a previous test's database must not leak in
+    application_cache.clear()
+    idempotency_store.clear()
+
     yield TestSessionLocal
 
     # Teardown
     app.dependency_overrides.clear()
     Base.metadata.drop_all(bind=engine)
-    if os.path.exists("test_app.db"):
-        os.remove("test_app.db")
+    engine.dispose()
+    for path in ("test_app.db", "test_app.db-wal", "test_app.db-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
 
 @pytest.fixture
 def client(test_db):
     """FastAPI test client that uses the test DB via dependency override."""
     return TestClient(app)
+
+
+@pytest.fixture
+def keys():
+    """Switch SSN keys inside a test; the throwaway keys above are restored afterwards."""
+    names = ("SSN_ENC_KEY", "SSN_HASH_KEY", "SSN_HASH_KEY_PREVIOUS")
+    saved = {name: os.environ.get(name) for name in names}
+
+    def use(enc, hash_key, previous=""):
+        os.environ.update(SSN_ENC_KEY=enc, SSN_HASH_KEY=hash_key, SSN_HASH_KEY_PREVIOUS=previous)
+        security.reload_keys()
+
+    yield use
+
+    for name, value in saved.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+    security.reload_keys()
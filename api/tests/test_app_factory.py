@@ -0,0 +1,62 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+
+from api import main
+from api.migrations import upgrade
+from api.settings import AppSettings
+from api.storage import StorageSettings, create_engine_from_settings
+from api.tests.test_api import create_borrower_dict
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    # create_app() points the pool metrics at its database: restore the module's afterwards
+    monkeypatch.setattr(main, "database", main.database)
+    storage = StorageSettings.from_env(url=f"sqlite:///{tmp_path / 'factory.db'}")
+    return AppSettings(storage=storage, idempotency_purge_interval=0)
+
+
+def migrate(settings):
+    engine = create_engine_from_settings(settings.storage)
+    upgrade(engine)
+    engine.dispose()
+
+
+def test_startup_warms_up_and_serves(settings, monkeypatch):
+    migrate(settings)
+    timings = {}
+
+    async def recording_warm_up(app):
+        timings.update(await warm_up(app))
+        return timings
+
+    warm_up = main.warm_up
+    monkeypatch.setattr(main, "warm_up", recording_warm_up)
+    app = main.create_app(settings)
+    assert app.state.database.pool_stats() == {}  # nothing connected before startup
+
+    with TestClient(app) as client:
+        assert set(timings) == {"keys_and_rules", "schema_check", "pool", "request_path", "routes"}
+        assert client.get("/health").json()["db_pool"]["checkedin"] == settings.storage.pool_size
+
+        response = client.post("/applications", json={"borrower": create_borrower_dict(), "requested_amount": 25000})
+        assert response.status_code == 201
+        # The rehearsed submission was rolled back
+        assert len(client.get("/applications").json()["items"]) == 1
+
+
+def test_startup_fails_on_missing_tables(settings):
+    app = main.create_app(settings)
+    with pytest.raises(RuntimeError, match="api.migrations"):
+        with TestClient(app):
+            pass
+
+
+def test_create_schema_at_startup(settings):
+    app = main.create_app(AppSettings(**{**settings.__dict__, "create_schema": True, "warm_up": False}))
+    with TestClient(app) as client:
+        assert client.get("/health").json()["ok"] is True
+        engine = create_engine_from_settings(settings.storage)
+        assert "applications" in inspect(engine).get_table_names()
+        engine.dispose()
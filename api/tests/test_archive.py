@@ -0,0 +1,118 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import OperationalError
+
+from api import archive as archive_module
+from api import main
+from api.archive import ApplicationArchive, archive_applications, archive_cutoff
+from api.models import Application, Borrower
+from api.stats import rebuild_stats, verify_stats
+from api.tests.test_api import create_borrower_dict
+
+CUTOFF = datetime(2025, 3, 1)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ApplicationArchive(str(tmp_path / "archive"))
+    yield archive
+    archive.close()
+
+
+def submit(client, created_at, count=1):
+    """Applications through the API, and the created_at backdate() gives them."""
+    ids = []
+    for _ in range(count):
+        response = client.post("/applications", json={"borrower": create_borrower_dict(), "requested_amount": 25000})
+        ids.append(response.json()["application_id"])
+    return ids, created_at
+
+
+def backdate(test_db, batches):
+    with test_db() as db:
+        for ids, created_at in batches:
+            db.execute(
+                Application.__table__.update()
+                .where(Application.application_id.in_(ids))
+                .values(created_at=created_at)
+            )
+        db.commit()
+
+
+def test_cutoff_is_a_month_start():
+    assert archive_cutoff(date(2025, 9, 15), 180) == datetime(2025, 3, 1)
+
+
+def test_old_applications_move_to_monthly_partitions(client, test_db, archive, monkeypatch):
+    january, february, recent = (
+        submit(client, datetime(2025, 1, 10), 3),
+        submit(client, datetime(2025, 2, 20), 2),
+        submit(client, datetime(2025, 3, 1), 1),
+    )
+    backdate(test_db, [january, february, recent])
+    expected = {app_id: client.get(f"/applications/{app_id}").json() for app_id in january[0] + february[0]}
+    main.application_cache.clear()
+
+    progress = archive_applications(test_db.kw["bind"], archive, CUTOFF, chunk_size=2, pause=0)
+
+    assert (progress.moved, progress.chunks, progress.months) == (5, 3, 2)
+    assert archive.months() == [202501, 202502]
+    with test_db() as db:
+        assert db.execute(select(Application.application_id)).scalars().all() == recent[0]
+        assert db.execute(select(func.count()).select_from(Borrower)).scalar_one() == 1  # borrowers stay
+
+    # GET falls through to the archive
+    monkeypatch.setattr(main, "archive", archive)
+    for app_id, body in expected.items():
+        assert client.get(f"/applications/{app_id}").json() == body
+    assert client.get("/applications/application_missing").status_code == 404
+    assert archive.stats()["hits"] == len(expected)
+
+
+def test_interrupted_run_resumes_without_duplicates(client, test_db, archive, monkeypatch):
+    backdate(test_db, [submit(client, datetime(2025, 1, 10), 4)])
+    engine = test_db.kw["bind"]
+
+    def crash(engine, ids):
+        raise RuntimeError("killed")
+
+    # Copied into the archive, but killed before deleting from app.db
+    with monkeypatch.context() as patch:
+        patch.setattr(archive_module, "_delete_chunk", crash)
+        with pytest.raises(RuntimeError):
+            archive_applications(engine, archive, CUTOFF, chunk_size=3, pause=0)
+
+    archive_applications(engine, archive, CUTOFF, chunk_size=3, pause=0)
+
+    with archive._reader(archive.partition_path(202501)).connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Application)).scalar_one() == 4
+    with test_db() as db:
+        assert db.execute(select(func.count()).select_from(Application)).scalar_one() == 0
+
+
+def test_partitions_are_read_only_and_memory_mapped(client, test_db, archive):
+    backdate(test_db, [submit(client, datetime(2025, 1, 10))])
+    archive_applications(test_db.kw["bind"], archive, CUTOFF, pause=0)
+
+    reader = archive._reader(archive.partition_path(202501))
+    with reader.connect() as conn:
+        assert conn.execute(text("PRAGMA mmap_size")).scalar_one() == archive.mmap_size
+        with pytest.raises(OperationalError):
+            conn.execute(insert(Borrower).values(
+                borrower_id="borrower_x", first_name="A", last_name="B", email="a@b.com", phone="5551234567",
+                address_street="1 St", city="C", state="NY", zip_code="1", ssn_encrypted="x", ssn_hash="x",
+            ))
+
+
+def test_stats_count_archived_applications(client, test_db, archive):
+    backdate(test_db, [submit(client, datetime(2025, 1, 10), 2), submit(client, datetime(2025, 6, 1))])
+    engine = test_db.kw["bind"]
+    rebuild_stats(engine)
+    archive_applications(engine, archive, CUTOFF, pause=0)
+
+    assert verify_stats(engine, archive) == []
+    assert verify_stats(engine)  # app.db alone no longer has them
+    rebuild_stats(engine, archive)
+    assert verify_stats(engine, archive) == []
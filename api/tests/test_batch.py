@@ -0,0 +1,81 @@
+from sqlalchemy import Engine, event, func, select
+
+from api.constants import MAX_BATCH_SIZE
+from api.models import Application, Borrower
+from api.tests.test_api import create_borrower_dict
+
+
+def batch_item(amount=25000, **borrower_overrides) -> dict:
+    return {"borrower": create_borrower_dict(**borrower_overrides), "requested_amount": amount}
+
+
+def test_batch_creates_every_valid_item(client, test_db):
+    items = [batch_item(ssn=f"123-45-{i:04d}") for i in range(20)]
+
+    response = client.post("/applications/batch", json={"applications": items})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["succeeded"] == 20
+    assert body["failed"] == 0
+    assert [r["index"] for r in body["results"]] == list(range(20))
+    assert all(r["application"]["application_id"].startswith("application_") for r in body["results"])
+
+    with test_db() as db:
+        assert db.scalar(select(func.count()).select_from(Application)) == 20
+
+
+def test_batch_reports_partial_failures_without_rolling_back(client, test_db):
+    items = [
+        batch_item(),
+        batch_item(email="not-an-email"),
+        batch_item(amount=5000),       # valid request, denied by the rules
+        {"requested_amount": 25000},   # missing borrower
+    ]
+
+    body = client.post("/applications/batch", json={"applications": items}).json()
+
+    assert body["succeeded"] == 2
+    assert body["failed"] == 2
+    ok, bad_email, denied, missing = body["results"]
+    assert ok["error"] is None and ok["application"] is not None
+    assert "email" in bad_email["error"] and bad_email["application"] is None
+    assert denied["application"]["decision"] == "denied"
+    assert "borrower" in missing["error"]
+
+    # Saved items are readable through the single-record endpoint
+    app_id = ok["application"]["application_id"]
+    assert client.get(f"/applications/{app_id}").status_code == 200
+
+
+def test_batch_reuses_identical_borrowers(client, test_db):
+    client.post("/applications", json=batch_item())
+    items = [batch_item(), batch_item(), batch_item(first_name="Jane")]
+
+    body = client.post("/applications/batch", json={"applications": items}).json()
+
+    assert body["succeeded"] == 3
+    with test_db() as db:
+        # John (posted once, then twice in the batch) and Jane
+        assert db.scalar(select(func.count()).select_from(Borrower)) == 2
+
+
+def test_batch_commits_once(client, test_db):
+    commits = []
+    listener = lambda conn: commits.append(1)
+    # Listen on every engine: the request may run on the sync or the async one
+    event.listen(Engine, "commit", listener)
+    try:
+        items = [batch_item(ssn=f"987-65-{i:04d}") for i in range(50)]
+        response = client.post("/applications/batch", json={"applications": items})
+    finally:
+        event.remove(Engine, "commit", listener)
+
+    assert response.json()["succeeded"] == 50
+    assert len(commits) == 1
+
+
+def test_batch_size_is_bounded(client):
+    items = [batch_item()] * (MAX_BATCH_SIZE + 1)
+    assert client.post("/applications/batch", json={"applications": items}).status_code == 422
+    assert client.post("/applications/batch", json={"applications": []}).status_code == 422
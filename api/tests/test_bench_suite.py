@@ -0,0 +1,37 @@
+import json
+
+from benchmarks import suite
+
+
+def run(tmp_path, *args):
+    return suite.main(["--quick", "--filter", "security.hash_ssn", "--output", str(tmp_path / "latest.json"), *args])
+
+
+def test_compare_applies_thresholds():
+    baseline = {"a": {"best_us": 10.0}, "b": {"best_us": 10.0}, "gone": {"best_us": 1.0}}
+    results = {"a": {"best_us": 14.0}, "b": {"best_us": 14.0}, "new": {"best_us": 1.0}}
+
+    rows = suite.compare(results, baseline, {"b": 0.2}, default_threshold=0.5)
+
+    assert [(name, regressed) for name, *_, regressed in rows] == [("a", False), ("b", True)]
+
+
+def test_normalize_discounts_a_slower_machine():
+    baseline = {suite.CALIBRATION: {"best_us": 50.0}, "a": {"best_us": 10.0}}
+    results = {suite.CALIBRATION: {"best_us": 100.0}, "a": {"best_us": 19.0}}
+
+    assert suite.compare(results, baseline, {}, 0.5)[0][-1]
+    assert not suite.compare(results, baseline, {}, 0.5, normalize=True)[0][-1]
+
+
+def test_slower_hot_path_fails_the_run(tmp_path, monkeypatch):
+    baseline = tmp_path / "baseline.json"
+    assert run(tmp_path, "--save-baseline", str(baseline)) == 0
+    written = json.loads((tmp_path / "latest.json").read_text())
+    assert set(written["results"]) == {suite.CALIBRATION, "security.hash_ssn"}
+
+    hash_ssn = suite.hash_ssn
+    monkeypatch.setattr(suite, "hash_ssn", lambda ssn: [hash_ssn(ssn) for _ in range(3)][0])
+
+    assert run(tmp_path, "--baseline", str(baseline)) == 1
+    assert run(tmp_path, "--baseline", str(baseline), "--threshold", "security.hash_ssn=5") == 0
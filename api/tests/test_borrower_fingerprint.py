@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func, inspect, select, text, insert
+
+from api.helpers import borrower_fingerprint, find_or_create_borrower
+from api.migrations import add_borrower_fingerprint
+from api.models import Application, Base, Borrower
+from api.security import encrypt_ssn, hash_ssn
+from api.tests.test_api import create_valid_borrower
+
+
+def test_fingerprint_normalizes_fields():
+    ssn_hash = hash_ssn("123-45-6789")
+    a = create_valid_borrower(email="John.Doe@Example.com", phone="555-123-4567", city=" New  York")
+    b = create_valid_borrower(email="john.doe@example.com", phone="(555) 123 4567", city="new york")
+    c = create_valid_borrower(zip_code="10002")
+
+    assert borrower_fingerprint(a, ssn_hash) == borrower_fingerprint(b, ssn_hash)
+    assert borrower_fingerprint(a, ssn_hash) != borrower_fingerprint(c, ssn_hash)
+    assert borrower_fingerprint(a, ssn_hash) != borrower_fingerprint(a, hash_ssn("987-65-4321"))
+
+
+def test_find_or_create_borrower_reuses_row(test_db):
+    with test_db() as db:
+        first = find_or_create_borrower(db, create_valid_borrower())
+        again = find_or_create_borrower(db, create_valid_borrower(ssn="123456789"))
+        changed = find_or_create_borrower(db, create_valid_borrower(city="Boston"))
+        db.commit()
+
+        assert first.id == again.id
+        assert changed.id != first.id
+        assert first.fingerprint == borrower_fingerprint(create_valid_borrower(), first.ssn_hash)
+
+
+def test_concurrent_identical_submissions_share_one_row(test_db):
+    def submit(_):
+        with test_db() as db:
+            borrower = find_or_create_borrower(db, create_valid_borrower())
+            db.commit()
+            return borrower.id
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = set(pool.map(submit, range(16)))
+
+    assert len(ids) == 1
+    with test_db() as db:
+        assert db.scalar(select(func.count()).select_from(Borrower)) == 1
+
+
+def test_migration_backfills_and_merges_duplicates(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # Recreate the pre-fingerprint schema
+        conn.execute(text("DROP INDEX ix_borrowers_fingerprint"))
+        conn.execute(text("ALTER TABLE borrowers DROP COLUMN fingerprint"))
+
+        def legacy_borrower(borrower_id, **overrides):
+            b = create_valid_borrower(**overrides)
+            row = b.model_dump(exclude={"ssn"})
+            row.update(borrower_id=borrower_id, ssn_hash=hash_ssn(b.ssn), ssn_encrypted=encrypt_ssn(b.ssn))
+            return conn.execute(insert(Borrower).values(**row).returning(Borrower.id)).scalar_one()
+
+        def legacy_application(application_id, borrower_id):
+            conn.execute(text(
+                "INSERT INTO applications (application_id, borrower_id, open_credit_lines, requested_amount, "
+                "application_status, created_at, updated) VALUES (:a, :b, 5, 20000, 'DENIED', "
+                "CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+            ), {"a": application_id, "b": borrower_id})
+
+        original = legacy_borrower("borrower_1")
+        duplicate = legacy_borrower("borrower_2")
+        variant = legacy_borrower("borrower_3", email="JOHN.DOE@example.com")
+        other = legacy_borrower("borrower_4", city="Boston")
+        legacy_application("application_1", duplicate)
+        legacy_application("application_2", variant)
+
+    assert add_borrower_fingerprint(engine, chunk_size=1) == 3
+    # Idempotent
+    assert add_borrower_fingerprint(engine, chunk_size=1) == 0
+
+    with engine.connect() as conn:
+        # Only the identical snapshot is merged; the case variant is kept, unfingerprinted
+        rows = dict(conn.execute(select(Borrower.id, Borrower.fingerprint).order_by(Borrower.id)).all())
+        assert list(rows) == [original, variant, other]
+        assert rows[variant] is None
+        assert None not in (rows[original], rows[other])
+        owners = dict(conn.execute(select(Application.application_id, Application.borrower_id)).all())
+        assert owners == {"application_1": original, "application_2": variant}
+
+    indexes = {ix["name"]: ix for ix in inspect(engine).get_indexes("borrowers")}
+    assert indexes["ix_borrowers_fingerprint"]["unique"]
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from sqlalchemy import event, select
+
+from api.helpers import create_application, find_or_create_borrower
+from api.listing import fetch_borrower_history_page
+from api.models import Application, Borrower
+from api.schemas import ApplicationRequest
+from api.tests.test_api import create_borrower_dict, create_valid_borrower
+from api.tests.test_listing import START
+from api.tests.test_rotation import NEW_ENC_KEY, OLD_ENC_KEY
+
+
+def submit(client, **borrower):
+    response = client.post("/applications", json={"borrower": create_borrower_dict(**borrower), "requested_amount": 25000})
+    assert response.status_code == 201
+    return response.json()["application_id"]
+
+
+def borrower_id_of(session_factory, application_id):
+    with session_factory() as db:
+        return db.execute(
+            select(Borrower.borrower_id).join(Application).where(Application.application_id == application_id)
+        ).scalar_one()
+
+
+def walk(client, borrower_id, limit):
+    ids, cursor = [], None
+    while True:
+        params = dict(limit=limit, **({"cursor": cursor} if cursor else {}))
+        body = client.get(f"/borrowers/{borrower_id}/applications", params=params).json()
+        ids += [item["application_id"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_history_spans_every_snapshot(client, test_db):
+    first = submit(client)
+    moved = submit(client, address_street="9 Other St")  # new details: a new borrower row
+    submit(client, ssn="987-65-4321")                    # someone else
+    again = submit(client)                               # back at the first snapshot
+
+    old_snapshot = borrower_id_of(test_db, first)
+    new_snapshot = borrower_id_of(test_db, moved)
+    assert old_snapshot != new_snapshot
+
+    for borrower_id in (old_snapshot, new_snapshot):
+        assert walk(client, borrower_id, limit=2) == [again, moved, first]
+
+    items = client.get(f"/borrowers/{new_snapshot}/applications").json()["items"]
+    assert [item["borrower_id"] for item in items] == [old_snapshot, new_snapshot, old_snapshot]
+
+
+def test_unknown_borrower_and_invalid_cursor(client, test_db):
+    assert client.get("/borrowers/borrower_missing/applications").status_code == 404
+
+    borrower_id = borrower_id_of(test_db, submit(client))
+    assert client.get(f"/borrowers/{borrower_id}/applications", params={"cursor": "bad"}).status_code == 400
+    assert client.get(f"/borrowers/{borrower_id}/applications", params={"limit": 0}).status_code == 422
+
+
+def test_page_is_two_queries_however_long_the_history(test_db):
+    with test_db() as db:
+        for i in range(300):
+            borrower = find_or_create_borrower(db, create_valid_borrower(zip_code=f"{10000 + i % 30}"))
+            db.add(Application(
+                borrower_id=borrower.id, open_credit_lines=5, requested_amount=Decimal(25000),
+                application_status="approved", interest_rate=Decimal(10), term_months=36,
+                monthly_payment=Decimal("806.68"), created_at=START + timedelta(minutes=i), updated=START,
+            ))
+        db.commit()
+        borrower_id = borrower.borrower_id
+
+    statements = []
+    engine = test_db.kw["bind"]
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with test_db() as db:
+        items, cursor = fetch_borrower_history_page(db, borrower_id, limit=50)
+        more, _ = fetch_borrower_history_page(db, borrower_id, limit=50, cursor=cursor)
+
+    assert len(items) == len(more) == 50
+    assert items[0]["created_at"] == (START + timedelta(minutes=299)).isoformat()
+    assert len(statements) == 4  # borrower lookup and page, twice
+
+
+def test_history_during_hash_key_rotation(keys, test_db):
+    keys(OLD_ENC_KEY, "old-hash-key")
+    request = ApplicationRequest(borrower=create_valid_borrower(), requested_amount=25000)
+    with test_db() as db:
+        before = create_application(db, request, open_credit_lines=5).application_id
+
+    # Rows written after the key change have the new hash; older ones keep the old one
+    keys(f"{NEW_ENC_KEY},{OLD_ENC_KEY}", "new-hash-key", previous="old-hash-key")
+    moved = ApplicationRequest(borrower=create_valid_borrower(city="Boston"), requested_amount=25000)
+    with test_db() as db:
+        record = create_application(db, moved, open_credit_lines=5)
+        items, _ = fetch_borrower_history_page(db, record.borrower.borrower_id, limit=10)
+
+    assert [item["application_id"] for item in items] == [record.application_id, before]
@@ -0,0 +1,133 @@
+import csv
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from api.bulk_import import ImportProgress, file_source, import_file
+from api.checkpoint import save_checkpoint
+from api.models import Application, Base, Borrower
+from api.tests.test_api import create_borrower_dict
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def write_ndjson(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write((record if isinstance(record, str) else json.dumps(record)) + "\n")
+    return str(path)
+
+
+def record(i, **overrides):
+    return dict({
+        "borrower": create_borrower_dict(ssn=f"123-45-{i:04d}"),
+        "requested_amount": "25000.00",
+        "open_credit_lines": 20,
+    }, **overrides)
+
+
+def count(engine, model):
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(model))
+
+
+def test_imports_valid_records_and_rejects_the_rest(engine, tmp_path):
+    path = write_ndjson(tmp_path / "apps.ndjson", [
+        record(1, created_at="2020-03-01T12:00:00+02:00"),
+        record(1),                                   # same borrower again
+        record(2, borrower=create_borrower_dict(email="not-an-email")),
+        "{not json",
+        record(3, borrower=create_borrower_dict(ssn="12-34")),
+        record(4, open_credit_lines=500),
+        record(5, requested_amount="5000.00"),       # valid, denied by the rules
+    ])
+    rejects = tmp_path / "rejects.ndjson"
+
+    progress = import_file(engine, path, chunk_size=3, rejects_path=str(rejects))
+
+    assert progress == ImportProgress(records=7, imported=3, rejected=4, source=file_source(path))
+    assert [r["record"] for r in map(json.loads, rejects.read_text().splitlines())] == [3, 4, 5, 6]
+    assert count(engine, Application) == 3
+    assert count(engine, Borrower) == 2
+    with engine.connect() as conn:
+        first = conn.execute(select(Application).order_by(Application.id)).first()
+        assert first.created_at == datetime(2020, 3, 1, 10, 0)
+        assert first.open_credit_lines == 20
+        assert first.term_months == 24  # tier 2: 10-50 credit lines
+
+
+def test_imports_csv(engine, tmp_path):
+    path = tmp_path / "apps.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[*create_borrower_dict(), "requested_amount"])
+        writer.writeheader()
+        for i in range(5):
+            writer.writerow(dict(create_borrower_dict(ssn=f"123-45-{i:04d}"), requested_amount="20000.00"))
+
+    progress = import_file(engine, str(path), chunk_size=2)
+
+    assert (progress.imported, progress.rejected) == (5, 0)
+    assert count(engine, Borrower) == 5
+
+
+def test_resumes_from_checkpoint_without_duplicates(engine, tmp_path):
+    records = [record(i) for i in range(10)]
+    records[1] = records[6] = "{not json"
+    path = write_ndjson(tmp_path / "apps.ndjson", records)
+    checkpoint = str(tmp_path / "apps.checkpoint.json")
+    rejects = tmp_path / "rejects.ndjson"
+
+    partial = import_file(engine, path, chunk_size=4, checkpoint=checkpoint, rejects_path=str(rejects), max_chunks=1)
+    assert (partial.records, partial.imported, partial.rejected) == (4, 3, 1)
+    assert count(engine, Application) == 3
+
+    # A crash between commit and checkpoint: the chunk is replayed, not duplicated
+    save_checkpoint(checkpoint, ImportProgress(records=1, imported=1))
+    done = import_file(engine, path, chunk_size=4, checkpoint=checkpoint, rejects_path=str(rejects))
+
+    assert (done.records, done.imported, done.skipped, done.rejected) == (10, 6, 2, 2)
+    assert count(engine, Application) == 8
+    assert [r["record"] for r in map(json.loads, rejects.read_text().splitlines())] == [2, 7]
+
+
+def test_another_file_of_the_same_name_is_not_skipped(engine, tmp_path):
+    first = write_ndjson(tmp_path / "apps.ndjson", [record(i) for i in range(3)])
+    assert import_file(engine, first).imported == 3
+    second = write_ndjson(tmp_path / "apps.ndjson", [record(i) for i in range(3, 6)])
+
+    progress = import_file(engine, second)
+
+    assert (progress.imported, progress.skipped) == (3, 0)
+    assert count(engine, Application) == 6
+    # The same content again is recognised as already imported
+    assert import_file(engine, second).skipped == 3
+    assert import_file(engine, second, source="delivery-7").imported == 3
+    assert import_file(engine, second, source="delivery-7").skipped == 3
+    assert count(engine, Application) == 9
+
+
+def test_checkpoint_of_another_source_is_refused(engine, tmp_path):
+    path = write_ndjson(tmp_path / "apps.ndjson", [record(i) for i in range(3)])
+    checkpoint = str(tmp_path / "apps.checkpoint.json")
+    save_checkpoint(checkpoint, ImportProgress(records=1, imported=1, source="another-file"))
+
+    with pytest.raises(ValueError, match="another source"):
+        import_file(engine, path, checkpoint=checkpoint)
+    assert count(engine, Application) == 0
+
+
+def test_process_pool(engine, tmp_path):
+    path = write_ndjson(tmp_path / "apps.ndjson", [record(i) for i in range(40)] + ["[]"])
+
+    progress = import_file(engine, path, workers=2, chunk_size=5)
+
+    assert (progress.imported, progress.rejected) == (40, 1)
+    assert count(engine, Application) == 40
@@ -0,0 +1,169 @@
+import asyncio
+import fnmatch
+
+from sqlalchemy import Engine, event
+
+from api import main
+from api.cache import MISS, NOT_FOUND, LRUResponseCache, RedisResponseCache
+from api.main import application_cache
+from api.tests.test_batch import batch_item
+
+
+def make_response(application_id: str) -> bytes:
+    return f'{{"application_id":"{application_id}"}}'.encode()
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUResponseCache(max_size=2)
+    cache.set("a", make_response("a"))
+    cache.set("b", make_response("b"))
+    cache.get("a")
+    cache.set("c", make_response("c"))
+
+    assert cache.get("b") is MISS
+    assert cache.get("a") == make_response("a")
+    assert cache.get("c") == make_response("c")
+
+
+def test_lru_expires_entries():
+    cache = LRUResponseCache(ttl=0, negative_ttl=0)
+    cache.set("a", make_response("a"))
+    cache.set_not_found("b")
+
+    assert cache.get("a") is MISS
+    assert cache.get("b") is MISS
+
+
+def test_lru_counts_hits_and_misses():
+    cache = LRUResponseCache()
+    cache.set("a", make_response("a"))
+    cache.set_not_found("b")
+    cache.get("a")
+    cache.get("b")
+    cache.get("c")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["negative_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["size"] == 2
+
+
+def count_selects(client, url, times):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", listener)
+    try:
+        responses = [client.get(url) for _ in range(times)]
+    finally:
+        event.remove(Engine, "before_cursor_execute", listener)
+    return responses, [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+
+def test_get_is_served_from_cache_after_post(client):
+    created = client.post("/applications", json=batch_item()).json()
+
+    responses, selects = count_selects(client, f"/applications/{created['application_id']}", 5)
+
+    assert all(r.json() == created for r in responses)
+    assert selects == []
+
+
+def test_unknown_ids_hit_the_database_once(client):
+    responses, selects = count_selects(client, "/applications/application_missing", 5)
+
+    assert all(r.status_code == 404 for r in responses)
+    assert len(selects) == 1
+    assert application_cache.get("application_missing") is NOT_FOUND
+
+
+def test_first_read_fills_the_cache(client):
+    created = client.post("/applications", json=batch_item()).json()
+    application_cache.clear()
+
+    responses, selects = count_selects(client, f"/applications/{created['application_id']}", 3)
+
+    assert all(r.json() == created for r in responses)
+    assert len(selects) == 1
+
+
+class FakeRedis:
+    """The few redis.Redis calls RedisResponseCache makes, in a dict (TTLs ignored)."""
+
+    def __init__(self):
+        self.data = {}
+        self.unlinked = []
+        self.on_event_loop = []
+
+    def _called(self):
+        try:
+            asyncio.get_running_loop()
+            self.on_event_loop.append(True)
+        except RuntimeError:
+            self.on_event_loop.append(False)
+
+    def get(self, key):
+        self._called()
+        return self.data.get(key.encode())
+
+    def set(self, key, value, px=None):
+        self._called()
+        self.data[key.encode()] = value
+
+    def scan_iter(self, match, count):
+        return iter([key for key in list(self.data) if fnmatch.fnmatch(key.decode(), match)])
+
+    def unlink(self, *keys):
+        self.unlinked.append(len(keys))
+        for key in keys:
+            self.data.pop(key, None)
+
+
+def test_redis_backend_stays_off_the_event_loop(client, monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(main, "application_cache", RedisResponseCache("redis://unused", client=redis))
+    created = client.post("/applications", json=batch_item()).json()
+
+    responses, selects = count_selects(client, f"/applications/{created['application_id']}", 3)
+    missing, _ = count_selects(client, "/applications/application_missing", 2)
+
+    assert all(r.json() == created for r in responses)
+    assert selects == []
+    assert [r.status_code for r in missing] == [404, 404]
+    assert main.application_cache.get("application_missing") is NOT_FOUND
+    assert redis.on_event_loop and not any(redis.on_event_loop)
+
+
+class UnreachableRedis(FakeRedis):
+    def get(self, key):
+        raise ConnectionError("Connection refused")
+
+    def set(self, key, value, px=None):
+        raise ConnectionError("Connection refused")
+
+
+def test_redis_outage_falls_back_to_the_database(client, monkeypatch):
+    cache = RedisResponseCache("redis://unused", client=UnreachableRedis())
+    monkeypatch.setattr(main, "application_cache", cache)
+
+    created = client.post("/applications", json=batch_item())
+    responses, selects = count_selects(client, f"/applications/{created.json()['application_id']}", 2)
+    missing = client.get("/applications/application_missing")
+
+    assert created.status_code == 201
+    assert all(r.json() == created.json() for r in responses)
+    assert len(selects) == 2
+    assert missing.status_code == 404
+    stats = cache.stats()
+    assert (stats["misses"], stats["errors"]) == (3, 7)
+
+
+def test_redis_clear_deletes_in_batches():
+    redis = FakeRedis()
+    cache = RedisResponseCache("redis://unused", client=redis)
+    for i in range(1200):
+        cache.set(f"application_{i}", make_response(str(i)))
+    redis.data[b"other:key"] = b"kept"
+
+    cache.clear()
+
+    assert redis.unlinked == [500, 500, 200]
+    assert list(redis.data) == [b"other:key"]
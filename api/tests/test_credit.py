@@ -0,0 +1,153 @@
+import asyncio
+
+import httpx
+import pytest
+
+from api import main
+from api.credit import CreditCheckError, CreditCheckProvider, HTTPCreditCheck, RandomCreditCheck
+from api.crypto import prepare_ssn
+from api.tests.bureau_stub import expected_open_credit_lines, run_bureau
+from api.tests.test_api import create_borrower_dict
+from api.tests.test_batch import batch_item
+
+
+def check(provider, *ssns):
+    """Run provider checks for the given SSNs concurrently, then close it."""
+    async def run():
+        try:
+            return await asyncio.gather(*(provider.open_credit_lines(prepare_ssn(ssn)) for ssn in ssns))
+        finally:
+            await provider.aclose()
+    return asyncio.run(run())
+
+
+def test_random_provider_stays_in_range():
+    assert all(0 <= lines <= 100 for lines in check(RandomCreditCheck(), *["123-45-6789"] * 50))
+
+
+def test_http_provider_caches_by_ssn_hash():
+    with run_bureau() as bureau:
+        provider = HTTPCreditCheck(bureau.url)
+
+        async def run():
+            first = await provider.open_credit_lines(prepare_ssn("123-45-6789"))
+            again = await provider.open_credit_lines(prepare_ssn("123456789"))
+            await provider.aclose()
+            return first, again
+
+        first, again = asyncio.run(run())
+
+    assert first == again == expected_open_credit_lines("123456789")
+    assert bureau.calls == 1
+    assert provider.stats()["cache_hits"] == 1
+
+
+def test_http_provider_reopens_after_aclose():
+    # Shared by every app of the process: one app's shutdown mustn't break the next
+    with run_bureau() as bureau:
+        provider = HTTPCreditCheck(bureau.url, cache_ttl=0)
+        first = check(provider, "123-45-6789")
+        again = check(provider, "123-45-6789")
+    assert first == again == [expected_open_credit_lines("123456789")]
+    assert bureau.calls == 2
+
+
+def test_concurrent_checks_of_one_ssn_share_a_call():
+    with run_bureau(latency=0.05) as bureau:
+        results = check(HTTPCreditCheck(bureau.url), *["123-45-6789"] * 10)
+    assert set(results) == {expected_open_credit_lines("123456789")}
+    assert bureau.calls == 1
+
+
+def test_cancelled_first_check_doesnt_cancel_the_others():
+    with run_bureau(latency=0.05) as bureau:
+        provider = HTTPCreditCheck(bureau.url)
+
+        async def run():
+            ssn = prepare_ssn("123-45-6789")
+            first = asyncio.create_task(provider.open_credit_lines(ssn))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(provider.open_credit_lines(ssn))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            try:
+                return await second, first.cancelled()
+            finally:
+                await provider.aclose()
+
+        lines, first_cancelled = asyncio.run(run())
+
+    assert lines == expected_open_credit_lines("123456789")
+    assert first_cancelled
+    assert bureau.calls == 1
+
+
+def test_concurrency_is_bounded():
+    with run_bureau(latency=0.05) as bureau:
+        check(HTTPCreditCheck(bureau.url, max_concurrency=2), *[f"123-45-{i:04d}" for i in range(6)])
+    assert bureau.calls == 6
+    assert bureau.max_in_flight == 2
+
+
+def test_retries_server_errors():
+    with run_bureau(fail_every=2) as bureau:
+        provider = HTTPCreditCheck(bureau.url, retries=1, backoff=0.001)
+        results = check(provider, "111-11-1111", "222-22-2222")
+    assert results == [expected_open_credit_lines("111111111"), expected_open_credit_lines("222222222")]
+    # One of the two first calls got the 503 and was retried
+    assert bureau.calls == 3
+    assert provider.stats()["retried"] == 1
+
+
+def test_gives_up_after_timeouts():
+    with run_bureau(latency=0.5) as bureau:
+        provider = HTTPCreditCheck(bureau.url, timeout=0.05, retries=1, backoff=0.001)
+        with pytest.raises(CreditCheckError):
+            check(provider, "123-45-6789")
+    assert provider.stats()["failures"] == 1
+
+
+@pytest.mark.parametrize("value", [101, -1, 20.5, "20", True, None])
+def test_rejects_invalid_open_credit_lines(value):
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"open_credit_lines": value}))
+    provider = HTTPCreditCheck("http://bureau", transport=transport)
+    with pytest.raises(CreditCheckError):
+        check(provider, "123-45-6789")
+    assert provider.stats()["failures"] == 1
+
+
+def test_post_returns_503_on_an_invalid_bureau_answer(client, test_db, monkeypatch):
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"open_credit_lines": 500}))
+    monkeypatch.setattr(main, "credit_provider", HTTPCreditCheck("http://bureau", transport=transport))
+    response = client.post("/applications", json={"borrower": create_borrower_dict(), "requested_amount": 25000})
+    assert response.status_code == 503
+
+
+class UnavailableBureau(CreditCheckProvider):
+    def __init__(self, failing_ssn=None):
+        self.failing_ssn = failing_ssn
+
+    async def open_credit_lines(self, ssn):
+        if self.failing_ssn is None or ssn.normalized == self.failing_ssn:
+            raise CreditCheckError("Credit bureau unavailable")
+        return 5
+
+
+def test_post_returns_503_when_bureau_is_down(client, monkeypatch):
+    monkeypatch.setattr(main, "credit_provider", UnavailableBureau())
+
+    response = client.post("/applications", json={"borrower": create_borrower_dict(), "requested_amount": 25000})
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Credit check unavailable"
+
+
+def test_batch_fails_only_items_whose_check_failed(client, monkeypatch):
+    monkeypatch.setattr(main, "credit_provider", UnavailableBureau(failing_ssn="123450001"))
+    items = [batch_item(ssn=f"123-45-{i:04d}") for i in range(3)]
+
+    body = client.post("/applications/batch", json={"applications": items}).json()
+
+    assert body["succeeded"] == 2
+    assert body["results"][1]["error"] == "Credit check unavailable"
+    assert body["results"][0]["application"]["open_credit_lines"] == 5
@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+from cryptography.fernet import Fernet
+
+import api.crypto
+from api.crypto import CryptoService, prepare_ssn
+from api.security import hash_ssn
+from api.tests.test_batch import batch_item
+
+
+def decrypt(token: str) -> str:
+    return Fernet(os.environ["SSN_ENC_KEY"].encode()).decrypt(token.encode()).decode()
+
+
+def test_prepare_hashes_once_and_encrypts_lazily(monkeypatch):
+    calls = []
+    real_encrypt = api.crypto.encrypt_normalized_ssn
+    monkeypatch.setattr(api.crypto, "encrypt_normalized_ssn", lambda s: calls.append(s) or real_encrypt(s))
+
+    material = prepare_ssn("123-45-6789")
+    assert material.ssn_hash == hash_ssn("123456789")
+    assert calls == []
+
+    assert decrypt(material.ssn_encrypted) == "123456789"
+    assert material.encrypt() == material.ssn_encrypted
+    assert len(calls) == 1
+    assert "6789" not in repr(material)
+
+
+def test_batch_api_reports_bad_items_in_place():
+    service = CryptoService(workers=2)
+    try:
+        ssns = [f"123-45-{i:04d}" for i in range(200)] + ["12-34"]
+        materials = service.prepare_many(ssns)
+        assert isinstance(materials[-1], ValueError)
+
+        service.encrypt_many(materials[:-1])
+        assert [decrypt(m.ssn_encrypted) for m in materials[:3]] == ["123450000", "123450001", "123450002"]
+    finally:
+        service.shutdown()
+
+
+def test_prepare_async_on_worker_pool():
+    service = CryptoService(workers=1)
+    try:
+        material = asyncio.run(service.prepare_async("987-65-4321"))
+        # Encrypted on the pool already
+        assert material._encrypted is not None
+        assert material.ssn_hash == hash_ssn("987654321")
+    finally:
+        service.shutdown()
+
+
+def test_post_hashes_ssn_once(client, monkeypatch):
+    calls = []
+    real_hash = api.crypto.hash_normalized_ssn
+    monkeypatch.setattr(api.crypto, "hash_normalized_ssn", lambda s: calls.append(s) or real_hash(s))
+
+    assert client.post("/applications", json=batch_item()).status_code == 201
+    assert calls == ["123456789"]
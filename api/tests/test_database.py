@@ -0,0 +1,80 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from api.crypto import prepare_ssn
+from api.database import run_db
+from api.helpers import (
+    create_application,
+    create_application_async,
+    create_applications_batch_async,
+    find_or_create_borrower,
+    find_or_create_borrower_async,
+)
+from api.models import Base
+from api.schemas import ApplicationRequest
+from api.tests.test_api import create_valid_borrower
+
+
+@pytest.mark.parametrize("use_async", [False, True], ids=["sync", "async"])
+def test_run_db_runs_the_helpers(tmp_path, use_async):
+    # As the request path calls them: the sync helpers on either kind of session
+    url = f"sqlite:///{tmp_path / 'run_db.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+
+    async def scenario():
+        if use_async:
+            engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+            session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        else:
+            engine = sync_engine
+            session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+
+        borrower_request = create_valid_borrower()
+        ssn = prepare_ssn(borrower_request.ssn, encrypt=True)
+        request = ApplicationRequest(borrower=borrower_request, requested_amount=Decimal("25000"))
+        db = session_factory()
+        try:
+            application = await run_db(db, create_application, request, ssn, 20)
+            borrower = await run_db(db, find_or_create_borrower, create_valid_borrower(), ssn)
+        finally:
+            if use_async:
+                await db.close()
+                await engine.dispose()
+            else:
+                db.close()
+        return application, borrower
+
+    application, borrower = asyncio.run(scenario())
+    sync_engine.dispose()
+    assert application.application_id.startswith("application_")
+    assert application.open_credit_lines == 20
+    assert application.borrower_id == borrower.id
+
+
+def test_async_helpers(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        async with session_factory() as db:
+            borrower_request = create_valid_borrower()
+            ssn = prepare_ssn(borrower_request.ssn, encrypt=True)
+            request = ApplicationRequest(borrower=borrower_request, requested_amount=Decimal("25000"))
+            application = await create_application_async(db, request, ssn, 20, idempotency_key="async-1")
+            borrower = await find_or_create_borrower_async(db, create_valid_borrower(), ssn)
+            batch = await create_applications_batch_async(db, [request, request], [ssn, ssn], [5, 60])
+        await engine.dispose()
+        return application, borrower, batch
+
+    application, borrower, batch = asyncio.run(scenario())
+    assert application.open_credit_lines == 20
+    assert application.borrower_id == borrower.id
+    assert [a.open_credit_lines for a in batch] == [5, 60]
+    assert {a.borrower_id for a in batch} == {borrower.id}
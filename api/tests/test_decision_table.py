@@ -0,0 +1,146 @@
+import json
+import os
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from api.constants import (
+    MAX_CREDIT_LINES,
+    MAX_CREDIT_LINES_TIER_2,
+    MAX_LOAN_AMOUNT,
+    MIN_CREDIT_LINES_TIER_1,
+    MIN_CREDIT_LINES_TIER_2,
+    MIN_LOAN_AMOUNT,
+    TIER_1_RATE,
+    TIER_1_TERM,
+    TIER_2_RATE,
+    TIER_2_TERM,
+)
+from api.models import ApplicationStatus, ApplicationStatusReason
+from api.rules.decision_table import DEFAULT_PATH, DecisionRules, DecisionTable
+from api.rules.offer import compute_monthly_payment, compute_offer
+from api.rules.offer_batch import compute_offers
+
+
+def legacy_compute_offer(requested_amount, open_credit_lines):
+    """The if-chain compute_offer used before the decision table: (status, reason, rate, term, payment)."""
+    if requested_amount < MIN_LOAN_AMOUNT or requested_amount > MAX_LOAN_AMOUNT:
+        return ApplicationStatus.DENIED, ApplicationStatusReason.REQUEST_AMOUNT_OUT_OF_BOUNDS, None, None, None
+    if open_credit_lines > MAX_CREDIT_LINES:
+        return ApplicationStatus.DENIED, ApplicationStatusReason.CREDIT_LINES_OUT_OF_BOUNDS, None, None, None
+    if open_credit_lines < MIN_CREDIT_LINES_TIER_1:
+        rate, term = TIER_1_RATE, TIER_1_TERM
+    elif MIN_CREDIT_LINES_TIER_2 <= open_credit_lines <= MAX_CREDIT_LINES_TIER_2:
+        rate, term = TIER_2_RATE, TIER_2_TERM
+    else:
+        return ApplicationStatus.DENIED, ApplicationStatusReason.OTHER, None, None, None
+    return ApplicationStatus.APPROVED, None, rate, term, compute_monthly_payment(requested_amount, rate, term)
+
+
+def as_tuple(decision):
+    offer = decision.offer
+    if offer is None:
+        return decision.status, decision.reason, None, None, None
+    return decision.status, decision.reason, offer.interest_rate, offer.term_months, offer.monthly_payment
+
+
+def test_shipped_table_matches_the_if_chain_everywhere():
+    """
+    Both implementations are constant between consecutive breakpoints of
+    their conditions (amount and credit line band endpoints). Checking every
+    breakpoint and points just around and between them, against every credit
+    line count, covers the whole input domain.
+    """
+    breakpoints = sorted({Decimal(0), MIN_LOAN_AMOUNT, MAX_LOAN_AMOUNT, Decimal(10000), Decimal(50000)})
+    amounts = {Decimal("1e12"), Decimal("0.01")}
+    for b in breakpoints:
+        for delta in ("-1", "-0.01", "-0.001", "0", "0.001", "0.01", "1"):
+            if b + Decimal(delta) >= 0:
+                amounts.add(b + Decimal(delta))
+    amounts.update((a + b) / 2 for a, b in zip(breakpoints, breakpoints[1:]))
+    lines = list(range(0, 201)) + [10 ** 6]
+
+    for amount in sorted(amounts):
+        for n in lines:
+            assert as_tuple(compute_offer(amount, n)) == legacy_compute_offer(amount, n), (amount, n)
+
+
+def test_vectorized_table_matches_the_if_chain_for_every_cent():
+    table = DecisionTable.load(DEFAULT_PATH)
+    cents = np.arange(0, 60000_00 + 1, dtype=np.int64)
+    in_bounds = (cents >= int(MIN_LOAN_AMOUNT * 100)) & (cents <= int(MAX_LOAN_AMOUNT * 100))
+    outcomes = [(o.status, o.reason, o.interest_rate, o.term_months) for o in table.outcomes]
+    out_of_bounds = legacy_compute_offer(Decimal(0), 0)[:4]
+    for n in (0, 9, 10, 11, 49, 50, 51, 100):
+        indexes = table.outcome_indexes(cents, np.full(len(cents), n))
+        in_bounds_outcome = outcomes.index(legacy_compute_offer(MIN_LOAN_AMOUNT, n)[:4])
+
+        assert (indexes[in_bounds] == in_bounds_outcome).all()
+        assert (indexes[~in_bounds] == outcomes.index(out_of_bounds)).all()
+
+    # The batch API goes through the same lookup
+    batch = compute_offers(["9999.99", "10000", "50000", "50000.01"], [9, 9, 50, 50])
+    assert list(batch.term_months) == [0, TIER_1_TERM, TIER_2_TERM, 0]
+
+
+def write_table(path, **changes):
+    with open(DEFAULT_PATH) as f:
+        spec = json.load(f)
+    spec.update(changes)
+    path.write_text(json.dumps(spec))
+    return str(path)
+
+
+def test_first_matching_rule_wins_and_gaps_get_the_default():
+    table = DecisionTable({
+        "amount_bands": {"small": "[0, 100)", "large": "[100, 1000]"},
+        "credit_line_bands": {"few": "[0, 5]", "some": "(5, 20]"},
+        "rules": [
+            {"amount": "large", "credit_lines": "few", "approve": {"interest_rate": 5.0, "term_months": 12}},
+            {"amount": "*", "credit_lines": "few", "deny": "CREDIT_LINES_OUT_OF_BOUNDS"},
+            {"amount": "large", "credit_lines": "*", "approve": {"interest_rate": 7.5, "term_months": 60}},
+        ],
+    })
+
+    assert table.outcome(Decimal("100"), 5).interest_rate == 5.0
+    assert table.outcome(Decimal("99.99"), 0).reason is ApplicationStatusReason.CREDIT_LINES_OUT_OF_BOUNDS
+    assert table.outcome(Decimal("1000"), 6).term_months == 60
+    assert table.outcome(Decimal("1000.01"), 6).reason is ApplicationStatusReason.OTHER  # no band
+    assert table.outcome(Decimal("50"), 21).reason is ApplicationStatusReason.OTHER
+
+
+@pytest.mark.parametrize("changes, message", [
+    ({"amount_bands": {"eligible": "[10000, 50000"}}, "Invalid interval"),
+    ({"amount_bands": {"eligible": "(10, 10]"}}, "Empty interval"),
+    ({"amount_bands": {"eligible": "[10000.005, 50000]"}}, "finer than"),
+    ({"rules": [{"amount": "nope", "deny": "OTHER"}]}, "Unknown band"),
+    ({"rules": [{"amount": "*", "deny": "MAYBE"}]}, "Unknown denial reason"),
+    ({"rules": [{"amount": "*", "approve": {"interest_rate": 5, "term_months": 0}}]}, "term_months"),
+])
+def test_invalid_tables_are_rejected(tmp_path, changes, message):
+    with pytest.raises(ValueError, match=message):
+        DecisionTable.load(write_table(tmp_path / "rules.json", **changes))
+
+
+def test_hot_reload_swaps_tables_atomically(tmp_path):
+    path = write_table(tmp_path / "rules.json")
+    rules = DecisionRules(path, check_interval=0)
+    in_flight = rules.table()
+
+    approve_all = [{"amount": "eligible", "approve": {"interest_rate": 12.5, "term_months": 48}}]
+    write_table(tmp_path / "rules.json", rules=approve_all)
+    os.utime(path, ns=(0, 10 ** 18))  # a distinct mtime even on coarse clocks
+
+    decision = compute_offer(Decimal("20000"), 80, table=rules.table())
+    assert (decision.offer.interest_rate, decision.offer.term_months) == (12.5, 48)
+    assert rules.reloads == 1
+    # A request that started with the old table still decides with it
+    assert compute_offer(Decimal("20000"), 80, table=in_flight).status is ApplicationStatus.DENIED
+
+    # A broken file is reported and ignored
+    (tmp_path / "rules.json").write_text("{not json")
+    os.utime(path, ns=(0, 2 * 10 ** 18))
+    assert rules.table().outcome(Decimal("20000"), 80).interest_rate == 12.5
+    assert rules.last_error is not None
+    assert rules.reloads == 1
@@ -0,0 +1,104 @@
+import asyncio
+
+import httpx
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from api import main
+from api.credit import CreditCheckProvider
+from api.crypto import prepare_ssn
+from api.group_commit import WriteCoalescer
+from api.models import Application, DailyDecisionStats
+from api.schemas import ApplicationRequest
+from api.tests.test_api import create_borrower_dict
+
+
+class CreditLinesBySSN(CreditCheckProvider):
+    """20 open credit lines, or what `lines` says for an SSN."""
+
+    def __init__(self, lines=None):
+        self.lines = lines or {}
+
+    async def open_credit_lines(self, ssn):
+        return self.lines.get(ssn.normalized, 20)
+
+
+def payload(i):
+    return {"borrower": create_borrower_dict(ssn=f"123-45-{i:04d}"), "requested_amount": 20000 + i}
+
+
+def submit_concurrently(count):
+    async def submit_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[client.post("/applications", json=payload(i)) for i in range(count)])
+
+    return asyncio.run(submit_all())
+
+
+def test_concurrent_writes_share_transactions(client, test_db, monkeypatch):
+    coalescer = WriteCoalescer(enabled=True, max_rows=4, max_wait=0.05)
+    monkeypatch.setattr(main, "write_coalescer", coalescer)
+    monkeypatch.setattr(main, "credit_provider", CreditLinesBySSN())
+
+    responses = submit_concurrently(10)
+
+    assert [r.status_code for r in responses] == [201] * 10
+    assert [r.json()["offer"]["total_amount"] for r in responses] == [f"{20000 + i}.00" for i in range(10)]
+    # Fewer transactions than writes, none over max_rows
+    assert 3 <= coalescer.batches < 10
+    assert coalescer.writes == 10
+    with test_db() as db:
+        assert db.scalar(select(func.count()).select_from(Application)) == 10
+        assert db.scalar(select(func.sum(DailyDecisionStats.applications))) == 10
+    # Rendered without a refresh(), exactly as read back from the database
+    main.application_cache.clear()
+    for response in responses:
+        assert client.get(f"/applications/{response.json()['application_id']}").content == response.content
+
+
+def test_rejected_row_fails_only_its_request(test_db, monkeypatch):
+    monkeypatch.setattr(main, "write_coalescer", WriteCoalescer(enabled=True, max_wait=0.05))
+    # Violates the open_credit_lines CHECK constraint at insert time
+    monkeypatch.setattr(main, "credit_provider", CreditLinesBySSN({"123450003": 101}))
+
+    responses = submit_concurrently(6)
+
+    assert [r.status_code for r in responses] == [201, 201, 201, 500, 201, 201]
+    assert main.write_coalescer.batches == 1
+    with test_db() as db:
+        assert db.scalar(select(func.count()).select_from(Application)) == 5
+
+
+def test_failed_commit_fails_the_whole_batch(test_db, monkeypatch):
+    monkeypatch.setattr(main, "write_coalescer", WriteCoalescer(enabled=True, max_wait=0.05))
+    monkeypatch.setattr(main, "credit_provider", CreditLinesBySSN())
+
+    # Every row is flushed in its savepoint, then the commit itself fails
+    def fail_commit(session):
+        raise OperationalError("COMMIT", {}, Exception("disk I/O error"))
+
+    event.listen(Session, "before_commit", fail_commit)
+    try:
+        responses = submit_concurrently(3)
+
+        coalescer = WriteCoalescer(enabled=True, max_wait=0.05)
+        requests = [ApplicationRequest(**payload(i)) for i in range(3, 6)]
+
+        async def write_all():
+            return await asyncio.gather(*[
+                coalescer.create_application(test_db, request, prepare_ssn(request.borrower.ssn, encrypt=True), 20)
+                for request in requests
+            ], return_exceptions=True)
+
+        results = asyncio.run(write_all())
+    finally:
+        event.remove(Session, "before_commit", fail_commit)
+
+    assert [r.status_code for r in responses] == [500] * 3
+    assert coalescer.batches == 1
+    assert [type(result) for result in results] == [OperationalError] * 3
+    assert results[0] is results[1] is results[2]
+    with test_db() as db:
+        assert db.scalar(select(func.count()).select_from(Application)) == 0
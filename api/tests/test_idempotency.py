@@ -0,0 +1,137 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import func, select
+
+from api import main
+from api.credit import CreditCheckError, CreditCheckProvider
+from api.crypto import prepare_ssn
+from api.idempotency import IdempotencyStore, purge_expired, request_hash
+from api.models import Application, IdempotencyKey
+from api.schemas import ApplicationRequest
+from api.tests.test_api import create_borrower_dict
+
+
+class CountingCreditCheck(CreditCheckProvider):
+    def __init__(self, delay=0.0, fail_first=0):
+        self.calls = 0
+        self.delay = delay
+        self.fail_first = fail_first
+
+    async def open_credit_lines(self, ssn):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.calls <= self.fail_first:
+            raise CreditCheckError("bureau down")
+        return 20
+
+
+def payload(amount=25000):
+    return {"borrower": create_borrower_dict(), "requested_amount": amount}
+
+
+def count_applications(test_db):
+    with test_db() as db:
+        return db.scalar(select(func.count()).select_from(Application))
+
+
+def test_retry_replays_the_first_response(client, test_db, monkeypatch):
+    bureau = CountingCreditCheck()
+    monkeypatch.setattr(main, "credit_provider", bureau)
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/applications", json=payload(), headers=headers)
+    retry = client.post("/applications", json=payload(), headers=headers)
+    main.idempotency_store.clear()  # another worker: only the table knows the key
+    from_table = client.post("/applications", json=payload(), headers=headers)
+
+    assert first.status_code == retry.status_code == from_table.status_code == 201
+    assert retry.content == from_table.content == first.content
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert bureau.calls == 1
+    assert count_applications(test_db) == 1
+    assert client.get(f"/applications/{first.json()['application_id']}").content == first.content
+
+
+def test_key_reused_with_another_payload(client, test_db):
+    headers = {"Idempotency-Key": "reused"}
+    assert client.post("/applications", json=payload(25000), headers=headers).status_code == 201
+    response = client.post("/applications", json=payload(30000), headers=headers)
+    assert response.status_code == 422
+    assert count_applications(test_db) == 1
+
+
+def test_failed_request_releases_the_key(client, test_db, monkeypatch):
+    monkeypatch.setattr(main, "credit_provider", CountingCreditCheck(fail_first=1))
+    headers = {"Idempotency-Key": "after-outage"}
+
+    assert client.post("/applications", json=payload(), headers=headers).status_code == 503
+    assert client.post("/applications", json=payload(), headers=headers).status_code == 201
+    assert count_applications(test_db) == 1
+
+
+def test_concurrent_duplicates_wait_for_the_first(test_db, monkeypatch):
+    bureau = CountingCreditCheck(delay=0.1)
+    monkeypatch.setattr(main, "credit_provider", bureau)
+
+    async def submit_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[
+                client.post("/applications", json=payload(), headers={"Idempotency-Key": "burst"})
+                for _ in range(5)
+            ])
+
+    responses = asyncio.run(submit_all())
+
+    assert [r.status_code for r in responses] == [201] * 5
+    assert len({r.content for r in responses}) == 1
+    assert bureau.calls == 1
+    assert count_applications(test_db) == 1
+
+
+def test_claim_held_by_another_worker(client, test_db, monkeypatch):
+    monkeypatch.setattr(main, "idempotency_store", IdempotencyStore(wait=0.1))
+    with test_db() as db:
+        request = ApplicationRequest(**payload())
+        db.add(IdempotencyKey(key="elsewhere", request_hash=request_hash(request, prepare_ssn(request.borrower.ssn).ssn_hash)))
+        db.commit()
+
+    response = client.post("/applications", json=payload(), headers={"Idempotency-Key": "elsewhere"})
+
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
+    assert count_applications(test_db) == 0
+
+
+def test_stored_hash_is_keyed(client, test_db, keys):
+    request = ApplicationRequest(**payload())
+    assert client.post("/applications", json=payload(), headers={"Idempotency-Key": "keyed"}).status_code == 201
+    with test_db() as db:
+        stored = db.scalar(select(IdempotencyKey.request_hash).where(IdempotencyKey.key == "keyed"))
+
+    assert stored == request_hash(request, prepare_ssn(request.borrower.ssn).ssn_hash)
+    # Can't be recomputed from the payload without SSN_HASH_KEY
+    keys(os.environ["SSN_ENC_KEY"], "another-hash-key")
+    assert stored != request_hash(request, prepare_ssn(request.borrower.ssn).ssn_hash)
+
+
+def test_expired_keys_are_purged_and_reusable(client, test_db):
+    headers = {"Idempotency-Key": "old"}
+    assert client.post("/applications", json=payload(25000), headers=headers).status_code == 201
+    with test_db() as db:
+        db.query(IdempotencyKey).update({IdempotencyKey.created_at: datetime.utcnow() - timedelta(days=2)})
+        db.commit()
+    main.idempotency_store.clear()
+
+    # Past the TTL the key is free again, even for another payload
+    assert client.post("/applications", json=payload(30000), headers=headers).status_code == 201
+    assert count_applications(test_db) == 2
+
+    with test_db() as db:
+        db.query(IdempotencyKey).update({IdempotencyKey.created_at: datetime.utcnow() - timedelta(days=2)})
+        db.commit()
+        assert purge_expired(db.get_bind(), ttl=86400) == 1
+        assert db.scalar(select(func.count()).select_from(IdempotencyKey)) == 0
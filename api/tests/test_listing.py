@@ -0,0 +1,162 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect, insert, text
+
+from api.listing import ApplicationFilters, iter_export, listing_query
+from api.migrations import add_application_listing_indexes
+from api.models import Application, ApplicationStatus, ApplicationStatusReason, Base, Borrower
+
+START = datetime(2025, 1, 1)
+
+
+def seed(session_factory, count=12):
+    """count applications over two borrowers, two per timestamp; every third one denied."""
+    with session_factory() as db:
+        borrower_ids = [
+            db.execute(insert(Borrower).values(
+                borrower_id=f"borrower_{n}", first_name="A", last_name="B", email="a@b.com",
+                phone="5551234567", address_street="1 St", city="C", state="NY", zip_code="1",
+                ssn_encrypted="x", ssn_hash=str(n) * 64, fingerprint=str(n) * 64,
+            ).returning(Borrower.id)).scalar_one()
+            for n in (1, 2)
+        ]
+        for i in range(count):
+            denied = i % 3 == 0
+            db.execute(insert(Application).values(
+                application_id=f"application_{i:02d}",
+                borrower_id=borrower_ids[i % 2],
+                open_credit_lines=5,
+                requested_amount=25000 if not denied else 5000,
+                application_status=ApplicationStatus.DENIED if denied else ApplicationStatus.APPROVED,
+                reason=ApplicationStatusReason.REQUEST_AMOUNT_OUT_OF_BOUNDS if denied else None,
+                interest_rate=None if denied else 10.0,
+                term_months=None if denied else 36,
+                monthly_payment=None if denied else 806.68,
+                created_at=START + timedelta(hours=i // 2),
+                updated=START,
+            ))
+        db.commit()
+
+
+def walk(client, limit, **params):
+    """All application_ids of a listing, following cursors."""
+    ids, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, limit=limit, **({"cursor": cursor} if cursor else {}))
+        body = client.get("/applications", params=query).json()
+        ids += [item["application_id"] for item in body["items"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+def test_pages_cover_every_row_once_newest_first(client, test_db):
+    seed(test_db)
+
+    ids, pages = walk(client, limit=5)
+
+    # Ties on created_at are broken by id, descending
+    assert ids == [f"application_{i:02d}" for i in reversed(range(12))]
+    assert pages == 3
+
+
+def test_list_item_shape(client, test_db):
+    seed(test_db)
+
+    item = client.get("/applications", params={"limit": 1}).json()["items"][0]
+
+    assert item == {
+        "application_id": "application_11",
+        "decision": "approved",
+        "open_credit_lines": 5,
+        "offer": {"total_amount": "25000.00", "interest_rate": 10.0, "term_months": 36, "monthly_payment": "806.68"},
+        "reason": None,
+        "borrower_id": "borrower_2",
+        "created_at": "2025-01-01T05:00:00",
+    }
+
+
+def test_filters(client, test_db):
+    seed(test_db)
+
+    denied, _ = walk(client, limit=2, status="denied")
+    assert denied == ["application_09", "application_06", "application_03", "application_00"]
+
+    by_reason, _ = walk(client, limit=50, reason=ApplicationStatusReason.REQUEST_AMOUNT_OUT_OF_BOUNDS.value)
+    assert by_reason == denied
+
+    by_borrower, _ = walk(client, limit=50, borrower_id="borrower_1")
+    assert by_borrower == [f"application_{i:02d}" for i in (10, 8, 6, 4, 2, 0)]
+
+    in_range, _ = walk(client, limit=50, created_from="2025-01-01T01:00:00Z", created_to="2025-01-01T03:00:00Z")
+    assert in_range == [f"application_{i:02d}" for i in (5, 4, 3, 2)]
+
+
+def test_invalid_cursor_and_limit(client, test_db):
+    assert client.get("/applications", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/applications", params={"limit": 0}).status_code == 422
+    assert client.get("/applications", params={"status": "pending"}).status_code == 422
+
+
+def test_export_ndjson_matches_listing(client, test_db):
+    seed(test_db)
+
+    response = client.get("/applications/export", params={"status": "approved"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    listed = client.get("/applications", params={"status": "approved", "limit": 50}).json()["items"]
+    assert exported == listed
+
+
+def test_export_csv(client, test_db):
+    seed(test_db)
+
+    response = client.get("/applications/export", params={"format": "csv", "borrower_id": "borrower_1"})
+
+    lines = response.text.splitlines()
+    assert lines[0].startswith("application_id,borrower_id,created_at,decision")
+    assert len(lines) == 7
+    assert lines[1] == "application_10,borrower_1,2025-01-01T05:00:00,approved,5,25000.00,10.00,36,806.68,"
+
+
+def test_export_streams_in_chunks(test_db):
+    seed(test_db, count=10)
+    engine = test_db.kw["bind"]
+
+    chunks = list(iter_export(engine, ApplicationFilters(), "ndjson", chunk_size=3))
+
+    assert [chunk.count(b"\n") for chunk in chunks] == [3, 3, 3, 1]
+
+
+def test_listing_uses_composite_indexes(test_db):
+    engine = test_db.kw["bind"]
+    for filters, index in [
+        (ApplicationFilters(), "ix_applications_created_at_id"),
+        (ApplicationFilters(status=ApplicationStatus.DENIED), "ix_applications_status_created_at_id"),
+        (ApplicationFilters(borrower_id="borrower_1"), "ix_applications_borrower_created_at_id"),
+    ]:
+        query = listing_query(filters, after=(START, 5)).limit(50)
+        compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+        with engine.connect() as conn:
+            plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+        assert index in plan
+        assert "TEMP B-TREE" not in plan  # no sort step: rows come out in index order
+
+
+def test_migration_adds_listing_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_applications_created_at_id"))
+        conn.execute(text("DROP INDEX ix_applications_status_created_at_id"))
+
+    add_application_listing_indexes(engine)
+    add_application_listing_indexes(engine)  # idempotent
+
+    names = {ix["name"] for ix in inspect(engine).get_indexes("applications")}
+    assert {"ix_applications_created_at_id", "ix_applications_status_created_at_id",
+            "ix_applications_borrower_created_at_id"} <= names
@@ -0,0 +1,56 @@
+from api import main
+from api.metrics import DECISIONS, HTTP_REQUESTS, STAGE_SECONDS, Registry
+from api.tests.test_api import create_borrower_dict
+from api.tests.test_stats import FixedCreditCheck
+
+STAGES = ("validation", "ssn_crypto", "credit_check", "borrower_lookup", "decision", "commit")
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("op_seconds", "Op latency.", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, 'say "hi"')
+
+    lines = registry.render().splitlines()
+
+    assert lines[:2] == ["# HELP op_seconds Op latency.", "# TYPE op_seconds histogram"]
+    assert lines[2:] == [
+        'op_seconds_bucket{op="say \\"hi\\"",le="0.1"} 1',
+        'op_seconds_bucket{op="say \\"hi\\"",le="1.0"} 3',
+        'op_seconds_bucket{op="say \\"hi\\"",le="+Inf"} 4',
+        'op_seconds_sum{op="say \\"hi\\""} 4.05',
+        'op_seconds_count{op="say \\"hi\\""} 4',
+    ]
+
+
+def test_post_application_records_every_stage(client, test_db, monkeypatch):
+    monkeypatch.setattr(main, "credit_provider", FixedCreditCheck(20))
+    before = {name: STAGE_SECONDS.count(name) for name in STAGES}
+    approved = DECISIONS.value("approved", "")
+    created = HTTP_REQUESTS.value("POST", "/applications", "201")
+
+    payload = {"borrower": create_borrower_dict(), "requested_amount": 25000}
+    assert client.post("/applications", json=payload).status_code == 201
+
+    # A new borrower: the SSN is hashed, then encrypted for the new row
+    assert {name: STAGE_SECONDS.count(name) - before[name] for name in STAGES} == {
+        "validation": 1, "ssn_crypto": 2, "credit_check": 1, "borrower_lookup": 1, "decision": 1, "commit": 1,
+    }
+    assert DECISIONS.value("approved", "") == approved + 1
+    assert HTTP_REQUESTS.value("POST", "/applications", "201") == created + 1
+
+
+def test_metrics_endpoint(client, test_db):
+    client.get("/applications/missing")
+    client.get("/applications/missing")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/applications/{application_id}",status="404"}' in body
+    assert "/applications/missing" not in body  # route templates, not raw paths
+    assert 'application_cache_lookups_total{result="negative_hit"}' in body
+    assert "# TYPE db_pool_connections gauge" in body
@@ -0,0 +1,64 @@
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.profiling import ProfilingMiddleware, ProfilingSettings, enforce_limits
+
+SSN = "123-45-6789"
+
+
+def busy_with_ssn(ssn):
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        digits = ssn.replace("-", "")
+    return digits
+
+
+def profiled_app(**settings):
+    app = FastAPI()
+
+    @app.get("/borrowers/{ssn}")
+    def lookup(ssn: str):  # sync: runs on the threadpool
+        return {"digits": busy_with_ssn(ssn)}
+
+    app.add_middleware(ProfilingMiddleware, settings=ProfilingSettings(**settings))
+    return TestClient(app)
+
+
+def test_token_profiles_a_request_without_capturing_pii(tmp_path):
+    client = profiled_app(token="s3cret", directory=str(tmp_path), interval_ms=1)
+
+    assert "x-profile-id" not in client.get(f"/borrowers/{SSN}").headers
+    assert "x-profile-id" not in client.get(f"/borrowers/{SSN}", headers={"X-Profile-Token": "wrong"}).headers
+    response = client.get(f"/borrowers/{SSN}", headers={"X-Profile-Token": "s3cret"})
+
+    [profile] = tmp_path.glob("*.collapsed")
+    assert profile.name.startswith(response.headers["x-profile-id"])
+    assert profile.name.endswith(".collapsed") and "-GET-borrowers_ssn-200-" in profile.name
+    lines = profile.read_text().splitlines()
+    assert any("busy_with_ssn (test_profiling.py:" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert SSN not in profile.read_text() and "123456789" not in profile.read_text()
+
+
+def test_sample_rate(tmp_path):
+    client = profiled_app(sample_rate=1.0, directory=str(tmp_path))
+    for _ in range(3):
+        client.get(f"/borrowers/{SSN}")
+    assert len(list(tmp_path.glob("*.collapsed"))) == 3
+
+
+def test_limits_delete_the_oldest_profiles(tmp_path):
+    for i in range(5):
+        path = tmp_path / f"{i}.collapsed"
+        path.write_text("x" * 100)
+        mtime = time.time() - 100 + i
+        os.utime(path, (mtime, mtime))
+
+    enforce_limits(tmp_path, max_files=4, max_bytes=1000)
+    assert sorted(p.name for p in tmp_path.glob("*.collapsed")) == ["1.collapsed", "2.collapsed", "3.collapsed", "4.collapsed"]
+
+    enforce_limits(tmp_path, max_files=4, max_bytes=250)
+    assert sorted(p.name for p in tmp_path.glob("*.collapsed")) == ["3.collapsed", "4.collapsed"]
@@ -0,0 +1,104 @@
+import json
+from decimal import Decimal
+
+from api import main
+from api.quotes import QuoteService
+from api.rules import offer_batch
+from api.rules.offer import compute_offer
+from api.rules.pricing import amortization_schedule
+
+
+def test_grid_matches_compute_offer_per_cell(client):
+    amounts = ["5000", "10000", "25000.5", "50000", "50000.01"]
+    lines = [0, 9, 10, 50, 51]
+    response = client.post("/quotes", json={"amounts": amounts, "open_credit_lines": lines})
+
+    assert response.status_code == 200
+    quotes = response.json()["quotes"]
+    assert len(quotes) == len(amounts) * len(lines)
+    for quote, (amount, n) in zip(quotes, [(a, n) for a in amounts for n in lines]):
+        decision = compute_offer(Decimal(amount), n)
+        assert (quote["open_credit_lines"], quote["decision"]) == (n, decision.status.value)
+        assert Decimal(quote["requested_amount"]) == Decimal(amount)
+        if decision.offer is None:
+            assert quote["offer"] is None
+            assert quote["reason"] == decision.reason.value
+        else:
+            assert Decimal(quote["offer"]["monthly_payment"]) == decision.offer.monthly_payment
+            assert quote["offer"]["term_months"] == decision.offer.term_months
+
+
+def test_default_credit_lines_cover_every_tier(client):
+    quotes = client.post("/quotes", json={"amounts": ["20000"]}).json()["quotes"]
+
+    assert [q["open_credit_lines"] for q in quotes] == [0, 10, 51]
+    assert [q["decision"] for q in quotes] == ["approved", "approved", "denied"]
+
+
+def test_identical_grids_are_memoized(monkeypatch):
+    calls = []
+    compute_offers = offer_batch.compute_offers
+    monkeypatch.setattr("api.quotes.compute_offers", lambda *a, **kw: calls.append(1) or compute_offers(*a, **kw))
+    service = QuoteService()
+
+    first = service.render([Decimal("20000"), Decimal("30000")], [5])
+    # Same grid, amounts written differently
+    second = service.render([Decimal("20000.00"), Decimal("30000.0")], [5])
+    service.render([Decimal("20000")], [5])
+
+    assert second is first
+    assert len(calls) == 2
+    assert service.stats()["hits"] == 1
+
+
+def test_memoized_grids_are_bounded_by_size():
+    amounts = [Decimal(20000 + i) for i in range(10)]
+    service = QuoteService(cache_max_bytes=3000, cache_max_cells=10)
+
+    small = [service.render([amount], [5, 20]) for amount in amounts]
+    service.render(amounts, [5, 20])
+
+    stats = service.stats()
+    # Only the rendered bytes count, and the 20 cell grid isn't kept
+    assert stats["bytes"] == sum(map(len, small[-stats["size"]:])) <= 3000
+    assert stats["size"] < len(small)
+    assert service.render(amounts, [5, 20]) is not service.render(amounts, [5, 20])
+
+
+def test_grid_size_is_limited(client, monkeypatch):
+    monkeypatch.setattr(main, "quote_service", QuoteService(max_cells=4))
+
+    response = client.post("/quotes", json={"amounts": ["20000", "30000"], "open_credit_lines": [1, 2, 3]})
+
+    assert response.status_code == 400
+    assert client.post("/quotes", json={"amounts": []}).status_code == 422
+
+
+def test_schedules_are_streamed_as_ndjson(client):
+    response = client.post("/quotes", json={
+        "amounts": ["25000", "60000"], "open_credit_lines": [3], "include_schedule": True,
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    approved, denied = [json.loads(line) for line in response.text.splitlines()]
+    schedule = approved["schedule"]
+    assert len(schedule) == approved["offer"]["term_months"] == 36
+    assert schedule[0]["payment"] == approved["offer"]["monthly_payment"]
+    assert schedule[-1]["balance"] == "0.00"
+    assert sum(Decimal(row["principal"]) for row in schedule) == Decimal("25000.00")
+    assert denied["schedule"] is None and denied["offer"] is None
+
+
+def test_amortization_schedule_pays_off_the_principal():
+    for principal, rate, term in [(Decimal("10000"), 10.0, 36), (Decimal("49999.99"), 20.0, 24),
+                                  (Decimal("12345.67"), 0.0, 7)]:
+        rows = list(amortization_schedule(principal, rate, term))
+
+        assert [row.month for row in rows] == list(range(1, term + 1))
+        assert sum(row.principal for row in rows) == principal
+        assert rows[-1].balance == 0
+        assert all(row.payment == row.principal + row.interest for row in rows)
+        # Only the last payment absorbs the rounding
+        assert len({row.payment for row in rows[:-1]}) == 1
+        assert abs(rows[-1].payment - rows[0].payment) <= Decimal("0.10")
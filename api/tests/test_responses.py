@@ -0,0 +1,53 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from api.helpers import fetch_application_values
+from api.models import Application, ApplicationStatus, ApplicationStatusReason
+from api.responses import application_response_content, application_values, render_json
+from api.schemas import ApplicationResponse, OfferResponse
+from api.tests.test_batch import batch_item
+
+
+def pydantic_response(row: Application) -> ApplicationResponse:
+    """Mapping the handlers used before the projection read path."""
+    return ApplicationResponse(
+        application_id=row.application_id,
+        decision=row.application_status,
+        open_credit_lines=row.open_credit_lines,
+        offer=(
+            OfferResponse(
+                total_amount=row.requested_amount,
+                interest_rate=row.interest_rate,
+                term_months=row.term_months,
+                monthly_payment=row.monthly_payment,
+            )
+            if row.application_status is ApplicationStatus.APPROVED
+            else None
+        ),
+        reason=(row.reason if row.application_status is ApplicationStatus.DENIED else None),
+    )
+
+
+@pytest.mark.parametrize("row", [
+    Application(application_id="application_1", application_status=ApplicationStatus.APPROVED,
+                open_credit_lines=5, requested_amount=Decimal("25000.00"), interest_rate=Decimal("10.00"),
+                term_months=36, monthly_payment=Decimal("806.68"), reason=None),
+    Application(application_id="application_2", application_status=ApplicationStatus.DENIED,
+                open_credit_lines=75, requested_amount=Decimal("25000"), interest_rate=None,
+                term_months=None, monthly_payment=None, reason=ApplicationStatusReason.CREDIT_LINES_OUT_OF_BOUNDS),
+])
+def test_same_json_as_pydantic_response(row):
+    body = render_json(application_response_content(application_values(row)))
+    assert json.loads(body) == json.loads(pydantic_response(row).model_dump_json())
+
+
+def test_projection_matches_stored_row(client, test_db):
+    created = client.post("/applications", json=batch_item()).json()
+
+    with test_db() as db:
+        values = fetch_application_values(db, created["application_id"])
+        assert not db.identity_map  # nothing hydrated
+        assert application_response_content(values) == created
+        assert fetch_application_values(db, "application_missing") is None
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+
+from api import security
+from api.helpers import borrower_fingerprint, find_or_create_borrower
+from api.models import Application, Base, Borrower
+from api.rotation import rotate_borrower_keys
+from api.security import hash_ssn
+from api.tests.test_api import create_valid_borrower
+
+OLD_ENC_KEY = Fernet.generate_key().decode("utf-8")
+NEW_ENC_KEY = Fernet.generate_key().decode("utf-8")
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rotation.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    engine.dispose()
+
+
+def create_borrowers(session_factory, count):
+    with session_factory() as db:
+        ids = [
+            find_or_create_borrower(db, create_valid_borrower(ssn=f"123-45-{i:04d}")).id
+            for i in range(count)
+        ]
+        db.commit()
+    return ids
+
+
+def test_old_and_new_keys_work_during_rotation(keys, session_factory):
+    keys(OLD_ENC_KEY, "old-hash-key")
+    [borrower_id] = create_borrowers(session_factory, 1)
+
+    keys(f"{NEW_ENC_KEY},{OLD_ENC_KEY}", "new-hash-key", previous="old-hash-key")
+    with session_factory() as db:
+        found = find_or_create_borrower(db, create_valid_borrower(ssn="123-45-0000"))
+        # Found under the old hash, and its old ciphertext still decrypts
+        assert found.id == borrower_id
+        assert security.decrypt_ssn(found.ssn_encrypted) == "123450000"
+        new = find_or_create_borrower(db, create_valid_borrower(ssn="999-99-9999"))
+        assert new.ssn_hash == hash_ssn("999999999")
+        assert security.decrypt_ssn_with_key_status(new.ssn_encrypted)[1]
+
+
+def test_rotation_resumes_from_checkpoint(keys, session_factory, tmp_path):
+    keys(OLD_ENC_KEY, "old-hash-key")
+    ids = create_borrowers(session_factory, 5)
+
+    keys(f"{NEW_ENC_KEY},{OLD_ENC_KEY}", "new-hash-key", previous="old-hash-key")
+    checkpoint = str(tmp_path / "rotation.json")
+    engine = session_factory.kw["bind"]
+
+    partial = rotate_borrower_keys(engine, chunk_size=2, pause=0, checkpoint=checkpoint, max_chunks=1)
+    assert (partial.last_id, partial.rewritten) == (ids[1], 2)
+    assert os.path.exists(checkpoint)
+
+    done = rotate_borrower_keys(engine, chunk_size=2, pause=0, checkpoint=checkpoint)
+    assert (done.scanned, done.rewritten, done.merged) == (5, 5, 0)
+    assert not os.path.exists(checkpoint)
+
+    # Old keys can now be dropped
+    keys(NEW_ENC_KEY, "new-hash-key")
+    with session_factory() as db:
+        for i, borrower_id in enumerate(ids):
+            borrower = find_or_create_borrower(db, create_valid_borrower(ssn=f"123-45-{i:04d}"))
+            assert borrower.id == borrower_id
+            assert security.decrypt_ssn(borrower.ssn_encrypted) == f"12345{i:04d}"
+            assert borrower.fingerprint == borrower_fingerprint(borrower, hash_ssn(f"12345{i:04d}"))
+
+    # Nothing left to do on a second run
+    assert rotate_borrower_keys(engine, pause=0).rewritten == 0
+
+
+def test_rotation_merges_duplicates_across_key_generations(keys, session_factory):
+    keys(OLD_ENC_KEY, "old-hash-key")
+    [old_id] = create_borrowers(session_factory, 1)
+    # Same borrower written under the new keys before the old hash key was listed
+    keys(f"{NEW_ENC_KEY},{OLD_ENC_KEY}", "new-hash-key")
+    [new_id] = create_borrowers(session_factory, 1)
+    assert new_id != old_id
+    engine = session_factory.kw["bind"]
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO applications (application_id, borrower_id, open_credit_lines, requested_amount, "
+            "application_status, created_at, updated) VALUES ('application_1', :b, 5, 20000, 'DENIED', "
+            "CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+        ), {"b": old_id})
+
+    progress = rotate_borrower_keys(engine, pause=0)
+
+    assert progress.merged == 1
+    with engine.connect() as conn:
+        assert conn.execute(select(Borrower.id)).scalars().all() == [new_id]
+        assert conn.scalar(select(Application.borrower_id)) == new_id
+
+
+def test_rotation_keeps_unfingerprinted_snapshots_apart(keys, session_factory):
+    keys(OLD_ENC_KEY, "old-hash-key")
+    [fingerprinted, variant] = create_borrowers(session_factory, 2)
+    engine = session_factory.kw["bind"]
+    with engine.begin() as conn:
+        # A case variant the fingerprint backfill left unfingerprinted (api.migrations)
+        conn.execute(text("UPDATE borrowers SET ssn_hash = (SELECT ssn_hash FROM borrowers WHERE id = :a), "
+                          "ssn_encrypted = (SELECT ssn_encrypted FROM borrowers WHERE id = :a), "
+                          "email = upper(email), fingerprint = NULL WHERE id = :b"),
+                     {"a": fingerprinted, "b": variant})
+    keys(f"{NEW_ENC_KEY},{OLD_ENC_KEY}", "new-hash-key,old-hash-key")
+
+    progress = rotate_borrower_keys(engine, pause=0)
+
+    assert (progress.rewritten, progress.merged) == (2, 0)
+    with engine.connect() as conn:
+        rows = conn.execute(select(Borrower.id, Borrower.fingerprint, Borrower.ssn_hash).order_by(Borrower.id)).all()
+    assert [row.id for row in rows] == [fingerprinted, variant]
+    assert rows[1].fingerprint is None
+    assert rows[0].ssn_hash == rows[1].ssn_hash == hash_ssn("123-45-0000")
@@ -0,0 +1,67 @@
+import random
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from api.constants import TIER_1_RATE
+from api.models import ApplicationStatus, ApplicationStatusReason
+from api.rules.offer import compute_offer
+from api.rules.offer_batch import compute_offers, monthly_payments_cents, to_cents
+
+
+def assert_matches_scalar(amounts, lines):
+    batch = compute_offers(amounts, lines)
+    for i, (amount, line_count) in enumerate(zip(amounts, lines)):
+        decision = compute_offer(amount, line_count)
+        assert batch.status[i] is decision.status, (amount, line_count)
+        assert batch.reason[i] == decision.reason, (amount, line_count)
+        if decision.offer is None:
+            assert not batch.approved[i]
+            assert np.isnan(batch.interest_rate[i])
+        else:
+            assert batch.interest_rate[i] == decision.offer.interest_rate
+            assert batch.term_months[i] == decision.offer.term_months
+            assert Decimal(int(batch.monthly_payment_cents[i])) / 100 == decision.offer.monthly_payment
+
+
+def test_matches_scalar_on_boundaries():
+    amounts = [Decimal(a) for a in ("0", "9999.99", "10000", "10000.01", "25000", "49999.99", "50000", "50000.01")]
+    lines = [0, 9, 10, 11, 49, 50, 51, 100]
+    grid = [(a, l) for a in amounts for l in lines]
+    assert_matches_scalar([a for a, _ in grid], [l for _, l in grid])
+
+
+def test_matches_scalar_on_random_sample():
+    rng = random.Random(1234)
+    amounts = [Decimal(rng.randint(900000, 5100000)) / 100 for _ in range(20000)]
+    lines = [rng.randint(0, 100) for _ in range(20000)]
+    assert_matches_scalar(amounts, lines)
+
+
+def test_accepts_floats_and_numpy_arrays():
+    batch = compute_offers(np.array([25000.0, 5000.0]), np.array([3, 3]))
+    assert list(batch.status) == [ApplicationStatus.APPROVED, ApplicationStatus.DENIED]
+    assert batch.reason[1] is ApplicationStatusReason.REQUEST_AMOUNT_OUT_OF_BOUNDS
+    assert batch.monthly_payment_cents[0] == 80668
+
+
+def test_half_cent_ties_use_exact_rounding():
+    # 0% APR makes P / n land exactly on half cents
+    principal = to_cents([Decimal("0.03"), Decimal("0.05")])
+    assert list(monthly_payments_cents(principal, 0.0, 2)) == [2, 3]
+
+
+def test_rejects_bad_input():
+    with pytest.raises(ValueError):
+        compute_offers([Decimal("25000")], [-1])
+    with pytest.raises(ValueError):
+        compute_offers([Decimal("25000")], [1, 2])
+    with pytest.raises(ValueError):
+        monthly_payments_cents(to_cents([1]), TIER_1_RATE, 0)
+
+
+def test_empty_batch():
+    batch = compute_offers([], [])
+    assert len(batch) == 0
+    assert batch.monthly_payment_cents.tolist() == []
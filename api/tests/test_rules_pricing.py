@@ -0,0 +1,60 @@
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+from api.rules.offer import compute_monthly_payment, compute_offer
+from api.rules.pricing import (
+    CONFIGURED_TERMS,
+    annuity_cache_info,
+    annuity_factor,
+    monthly_payment_cents,
+)
+
+
+def decimal_monthly_payment(principal: Decimal, interest_rate: float, term_months: int) -> Decimal:
+    """The original arbitrary-precision formula, kept as the reference."""
+    principal = Decimal(principal)
+    monthly_rate = (Decimal(interest_rate) / Decimal("100")) / Decimal("12")
+    if monthly_rate == 0:
+        monthly_payment = principal / term_months
+    else:
+        one = Decimal(1)
+        denom = one - (one + monthly_rate) ** (Decimal(-term_months))
+        monthly_payment = principal * monthly_rate / denom
+    return monthly_payment.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+@pytest.mark.parametrize("rate, term", CONFIGURED_TERMS + ((0.0, 24), (7.5, 60), (99.99, 360)))
+def test_matches_decimal_reference(rate, term):
+    rng = random.Random(term)
+    principals = [Decimal(rng.randint(0, 5000000)) / 100 for _ in range(5000)]
+    principals += [Decimal("10000"), Decimal("50000"), Decimal("10000.005"), Decimal("0.01")]
+    for principal in principals:
+        assert compute_monthly_payment(principal, rate, term) == decimal_monthly_payment(principal, rate, term)
+
+
+def test_zero_rate_ties_round_half_up():
+    # 0.03 / 2 and 0.05 / 2 land exactly on half cents
+    assert monthly_payment_cents(Decimal("0.03"), 0.0, 2) == 2
+    assert monthly_payment_cents(Decimal("0.05"), 0.0, 2) == 3
+
+
+def test_invalid_term():
+    with pytest.raises(ValueError):
+        compute_monthly_payment(Decimal("10000"), 10.0, 0)
+
+
+def test_configured_tiers_never_miss_the_cache():
+    for rate, term in CONFIGURED_TERMS:
+        annuity_factor(rate, term)
+    before = annuity_cache_info()
+
+    for lines in (0, 9, 10, 50):
+        compute_offer(Decimal("25000"), lines)
+
+    after = annuity_cache_info()
+    assert after["misses"] == before["misses"]
+    assert after["hits"] == before["hits"] + 4
+    assert after["size"] >= len(CONFIGURED_TERMS)
+    assert 0 < after["hit_rate"] <= 1
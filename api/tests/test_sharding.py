@@ -0,0 +1,281 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, select, update
+
+from api import main
+from api.crypto import prepare_ssn
+from api.models import Application, Borrower, IdempotencyKey
+from api.settings import AppSettings
+from api.sharding import ShardMap, bucket_of_hash, move_keys, rebalance
+from api.stats import verify_stats
+from api.storage import StorageSettings
+from api.tests.test_api import create_borrower_dict
+from api.utils import generate_uuid, id_bucket
+
+
+def shard_settings(tmp_path, shards, db_async=False, map_path=None):
+    storage = StorageSettings.from_env(url=f"sqlite:///{tmp_path / 'shard0.db'}")
+    return AppSettings(
+        storage=storage,
+        shard_urls=tuple(f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(1, shards)),
+        shard_map_path=map_path,
+        db_async=db_async,
+        create_schema=True,
+        warm_up=False,
+        idempotency_purge_interval=0,
+    )
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """Start a sharded app: sharded(shards, **settings) -> (client, app)."""
+    # create_app() points the pool metrics at its database: restore the module's afterwards
+    monkeypatch.setattr(main, "database", main.database)
+    clients = []
+
+    def start(shards=3, **overrides):
+        main.application_cache.clear()
+        main.idempotency_store.clear()
+        app = main.create_app(shard_settings(tmp_path, shards, **overrides))
+        client = TestClient(app)
+        clients.append(client.__enter__())
+        return client, app
+
+    yield start
+    for client in clients:
+        client.__exit__(None, None, None)
+    main.application_cache.clear()
+    main.idempotency_store.clear()
+
+
+def ssns_by_shard(shard_map, per_shard):
+    """per_shard SSNs landing on every shard of the map."""
+    found = {shard: [] for shard in range(shard_map.shards)}
+    number = 0
+    while any(len(ssns) < per_shard for ssns in found.values()):
+        number += 1
+        ssn = f"123-45-{number:04d}"
+        ssns = found[shard_map.shard_of_hash(prepare_ssn(ssn).ssn_hash)]
+        if len(ssns) < per_shard:
+            ssns.append(ssn)
+    return found
+
+
+def submit(client, ssn, **headers):
+    response = client.post("/applications", headers=headers,
+                           json={"borrower": create_borrower_dict(ssn=ssn), "requested_amount": 25000})
+    assert response.status_code == 201
+    return response.json()["application_id"]
+
+
+def application_ids(engine):
+    with engine.connect() as conn:
+        return set(conn.execute(select(Application.application_id)).scalars())
+
+
+@pytest.mark.parametrize("db_async", [False, True], ids=["sync", "async"])
+def test_writes_and_reads_go_to_the_borrowers_shard(sharded, db_async):
+    client, app = sharded(db_async=db_async)
+    database = app.state.database
+    submitted = {
+        shard: [submit(client, ssn) for ssn in ssns]
+        for shard, ssns in ssns_by_shard(database.map, 2).items()
+    }
+
+    for shard, ids in submitted.items():
+        assert application_ids(database.engines[shard]) == set(ids)
+        assert {database.map.buckets[id_bucket(app_id)] for app_id in ids} == {shard}
+
+    # A GET reads the shard its ID names, and no other
+    main.application_cache.clear()
+    statements = {shard: 0 for shard in submitted}
+    for shard, engine in enumerate(database.shards):
+        target = engine.async_engine.sync_engine if db_async else engine.engine
+
+        def count(*args, shard=shard):
+            statements[shard] += 1
+
+        event.listen(target, "before_cursor_execute", count)
+    assert client.get(f"/applications/{submitted[2][0]}").status_code == 200
+    assert statements == {0: 0, 1: 0, 2: 1}
+    assert client.get("/applications/application_missing").status_code == 404
+
+
+def test_listing_export_and_stats_span_every_shard(sharded):
+    client, app = sharded()
+    database = app.state.database
+    ids = [submit(client, ssn) for ssns in ssns_by_shard(database.map, 3).values() for ssn in ssns]
+    # The same created_at on every shard: pages still split deterministically
+    for engine in database.engines:
+        with engine.begin() as conn:
+            conn.execute(update(Application).values(created_at=datetime(2025, 1, 1)))
+
+    listed, cursor = [], None
+    while True:
+        params = dict(limit=2, **({"cursor": cursor} if cursor else {}))
+        body = client.get("/applications", params=params).json()
+        listed += [item["application_id"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(listed) == sorted(ids)
+    one_page = client.get("/applications", params={"limit": 500}).json()["items"]
+    assert [item["application_id"] for item in one_page] == listed
+
+    export = client.get("/applications/export").text.splitlines()
+    assert len(export) == len(ids)
+    assert [line.split('"application_id":"')[1].split('"')[0] for line in export] == listed
+
+    # Counted on the day they were submitted
+    assert client.get("/stats").json()["totals"]["applications"] == len(ids)
+
+
+def test_batch_is_written_per_shard(sharded):
+    client, app = sharded(shards=2)
+    database = app.state.database
+    ssns = ssns_by_shard(database.map, 2)
+    items = [
+        {"borrower": create_borrower_dict(ssn=ssn), "requested_amount": 25000}
+        for ssn in (ssns[0][0], ssns[1][0], ssns[0][1], ssns[1][1])
+    ]
+    items.insert(2, {"borrower": create_borrower_dict(ssn="bad"), "requested_amount": 25000})
+
+    body = client.post("/applications/batch", json={"applications": items}).json()
+
+    assert (body["succeeded"], body["failed"]) == (4, 1)
+    results = body["results"]
+    assert results[2]["error"] is not None
+    created = [result["application"]["application_id"] for result in results if result["application"]]
+    assert application_ids(database.engines[0]) == {created[0], created[2]}
+    assert application_ids(database.engines[1]) == {created[1], created[3]}
+
+
+def test_rebalanced_map_moves_fewest_buckets():
+    two = ShardMap.default(2)
+    three = two.rebalanced(3)
+
+    assert [three.buckets.count(shard) for shard in range(3)] == [342, 341, 341]
+    assert sum(old != new for old, new in zip(two.buckets, three.buckets)) == 341
+    assert three.rebalanced(3).buckets == three.buckets
+    assert two.rebalanced(1).buckets == ShardMap.default(1).buckets
+
+
+def test_rebalance_moves_rows_to_their_new_shard(sharded, tmp_path):
+    # Everything written on shard 0, then a second shard is added
+    map_path = str(tmp_path / "shard_map.json")
+    ShardMap.default(1).save(map_path)
+    client, app = sharded(shards=2, map_path=map_path)
+    engines = app.state.database.engines
+    new_map = ShardMap.default(1).rebalanced(2)
+    ssns = ssns_by_shard(new_map, 3)
+    ids = {shard: [submit(client, ssn, **{"Idempotency-Key": ssn}) for ssn in batch] for shard, batch in ssns.items()}
+    assert application_ids(engines[1]) == set()
+
+    checkpoint = str(tmp_path / "rebalance.json")
+    partial = rebalance(engines, new_map, chunk_size=2, pause=0, checkpoint=checkpoint, max_chunks=1)
+    assert partial.scanned == 2
+    done = rebalance(engines, new_map, chunk_size=2, pause=0, checkpoint=checkpoint)
+
+    assert done.moved_borrowers == done.moved_applications == 3
+    assert application_ids(engines[0]) == set(ids[0])
+    assert application_ids(engines[1]) == set(ids[1])
+    with engines[0].connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Borrower)).scalar_one() == 3
+    # Keys follow their own bucket, not their borrower's
+    keys = ssns[0] + ssns[1]
+    for shard, engine in enumerate(engines):
+        with engine.connect() as conn:
+            stored = set(conn.execute(select(IdempotencyKey.key)).scalars())
+        assert stored == {key for key in keys if new_map.shard_of_key(key) == shard}
+    assert done.moved_keys == sum(new_map.shard_of_key(key) == 1 for key in keys)
+    assert verify_stats(engines[0]) == verify_stats(engines[1]) == []
+
+    # Served from the new shard with the new map, by ID and by idempotent replay
+    new_map.save(map_path)
+    client, _ = sharded(shards=2, map_path=map_path)
+    for app_id in ids[1]:
+        assert client.get(f"/applications/{app_id}").status_code == 200
+    replay = client.post("/applications", headers={"Idempotency-Key": ssns[1][0]},
+                         json={"borrower": create_borrower_dict(ssn=ssns[1][0]), "requested_amount": 25000})
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+def test_key_reused_for_another_shards_borrower_is_a_mismatch(sharded):
+    client, app = sharded(shards=3)
+    database = app.state.database
+    ssns = ssns_by_shard(database.map, 1)
+    # A key whose own shard is neither borrower's: the response is stored after the application
+    key = next(f"key-{i}" for i in range(100) if database.map.shard_of_key(f"key-{i}") == 2)
+
+    first = client.post("/applications", headers={"Idempotency-Key": key},
+                        json={"borrower": create_borrower_dict(ssn=ssns[0][0]), "requested_amount": 25000})
+    main.idempotency_store.clear()
+    other = client.post("/applications", headers={"Idempotency-Key": key},
+                        json={"borrower": create_borrower_dict(ssn=ssns[1][0]), "requested_amount": 25000})
+    replay = client.post("/applications", headers={"Idempotency-Key": key},
+                         json={"borrower": create_borrower_dict(ssn=ssns[0][0]), "requested_amount": 25000})
+
+    assert first.status_code == 201
+    assert other.status_code == 422
+    assert (replay.status_code, replay.content) == (201, first.content)
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert application_ids(database.engines[1]) == set()
+    with database.engines[2].connect() as conn:
+        stored = conn.execute(select(IdempotencyKey.application_id, IdempotencyKey.response_body)).one()
+    assert stored == (first.json()["application_id"], first.content)
+
+
+def test_key_not_completed_after_commit_is_completed_by_a_retry(sharded, monkeypatch):
+    client, app = sharded(shards=3)
+    database = app.state.database
+    ssn = ssns_by_shard(database.map, 1)[0][0]
+    key = next(f"key-{i}" for i in range(100) if database.map.shard_of_key(f"key-{i}") == 2)
+    body = {"borrower": create_borrower_dict(ssn=ssn), "requested_amount": 25000}
+
+    def unreachable(*args):
+        raise OSError("shard 2 unavailable")
+
+    complete_key = main.complete_key
+    monkeypatch.setattr(main, "complete_key", unreachable)
+    first = client.post("/applications", headers={"Idempotency-Key": key}, json=body)
+    monkeypatch.setattr(main, "complete_key", complete_key)
+    # Another worker, without this one's in-memory replay
+    main.idempotency_store.clear()
+    retry = client.post("/applications", headers={"Idempotency-Key": key}, json=body)
+
+    assert first.status_code == 201
+    assert (retry.status_code, retry.content) == (201, first.content)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(application_ids(database.engines[0])) == 1
+    with database.engines[2].connect() as conn:
+        assert conn.execute(select(IdempotencyKey.response_body)).scalar_one() == first.content
+
+
+def test_move_keys_completes_a_claim_from_its_copy(sharded):
+    _, app = sharded(shards=2)
+    database = app.state.database
+    key = next(f"key-{i}" for i in range(100) if database.map.shard_of_key(f"key-{i}") == 1)
+    row = dict(key=key, request_hash="h", created_at=datetime.utcnow())
+    with database.engines[1].begin() as conn:
+        conn.execute(IdempotencyKey.__table__.insert().values(**row))
+    with database.engines[0].begin() as conn:
+        conn.execute(IdempotencyKey.__table__.insert().values(
+            **row, application_id="application_x", status_code=201, response_body=b"{}"))
+
+    assert move_keys(database.engines, database.map) == 1
+    with database.engines[1].connect() as conn:
+        assert conn.execute(select(IdempotencyKey.response_body)).scalar_one() == b"{}"
+    with database.engines[0].connect() as conn:
+        assert conn.execute(select(func.count()).select_from(IdempotencyKey)).scalar_one() == 0
+
+
+def test_ids_carry_their_bucket():
+    ssn_hash = prepare_ssn("123-45-6789").ssn_hash
+    app_id = generate_uuid(prefix="application", bucket=bucket_of_hash(ssn_hash))
+
+    assert len(app_id) == 48
+    assert id_bucket(app_id) == bucket_of_hash(ssn_hash)
+    assert id_bucket(generate_uuid(prefix="application")) is None
+    assert id_bucket("application_missing") is None
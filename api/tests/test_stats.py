@@ -0,0 +1,142 @@
+import json
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import Engine, create_engine, event, text, update
+
+from api import main
+from api.bulk_import import ImportProgress, import_file
+from api.checkpoint import save_checkpoint
+from api.credit import CreditCheckProvider
+from api.migrations import backfill_decision_stats
+from api.models import Base, DailyDecisionStats
+from api.stats import rebuild_stats, verify_stats
+from api.tests.test_api import create_borrower_dict
+from api.tests.test_batch import batch_item
+
+OUT_OF_BOUNDS = "Requested amount out of bounds (<10k or >50k)"
+
+
+class FixedCreditCheck(CreditCheckProvider):
+    def __init__(self, open_credit_lines):
+        self.value = open_credit_lines
+
+    async def open_credit_lines(self, ssn):
+        return self.value
+
+
+def submit(client, amount, i=0):
+    payload = {"borrower": create_borrower_dict(ssn=f"123-45-{i:04d}"), "requested_amount": amount}
+    assert client.post("/applications", json=payload).status_code == 201
+
+
+def test_stats_follow_every_insert(client, test_db, monkeypatch):
+    monkeypatch.setattr(main, "credit_provider", FixedCreditCheck(20))  # tier 2
+    submit(client, 25000)
+    submit(client, 30000.50)
+    submit(client, 5000)  # denied
+
+    monkeypatch.setattr(main, "credit_provider", FixedCreditCheck(5))   # tier 1
+    body = client.post("/applications/batch", json={"applications": [
+        batch_item(amount=12000), batch_item(amount=90000), batch_item(email="bad"),
+    ]}).json()
+    assert body["succeeded"] == 2
+
+    stats = client.get("/stats").json()
+
+    today = datetime.utcnow().date().isoformat()
+    assert stats["to_day"] == today
+    assert [day["day"] for day in stats["days"]] == [today]
+    totals = stats["totals"]
+    assert (totals["applications"], totals["approved"], totals["denied"]) == (5, 3, 2)
+    assert totals["approval_rate"] == pytest.approx(0.6)
+    assert totals["denials_by_reason"][OUT_OF_BOUNDS] == 2
+    assert totals["tier_mix"] == {"tier_1": 1, "tier_2": 2}
+    assert totals["approved_principal"] == "67000.50"
+    assert stats["days"][0]["applications"] == 5
+
+    assert verify_stats(test_db.kw["bind"]) == []
+
+
+def test_stats_read_only_the_counters(client, test_db):
+    submit(client, 25000)
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", listener)
+    try:
+        client.get("/stats")
+    finally:
+        event.remove(Engine, "before_cursor_execute", listener)
+
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 1
+    assert "daily_decision_stats" in selects[0]
+    assert "FROM applications" not in selects[0]
+
+
+def test_stats_range_validation(client, test_db):
+    assert client.get("/stats", params={"from_day": "2025-02-01", "to_day": "2025-01-01"}).status_code == 400
+    assert client.get("/stats", params={"from_day": "2020-01-01", "to_day": "2025-01-01"}).status_code == 400
+    empty = client.get("/stats", params={"from_day": "2025-01-01", "to_day": "2025-01-31"}).json()
+    assert empty["days"] == []
+    assert empty["totals"]["applications"] == 0
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def import_records(engine, tmp_path, checkpoint=None):
+    path = tmp_path / "apps.ndjson"
+    path.write_text("".join(json.dumps({
+        "borrower": create_borrower_dict(ssn=f"123-45-{i:04d}"),
+        "requested_amount": "25000.00" if i % 2 else "5000.00",
+        "open_credit_lines": 5,
+        "created_at": f"2025-01-0{1 + i % 3}T12:00:00",
+    }) + "\n" for i in range(9)))
+    return import_file(engine, str(path), chunk_size=4, checkpoint=checkpoint)
+
+
+def test_bulk_import_counts_each_application_once(engine, tmp_path):
+    checkpoint = str(tmp_path / "apps.checkpoint.json")
+    import_records(engine, tmp_path)
+    # Replay everything, as after a lost checkpoint
+    save_checkpoint(checkpoint, ImportProgress())
+    import_records(engine, tmp_path, checkpoint)
+
+    assert verify_stats(engine) == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT sum(applications) FROM daily_decision_stats")).scalar() == 9
+
+
+def test_verify_detects_drift_and_rebuild_fixes_it(engine, tmp_path):
+    import_records(engine, tmp_path)
+    with engine.begin() as conn:
+        conn.execute(
+            update(DailyDecisionStats.__table__)
+            .where(DailyDecisionStats.day == date(2025, 1, 2), DailyDecisionStats.reason == "")
+            .values(applications=DailyDecisionStats.applications + 1)
+        )
+
+    problems = verify_stats(engine)
+    assert len(problems) == 1 and problems[0].startswith("2025-01-02")
+
+    assert rebuild_stats(engine) == 6  # 3 days x (approved, denied)
+    assert verify_stats(engine) == []
+
+
+def test_migration_backfills_existing_applications(engine, tmp_path):
+    import_records(engine, tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM daily_decision_stats"))
+
+    assert backfill_decision_stats(engine)
+    assert not backfill_decision_stats(engine)  # already filled
+    assert verify_stats(engine) == []
@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import text
+
+from api.storage import StorageSettings, create_engine_from_settings, pool_stats
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///./other.db")
+    monkeypatch.setenv("DB_POOL_SIZE", "12")
+    monkeypatch.setenv("SQLITE_SYNCHRONOUS", "full")
+
+    settings = StorageSettings.from_env(max_overflow=3)
+
+    assert settings.url == "sqlite:///./other.db"
+    assert settings.async_url == "sqlite+aiosqlite:///./other.db"
+    assert settings.pool_size == 12
+    assert settings.max_overflow == 3
+    assert "PRAGMA synchronous = FULL" in settings.pragmas()
+
+
+def test_rejects_unknown_pragma_values():
+    with pytest.raises(ValueError):
+        StorageSettings(sqlite_journal_mode="WAL; DROP TABLE borrowers")
+    with pytest.raises(ValueError):
+        StorageSettings(sqlite_synchronous="sometimes")
+
+
+def test_pragmas_applied_to_every_connection(tmp_path):
+    settings = StorageSettings(url=f"sqlite:///{tmp_path / 'p.db'}", sqlite_busy_timeout_ms=1234, pool_size=2)
+    engine = create_engine_from_settings(settings)
+
+    with engine.connect() as first, engine.connect() as second:
+        for conn in (first, second):
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+        stats = pool_stats(engine)
+        assert stats["checkedout"] == 2
+        assert stats["size"] == 2
+
+    assert pool_stats(engine)["checkedin"] == 2
+    engine.dispose()
+
+
+def test_readers_do_not_block_behind_writer(tmp_path):
+    settings = StorageSettings(url=f"sqlite:///{tmp_path / 'w.db'}", sqlite_busy_timeout_ms=0)
+    engine = create_engine_from_settings(settings)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+
+    writer = engine.raw_connection()
+    try:
+        cursor = writer.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("INSERT INTO t VALUES (2)")
+
+        # With a rollback journal and busy_timeout=0 this read would fail
+        # with "database is locked" once the writer starts committing.
+        with engine.connect() as reader:
+            assert reader.execute(text("SELECT count(*) FROM t")).scalar() == 1
+        writer.commit()
+    finally:
+        writer.close()
+    engine.dispose()
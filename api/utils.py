@@ -1,5 +1,50 @@
 import uuid
+from typing import Optional
 
-def generate_uuid(prefix: str) -> str:
-    """Generate an opaque ID like '<prefix>_<uuid>'"""
-    return f"{prefix}_{uuid.uuid4()}"
+from dotenv import load_dotenv
+
+_UUID_BITS = (1 << 128) - 1
+_BUCKET_SHIFT = 112        # the bucket is the uuid's first 16 bits
+_VERSION_MASK = 0xF << 76
+_VARIANT_MASK = 0x3 << 62
+
+
+def load_env_file() -> None:
+    """
+    Read ./.env into os.environ (variables already set win). Called by the
+    entry points before they build anything, never at import time.
+    """
+    load_dotenv()
+
+
+def bucketed_uuid(value: uuid.UUID, bucket: int) -> uuid.UUID:
+    """
+    value with its first 16 bits replaced by a shard bucket (api.sharding),
+    stamped as a version 8 (custom) uuid so it can't be mistaken for a
+    plain random one.
+    """
+    bits = value.int & ~(0xFFFF << _BUCKET_SHIFT) & ~_VERSION_MASK & ~_VARIANT_MASK & _UUID_BITS
+    bits |= bucket << _BUCKET_SHIFT | 0x8 << 76 | 0x2 << 62
+    return uuid.UUID(int=bits)
+
+
+def generate_uuid(prefix: str, bucket: Optional[int] = None) -> str:
+    """
+    Generate an opaque ID like '<prefix>_<uuid>'. With a bucket, the uuid
+    carries it (see id_bucket), so the row's shard is known from the id.
+    """
+    value = uuid.uuid4()
+    if bucket is not None:
+        value = bucketed_uuid(value, bucket)
+    return f"{prefix}_{value}"
+
+
+def id_bucket(public_id: str) -> Optional[int]:
+    """The bucket generate_uuid put in an ID, or None for older IDs (or garbage)."""
+    try:
+        value = uuid.UUID(public_id.rpartition("_")[2])
+    except ValueError:
+        return None
+    if value.version != 8:
+        return None
+    return value.int >> _BUCKET_SHIFT
@@ -0,0 +1,76 @@
+"""
+Bulk import throughput, in process vs on a process pool.
+
+Generates an NDJSON file of --records applications (--borrowers distinct
+borrowers, 1% invalid records) and imports it into a fresh database.
+
+Usage:
+    python -m benchmarks.bench_bulk_import [--records 20000] [--borrowers 5000] [--workers 4]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SSN_ENC_KEY", Fernet.generate_key().decode("utf-8"))
+os.environ.setdefault("SSN_HASH_KEY", "bench-hash-key")
+
+from api.bulk_import import import_file  # noqa: E402
+from api.models import Base  # noqa: E402
+from api.storage import StorageSettings, create_engine_from_settings  # noqa: E402
+
+
+def write_file(path: Path, records: int, borrowers: int) -> None:
+    rng = random.Random(0)
+    with open(path, "w") as f:
+        for i in range(records):
+            n = rng.randrange(borrowers)
+            record = {
+                "borrower": {
+                    "first_name": "John", "last_name": f"Doe{n}", "email": f"john{n}@example.com",
+                    "phone": "555-123-4567", "ssn": f"{n // 10000:03d}-{n // 100 % 100:02d}-{n % 10000:04d}",
+                    "address_street": "123 Main St", "city": "New York", "state": "NY", "zip_code": "10001",
+                },
+                "requested_amount": f"{rng.randint(5000, 60000)}.00",
+                "open_credit_lines": rng.randint(0, 100),
+            }
+            if i % 100 == 0:
+                record["borrower"]["email"] = "not-an-email"
+            f.write(json.dumps(record) + "\n")
+
+
+def run(path: Path, workers: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine_from_settings(StorageSettings(url=f"sqlite:///{Path(tmp) / 'bench.db'}"))
+        Base.metadata.create_all(bind=engine)
+        start = time.perf_counter()
+        progress = import_file(engine, str(path), workers=workers)
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    return progress.records / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--borrowers", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "applications.ndjson"
+        write_file(path, args.records, args.borrowers)
+        inline = run(path, 0)
+        pooled = run(path, args.workers)
+
+    print(f"in process         : {inline:8.0f} records/s")
+    print(f"{args.workers} worker processes : {pooled:8.0f} records/s")
+
+
+if __name__ == "__main__":
+    main()
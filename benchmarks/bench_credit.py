@@ -0,0 +1,87 @@
+"""
+Credit check latency against the local stand-in bureau, with and without
+the ssn_hash result cache.
+
+Simulates --requests application submissions at --concurrency, drawn from
+--borrowers distinct SSNs (so some are re-applications), against a bureau
+answering in latency + uniform(0, jitter) seconds. The bureau runs in a
+thread of this process and competes for the GIL, so absolute latencies are
+pessimistic; compare the two runs.
+
+Usage:
+    python -m benchmarks.bench_credit [--requests 1000] [--borrowers 500]
+        [--concurrency 50] [--latency 0.05] [--jitter 0.05]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SSN_ENC_KEY", Fernet.generate_key().decode("utf-8"))
+os.environ.setdefault("SSN_HASH_KEY", "bench-hash-key")
+
+from api.credit import HTTPCreditCheck  # noqa: E402
+from api.crypto import prepare_ssn  # noqa: E402
+from api.tests.bureau_stub import run_bureau  # noqa: E402
+
+
+def percentile(samples, q: float) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[int(q) - 1]
+
+
+def run(url: str, ssns, concurrency: int, cache_ttl: float) -> dict:
+    async def main():
+        provider = HTTPCreditCheck(url, max_concurrency=concurrency, max_connections=concurrency, cache_ttl=cache_ttl)
+        gate = asyncio.Semaphore(concurrency)  # the client side: concurrent requests
+        latencies = []
+
+        async def submit(ssn):
+            async with gate:
+                start = time.perf_counter()
+                await provider.open_credit_lines(prepare_ssn(ssn))
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(submit(ssn) for ssn in ssns))
+        elapsed = time.perf_counter() - start
+        await provider.aclose()
+        return latencies, elapsed, provider.stats()
+
+    latencies, elapsed, stats = asyncio.run(main())
+    return {
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "throughput": len(ssns) / elapsed,
+        "bureau_calls": stats["calls"],
+        "hit_rate": stats["cache_hit_rate"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--borrowers", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    ssns = [f"123-45-{rng.randrange(args.borrowers):04d}" for _ in range(args.requests)]
+
+    with run_bureau(latency=args.latency, jitter=args.jitter) as bureau:
+        for label, ttl in (("no cache", 0.0), ("cache", 300.0)):
+            r = run(bureau.url, ssns, args.concurrency, ttl)
+            print(
+                f"{label:9s} p50 {r['p50_ms']:6.1f} ms  p99 {r['p99_ms']:6.1f} ms  "
+                f"{r['throughput']:7.0f} req/s  bureau calls {r['bureau_calls']:5d}  "
+                f"hit rate {r['hit_rate']:.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Per-borrower SSN crypto cost, before and after the crypto service.
+
+  before: hash_ssn twice + encrypt_ssn, each normalizing the SSN again
+          with uncompiled regexes (the old find_or_create_borrower)
+  after:  prepare_ssn (normalize + hash once) + lazy encryption
+  batch:  CryptoService.encrypt_many with and without a worker pool
+
+Also reports the worst event loop stall during a burst of concurrent
+requests, with and without CRYPTO_WORKERS.
+
+Usage:
+    python -m benchmarks.bench_crypto [--n 20000] [--workers 4]
+"""
+import argparse
+import asyncio
+import hmac
+import os
+import re
+import time
+from hashlib import sha256
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SSN_ENC_KEY", Fernet.generate_key().decode("utf-8"))
+os.environ.setdefault("SSN_HASH_KEY", "bench-hash-key")
+
+from api.crypto import CryptoService, prepare_ssn  # noqa: E402
+from api.security import _get_fernet, _get_hash_key  # noqa: E402
+
+
+def legacy_normalize(ssn: str) -> str:
+    s = re.sub(r"[-\s]", "", ssn)
+    if not re.fullmatch(r"\d{9}", s):
+        raise ValueError("Invalid SSN format")
+    return s
+
+
+def legacy_hash(ssn: str) -> str:
+    return hmac.new(_get_hash_key(), legacy_normalize(ssn).encode("utf-8"), sha256).hexdigest()
+
+
+def legacy_encrypt(ssn: str) -> str:
+    return _get_fernet().encrypt(legacy_normalize(ssn).encode("utf-8")).decode("utf-8")
+
+
+def before(ssn: str):
+    legacy_hash(ssn)       # lookup filter
+    legacy_encrypt(ssn)    # new row
+    legacy_hash(ssn)       # new row
+
+
+def after(ssn: str):
+    prepare_ssn(ssn).encrypt()
+
+
+def per_call_us(fn, ssns) -> float:
+    start = time.perf_counter()
+    for ssn in ssns:
+        fn(ssn)
+    return (time.perf_counter() - start) / len(ssns) * 1e6
+
+
+def batch_us(service: CryptoService, ssns) -> float:
+    materials = service.prepare_many(ssns)
+    start = time.perf_counter()
+    service.encrypt_many(materials)
+    return (time.perf_counter() - start) / len(ssns) * 1e6
+
+
+def loop_lag_ms(service: CryptoService, ssns) -> float:
+    """Worst event loop stall while a burst of requests prepares SSNs concurrently."""
+    async def run():
+        worst = 0.0
+        done = False
+
+        async def heartbeat():
+            nonlocal worst
+            while not done:
+                start = time.perf_counter()
+                await asyncio.sleep(0)
+                worst = max(worst, time.perf_counter() - start)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.sleep(0)
+        await asyncio.gather(*(service.prepare_async(ssn) for ssn in ssns))
+        done = True
+        await beat
+        return worst * 1e3
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    ssns = [f"{i % 1000:03d}-{i % 100:02d}-{i % 10000:04d}" for i in range(args.n)]
+    inline, pooled = CryptoService(workers=0), CryptoService(workers=args.workers)
+    try:
+        print(f"per borrower, before        : {per_call_us(before, ssns):7.1f} us")
+        print(f"per borrower, after         : {per_call_us(after, ssns):7.1f} us")
+        print(f"batch encrypt, inline       : {batch_us(inline, ssns):7.1f} us/SSN")
+        print(f"batch encrypt, {args.workers} workers    : {batch_us(pooled, ssns):7.1f} us/SSN")
+        sample = ssns[:2000]
+        print(f"loop stall, burst, inline   : {loop_lag_ms(inline, sample):7.1f} ms")
+        print(f"loop stall, burst, {args.workers} workers: {loop_lag_ms(pooled, sample):7.1f} ms")
+    finally:
+        pooled.shutdown()
+
+
+if __name__ == "__main__":
+    main()
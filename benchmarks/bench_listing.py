@@ -0,0 +1,105 @@
+"""
+Application listing and export.
+
+  page latency: the last page of a deep listing, OFFSET vs keyset cursor
+  export memory: peak Python allocations exporting every row, loading all
+                 rows first vs streaming from the cursor (iter_export)
+
+Usage:
+    python -m benchmarks.bench_listing [--rows 200000] [--page-size 50]
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from api.listing import ApplicationFilters, iter_export, listing_query, render_ndjson_chunk
+from api.models import Application, ApplicationStatus, Base, Borrower
+from api.storage import StorageSettings, create_engine_from_settings
+
+START = datetime(2025, 1, 1)
+
+
+def populate(engine, rows: int) -> None:
+    with sessionmaker(bind=engine)() as db:
+        borrower_id = db.execute(insert(Borrower).values(
+            borrower_id="borrower_bench", first_name="A", last_name="B", email="a@b.com",
+            phone="5551234567", address_street="1 St", city="C", state="NY", zip_code="1",
+            ssn_encrypted="x", ssn_hash="0" * 64, fingerprint="0" * 64,
+        ).returning(Borrower.id)).scalar_one()
+        for start in range(0, rows, 10000):
+            db.execute(insert(Application), [
+                dict(
+                    application_id=f"application_{i}", borrower_id=borrower_id, open_credit_lines=5,
+                    requested_amount=25000, application_status=ApplicationStatus.APPROVED,
+                    interest_rate=10.0, term_months=36, monthly_payment=806.68,
+                    created_at=START + timedelta(seconds=i), updated=START,
+                )
+                for i in range(start, min(start + 10000, rows))
+            ])
+        db.commit()
+
+
+def last_page_ms(engine, rows: int, page_size: int) -> tuple:
+    offset_query = listing_query(ApplicationFilters()).offset(rows - page_size).limit(page_size)
+    with engine.connect() as conn:
+        # The cursor a client holds after paging to the end
+        before_last = conn.execute(listing_query(ApplicationFilters()).offset(rows - page_size - 1).limit(1)).one()
+        keyset_query = listing_query(ApplicationFilters(), after=(before_last.created_at, before_last.id))
+        keyset_query = keyset_query.limit(page_size)
+
+        timings = []
+        for query in (offset_query, keyset_query):
+            start = time.perf_counter()
+            for _ in range(10):
+                conn.execute(query).all()
+            timings.append((time.perf_counter() - start) / 10 * 1e3)
+    return tuple(timings)
+
+
+def export_peak_mb(fn) -> float:
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine_from_settings(StorageSettings(url=f"sqlite:///{Path(tmp) / 'bench.db'}"))
+        Base.metadata.create_all(bind=engine)
+        populate(engine, args.rows)
+
+        offset_ms, keyset_ms = last_page_ms(engine, args.rows, args.page_size)
+
+        def load_all():
+            with engine.connect() as conn:
+                render_ndjson_chunk(conn.execute(listing_query(ApplicationFilters())).all())
+
+        def stream():
+            for _ in iter_export(engine, ApplicationFilters(), "ndjson"):
+                pass
+
+        load_all_mb = export_peak_mb(load_all)
+        stream_mb = export_peak_mb(stream)
+        engine.dispose()
+
+    print(f"last page, OFFSET        : {offset_ms:8.2f} ms")
+    print(f"last page, keyset cursor : {keyset_ms:8.2f} ms")
+    print(f"export peak, load all    : {load_all_mb:8.1f} MiB")
+    print(f"export peak, streaming   : {stream_mb:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
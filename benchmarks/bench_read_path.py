@@ -0,0 +1,120 @@
+"""
+GET /applications/{application_id} read path: ORM entity + pydantic response
+model (before) vs column projection rendered straight to JSON (after).
+
+Usage:
+    python -m benchmarks.bench_read_path [--rows 10000] [--lookups 20000]
+"""
+import argparse
+import random
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+from api.helpers import fetch_application_values
+from api.models import Application, ApplicationStatus, Base, Borrower
+from api.responses import application_response_content, render_json
+from api.rules.offer import compute_offer
+from api.schemas import ApplicationResponse, OfferResponse
+from api.storage import StorageSettings, create_engine_from_settings
+
+RESPONSE_ADAPTER = TypeAdapter(ApplicationResponse)
+
+
+def populate(session_factory, rows: int) -> list:
+    rng = random.Random(0)
+    with session_factory() as db:
+        borrower_id = db.execute(insert(Borrower).values(
+            borrower_id="borrower_bench", first_name="A", last_name="B", email="a@b.com",
+            phone="5551234567", address_street="1 St", city="C", state="NY", zip_code="1",
+            ssn_encrypted="x", ssn_hash="0" * 64, fingerprint="0" * 64,
+        ).returning(Borrower.id)).scalar_one()
+
+        records = []
+        for i in range(rows):
+            amount = Decimal(rng.randint(5000, 60000))
+            lines = rng.randint(0, 100)
+            decision = compute_offer(amount, lines)
+            records.append(dict(
+                application_id=f"application_{i}",
+                borrower_id=borrower_id,
+                open_credit_lines=lines,
+                requested_amount=amount,
+                application_status=decision.status,
+                reason=decision.reason,
+                interest_rate=Decimal(str(decision.offer.interest_rate)) if decision.offer else None,
+                term_months=decision.offer.term_months if decision.offer else None,
+                monthly_payment=decision.offer.monthly_payment if decision.offer else None,
+            ))
+        db.execute(insert(Application), records)
+        db.commit()
+        return [r["application_id"] for r in records]
+
+
+def orm_path(db, application_id: str) -> bytes:
+    row = db.execute(select(Application).where(Application.application_id == application_id)).scalar_one()
+    response = ApplicationResponse(
+        application_id=row.application_id,
+        decision=row.application_status,
+        open_credit_lines=row.open_credit_lines,
+        offer=(
+            OfferResponse(
+                total_amount=row.requested_amount,
+                interest_rate=row.interest_rate,
+                term_months=row.term_months,
+                monthly_payment=row.monthly_payment,
+            )
+            if row.application_status is ApplicationStatus.APPROVED
+            else None
+        ),
+        reason=(row.reason if row.application_status is ApplicationStatus.DENIED else None),
+    )
+    # What FastAPI does with response_model: validate again, then dump
+    return RESPONSE_ADAPTER.dump_json(RESPONSE_ADAPTER.validate_python(response))
+
+
+def projection_path(db, application_id: str) -> bytes:
+    return render_json(application_response_content(fetch_application_values(db, application_id)))
+
+
+def measure(fn, session_factory, ids) -> float:
+    """CPU microseconds per lookup."""
+    with session_factory() as db:
+        start = time.process_time()
+        for application_id in ids:
+            fn(db, application_id)
+            # A request uses a fresh session; don't let the identity map help
+            db.expunge_all()
+        return (time.process_time() - start) / len(ids) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine_from_settings(StorageSettings(url=f"sqlite:///{Path(tmp) / 'bench.db'}"))
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+        ids = populate(session_factory, args.rows)
+        lookups = random.Random(1).choices(ids, k=args.lookups)
+
+        before = measure(orm_path, session_factory, lookups)
+        after = measure(projection_path, session_factory, lookups)
+        engine.dispose()
+
+    print(f"ORM + response_model : {before:8.1f} us CPU/request")
+    print(f"projection + orjson  : {after:8.1f} us CPU/request")
+    print(f"speedup              : {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Sustained POST /applications throughput against 1, 2 and 4 shards.
+
+--clients concurrent clients submit applications (each a new borrower) in a
+closed loop for --seconds, through the whole app on an in-process ASGI
+transport. Each run gets fresh shard databases (api.sharding) in a
+temporary directory; reports writes per second, latencies and how evenly
+the writes spread.
+
+Usage:
+    python -m benchmarks.bench_sharding [--clients 64] [--seconds 10] [--shards 1,2,4]
+        [--synchronous NORMAL|FULL] [--group-commit] [--async-db]
+
+Shards help when commits wait on the disk (SQLITE_SYNCHRONOUS=FULL, an
+fsync per commit): each database has its own writer and its own log. When
+the process is CPU bound, more shards only add files.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from benchmarks.bench_group_commit import payload, percentile
+
+
+def run(main, app, clients: int, seconds: float) -> dict:
+    import httpx
+
+    ids = itertools.count()
+
+    async def client(http, deadline, latencies, errors):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await http.post("/applications", json=payload(next(ids)))
+            if response.status_code == 201:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(response.status_code)
+
+    async def load():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+            latencies, errors = [], []
+            start = time.perf_counter()
+            await asyncio.gather(*[client(http, start + seconds, latencies, errors) for _ in range(clients)])
+            return latencies, errors, time.perf_counter() - start
+
+    latencies, errors, elapsed = asyncio.run(load())
+    return {
+        "writes_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": len(errors),
+    }
+
+
+def shard_rows(database) -> list:
+    from sqlalchemy import func, select
+
+    from api.models import Application
+
+    counts = []
+    for engine in database.engines:
+        with engine.connect() as conn:
+            counts.append(conn.execute(select(func.count()).select_from(Application)).scalar_one())
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--shards", default="1,2,4", help="shard counts to compare")
+    parser.add_argument("--synchronous", default="FULL")
+    parser.add_argument("--group-commit", action="store_true", help="GROUP_COMMIT=1 (one lane per shard)")
+    parser.add_argument("--async-db", action="store_true", help="DB_ASYNC=1 (aiosqlite sessions)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    # The app reads its settings at import: configure it first
+    os.environ.update(
+        SQLITE_SYNCHRONOUS=args.synchronous,
+        GROUP_COMMIT="1" if args.group_commit else "",
+        CREDIT_PROVIDER="random",
+        APP_CACHE_BACKEND="none",
+        IDEMPOTENCY_PURGE_INTERVAL_SECONDS="0",
+    )
+    os.environ.setdefault("SSN_ENC_KEY", Fernet.generate_key().decode("utf-8"))
+    os.environ.setdefault("SSN_HASH_KEY", "bench-hash-key")
+
+    from api import main as app_main
+    from api.models import Base
+    from api.settings import AppSettings
+    from api.storage import StorageSettings
+
+    print(f"{args.clients} clients, {args.seconds:g}s per run, SQLITE_SYNCHRONOUS={args.synchronous}, "
+          f"{'async' if args.async_db else 'sync'} sessions, group commit {'on' if args.group_commit else 'off'}")
+    results = {}
+    for shards in (int(count) for count in args.shards.split(",")):
+        directory = Path(tmp.name) / f"{shards}-shards"
+        directory.mkdir()
+        urls = [f"sqlite:///{directory / f'shard{i}.db'}" for i in range(shards)]
+        settings = AppSettings(
+            storage=StorageSettings.from_env(url=urls[0]),
+            shard_urls=tuple(urls[1:]),
+            db_async=args.async_db,
+            warm_up=False,
+            idempotency_purge_interval=0,
+        )
+        app = app_main.create_app(settings)
+        database = app.state.database
+        for engine in database.engines:
+            Base.metadata.create_all(bind=engine)
+        results[shards] = result = run(app_main, app, args.clients, args.seconds)
+        spread = "/".join(str(count) for count in shard_rows(database))
+        print(f"{shards} shard{'s' if shards > 1 else ' '}: {result['writes_per_second']:8.1f} writes/s  "
+              f"p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  errors {result['errors']}  "
+              f"rows per shard {spread}")
+        asyncio.run(database.dispose())
+
+    first = next(iter(results.values()))["writes_per_second"]
+    for shards, result in list(results.items())[1:]:
+        print(f"{shards} shards vs {next(iter(results))}: {result['writes_per_second'] / first:6.2f}x")
+    tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
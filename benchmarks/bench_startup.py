@@ -0,0 +1,122 @@
+"""
+Worker startup time and first-request latency, each sample in a fresh
+interpreter like a newly spawned worker.
+
+A probe imports api.main (which builds the app), runs its startup
+(lifespan) and then times two POST /applications in a row: the first pays
+whatever startup left cold. Compared with STARTUP_WARM_UP on and off.
+
+Usage:
+    python -m benchmarks.bench_startup [--samples 5]
+    python -m benchmarks.bench_startup --probe      (one probe, JSON on stdout;
+                                                     needs DATABASE_URL migrated)
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+REQUEST = {
+    "borrower": {
+        "first_name": "First", "last_name": "Request", "email": "first.request@example.com",
+        "phone": "555-123-4567", "ssn": "123-45-6789", "address_street": "1 Main St",
+        "city": "New York", "state": "NY", "zip_code": "10001",
+    },
+    "requested_amount": 25000,
+}
+
+
+def probe() -> dict:
+    """Runs in the fresh interpreter: seconds per startup phase and request."""
+    start = time.perf_counter()
+    from api import main
+    import_seconds = time.perf_counter() - start
+
+    import httpx
+
+    async def run():
+        app = main.app
+        async with app.router.lifespan_context(app):
+            startup_seconds = time.perf_counter() - start - import_seconds
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://probe") as client:
+                latencies = []
+                for i in range(2):
+                    request = dict(REQUEST, requested_amount=25000 + i)
+                    sent = time.perf_counter()
+                    response = await client.post("/applications", json=request)
+                    latencies.append(time.perf_counter() - sent)
+                    assert response.status_code == 201, response.text
+        return startup_seconds, latencies
+
+    startup_seconds, (first, second) = asyncio.run(run())
+    return {
+        "import_seconds": import_seconds,
+        "startup_seconds": startup_seconds,
+        "boot_seconds": import_seconds + startup_seconds,
+        "first_request_seconds": first,
+        "second_request_seconds": second,
+    }
+
+
+@contextmanager
+def probe_database():
+    """A migrated throwaway database, and the environment for probes using it."""
+    from api.migrations import upgrade
+    from api.storage import StorageSettings, create_engine_from_settings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'startup.db'}"
+        engine = create_engine_from_settings(StorageSettings(url=url))
+        upgrade(engine)
+        engine.dispose()
+        env = dict(
+            os.environ,
+            DATABASE_URL=url,
+            CREDIT_PROVIDER="random",
+            IDEMPOTENCY_PURGE_INTERVAL_SECONDS="0",
+            SSN_ENC_KEY=os.environ.get("SSN_ENC_KEY") or Fernet.generate_key().decode("utf-8"),
+            SSN_HASH_KEY=os.environ.get("SSN_HASH_KEY") or "bench-hash-key",
+        )
+        yield env
+
+
+def run_probe(env: dict) -> dict:
+    """One probe in a new interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--probe"],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe()))
+        return
+
+    fields = ("import_seconds", "startup_seconds", "first_request_seconds", "second_request_seconds")
+    print(f"{'':16s}" + "".join(f"{name.replace('_seconds', ''):>16s}" for name in fields) + "   (median ms)")
+    with probe_database() as env:
+        for label, warm_up in (("no warm-up", "0"), ("warm-up", "1")):
+            samples = [run_probe(dict(env, STARTUP_WARM_UP=warm_up)) for _ in range(args.samples)]
+            medians = [statistics.median(sample[name] for sample in samples) * 1000 for name in fields]
+            print(f"{label:16s}" + "".join(f"{value:16.1f}" for value in medians))
+
+
+if __name__ == "__main__":
+    main()
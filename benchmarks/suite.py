@@ -0,0 +1,362 @@
+"""
+Microbenchmark suite for the hot paths, with regression checks.
+
+Covers pricing and the decision rules, SSN crypto, borrower lookup at
+several table sizes, a full create_application against SQLite, and worker
+startup and first-request latency (in fresh interpreters). Results
+are written as JSON; with --baseline they are compared to a stored run and
+the exit status is 1 if any benchmark got slower than its threshold allows.
+
+Usage:
+    python -m benchmarks.suite                          # run, write results
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+Options:
+    --quick            smaller tables and shorter timing runs
+    --filter TEXT      only benchmarks whose name contains TEXT
+    --threshold 0.5    allowed slowdown, as a fraction (0.5: up to 1.5x)
+    --threshold NAME=0.3  per benchmark; also read from the baseline file
+    --normalize        divide ratios by the ratio of a pure-Python
+                       calibration loop, to compare runs across machines
+
+Timings are per operation: the best of several repeats, each long enough to
+dwarf the timer resolution. Sampled benchmarks (startup) time themselves,
+one operation per repeat. Record the baseline on the machine that runs the
+check.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SSN_ENC_KEY", Fernet.generate_key().decode("utf-8"))
+os.environ.setdefault("SSN_HASH_KEY", "bench-hash-key")
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from api.crypto import prepare_ssn  # noqa: E402
+from api.helpers import borrower_fingerprint, create_application, find_or_create_borrower  # noqa: E402
+from api.metrics import stage  # noqa: E402
+from api.models import Base, Borrower  # noqa: E402
+from api.rules.offer import compute_monthly_payment, compute_offer  # noqa: E402
+from api.schemas import ApplicationRequest, BorrowerRequest  # noqa: E402
+from api.security import encrypt_ssn, hash_ssn  # noqa: E402
+from api.storage import StorageSettings, create_engine_from_settings  # noqa: E402
+from benchmarks import bench_startup  # noqa: E402
+
+DEFAULT_OUTPUT = "benchmarks/results/latest.json"
+DEFAULT_THRESHOLD = 0.5
+CALIBRATION = "calibration.python_loop"
+TABLE_SIZES = (1_000, 10_000, 100_000)
+QUICK_TABLE_SIZES = (1_000, 10_000)
+
+# name -> factory(quick) returning a context manager that yields one operation
+BENCHMARKS: Dict[str, Callable] = {}
+# Benchmarks whose operation returns the seconds it measured itself
+SAMPLED = set()
+
+
+def benchmark(name: str, sampled: bool = False):
+    def register(factory):
+        BENCHMARKS[name] = contextmanager(factory)
+        if sampled:
+            SAMPLED.add(name)
+        return factory
+    return register
+
+
+def _cycle(items):
+    """A zero-arg callable returning the items in turn."""
+    state = {"i": -1}
+    n = len(items)
+
+    def next_item():
+        state["i"] = (state["i"] + 1) % n
+        return items[state["i"]]
+    return next_item
+
+
+def _borrower(n: int) -> BorrowerRequest:
+    return BorrowerRequest(
+        first_name="John", last_name=f"Doe{n}", email=f"john{n}@example.com", phone="555-123-4567",
+        ssn=f"{n // 1000000 % 1000:03d}-{n // 10000 % 100:02d}-{n % 10000:04d}",
+        address_street="123 Main St", city="New York", state="NY", zip_code="10001",
+    )
+
+
+@contextmanager
+def _sqlite_engine():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Same pragmas as the app (WAL, synchronous=NORMAL)
+        engine = create_engine_from_settings(StorageSettings(url=f"sqlite:///{Path(tmp) / 'bench.db'}"))
+        Base.metadata.create_all(bind=engine)
+        try:
+            yield engine
+        finally:
+            engine.dispose()
+
+
+# Benchmarks
+
+@benchmark(CALIBRATION)
+def _calibration(quick):
+    def op():
+        total = 0
+        for i in range(1000):
+            total += i * i
+        return total
+    yield op
+
+
+@benchmark("pricing.compute_monthly_payment")
+def _monthly_payment(quick):
+    rng = random.Random(0)
+    cases = _cycle([
+        (Decimal(rng.randint(1000000, 5000000)) / 100, rng.choice((10.0, 20.0)), rng.choice((24, 36)))
+        for _ in range(1000)
+    ])
+    yield lambda: compute_monthly_payment(*cases())
+
+
+@benchmark("rules.compute_offer")
+def _compute_offer(quick):
+    rng = random.Random(0)
+    cases = _cycle([(Decimal(rng.randint(500000, 6000000)) / 100, rng.randint(0, 100)) for _ in range(1000)])
+    yield lambda: compute_offer(*cases())
+
+
+@benchmark("security.hash_ssn")
+def _hash_ssn(quick):
+    ssns = _cycle([f"123-45-{i:04d}" for i in range(1000)])
+    yield lambda: hash_ssn(ssns())
+
+
+@benchmark("security.encrypt_ssn")
+def _encrypt_ssn(quick):
+    ssns = _cycle([f"123-45-{i:04d}" for i in range(1000)])
+    yield lambda: encrypt_ssn(ssns())
+
+
+@benchmark("metrics.stage_timer")
+def _stage_timer(quick):
+    # Cost the request metrics add to every timed stage
+    def op():
+        with stage("bench"):
+            pass
+    yield op
+
+
+def _lookup_benchmark(rows: int):
+    def factory(quick):
+        with _sqlite_engine() as engine:
+            session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+            with session_factory() as db:
+                for start in range(0, rows, 10000):
+                    batch = []
+                    for n in range(start, min(start + 10000, rows)):
+                        b = _borrower(n)
+                        ssn_hash = hash_ssn(b.ssn)
+                        row = b.model_dump(exclude={"ssn"})
+                        row.update(ssn_hash=ssn_hash, ssn_encrypted="x", fingerprint=borrower_fingerprint(b, ssn_hash))
+                        batch.append(row)
+                    db.execute(insert(Borrower), batch)
+                db.commit()
+
+            rng = random.Random(0)
+            probes = _cycle([(b, prepare_ssn(b.ssn)) for b in (_borrower(rng.randrange(rows)) for _ in range(500))])
+            with session_factory() as db:
+                def op():
+                    find_or_create_borrower(db, *probes())
+                    # A request uses a fresh session; don't let the identity map help
+                    db.expunge_all()
+                yield op
+    return factory
+
+
+for _rows in TABLE_SIZES:
+    benchmark(f"borrowers.find_or_create_borrower[rows={_rows}]")(_lookup_benchmark(_rows))
+
+
+@benchmark("applications.create_application")
+def _create_application(quick):
+    with _sqlite_engine() as engine:
+        session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        rng = random.Random(0)
+        # Mostly returning borrowers, like production traffic
+        requests = _cycle([
+            ApplicationRequest(borrower=_borrower(rng.randrange(200)), requested_amount=Decimal(rng.randint(5000, 60000)))
+            for _ in range(1000)
+        ])
+
+        def op():
+            with session_factory() as db:
+                create_application(db, requests(), open_credit_lines=20)
+        yield op
+
+
+@benchmark("startup.worker_boot", sampled=True)
+def _worker_boot(quick):
+    # A spawned worker: import api.main, then the app's startup and warm-up
+    with bench_startup.probe_database() as env:
+        yield lambda: bench_startup.run_probe(env)["boot_seconds"]
+
+
+@benchmark("startup.first_request", sampled=True)
+def _first_request(quick):
+    # The first POST /applications a new worker serves
+    with bench_startup.probe_database() as env:
+        yield lambda: bench_startup.run_probe(env)["first_request_seconds"]
+
+
+# Running
+
+def measure(op: Callable, min_time: float, repeat: int, sampled: bool = False) -> dict:
+    """Per-operation seconds: best and median of `repeat` timed loops."""
+    if sampled:
+        timings = [op() for _ in range(repeat)]
+        return {"best_us": min(timings) * 1e6, "median_us": statistics.median(timings) * 1e6, "loops": 1}
+
+    loops, elapsed = 1, 0.0
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            op()
+        timings.append((time.perf_counter() - start) / loops)
+    return {"best_us": min(timings) * 1e6, "median_us": statistics.median(timings) * 1e6, "loops": loops}
+
+
+def run_suite(names, quick: bool = False) -> dict:
+    min_time, repeat = (0.05, 3) if quick else (0.2, 5)
+    results = {}
+    for name in names:
+        with BENCHMARKS[name](quick) as op:
+            results[name] = measure(op, min_time, repeat, sampled=name in SAMPLED)
+        print(f"{name:55s} {results[name]['best_us']:12.2f} us", file=sys.stderr, flush=True)
+    return results
+
+
+def selected(filter_text: Optional[str], quick: bool) -> list:
+    names = [name for name in BENCHMARKS if not filter_text or filter_text in name or name == CALIBRATION]
+    if quick:
+        skipped = {f"borrowers.find_or_create_borrower[rows={n}]" for n in TABLE_SIZES if n not in QUICK_TABLE_SIZES}
+        names = [name for name in names if name not in skipped]
+    return names
+
+
+def compare(results: dict, baseline: dict, thresholds: dict, default_threshold: float,
+            normalize: bool = False) -> list:
+    """
+    One (name, baseline_us, current_us, ratio, allowed, regressed) row per
+    benchmark present in both runs. ratio > allowed is a regression.
+    """
+    scale = 1.0
+    if normalize and CALIBRATION in results and CALIBRATION in baseline:
+        scale = results[CALIBRATION]["best_us"] / baseline[CALIBRATION]["best_us"]
+    rows = []
+    for name, current in results.items():
+        if name == CALIBRATION or name not in baseline:
+            continue
+        ratio = current["best_us"] / baseline[name]["best_us"] / scale
+        allowed = 1 + thresholds.get(name, default_threshold)
+        rows.append((name, baseline[name]["best_us"], current["best_us"], ratio, allowed, ratio > allowed))
+    return rows
+
+
+def _parse_thresholds(values) -> tuple:
+    default, per_name = DEFAULT_THRESHOLD, {}
+    for value in values or ():
+        if "=" in value:
+            name, fraction = value.rsplit("=", 1)
+            per_name[name] = float(fraction)
+        else:
+            default = float(value)
+    return default, per_name
+
+
+def _write_json(path: str, data: dict) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--filter")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", help="write this run as the new baseline")
+    parser.add_argument("--threshold", action="append")
+    parser.add_argument("--normalize", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run_suite(selected(args.filter, args.quick), quick=args.quick)
+    run = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    _write_json(args.output, run)
+
+    if args.save_baseline:
+        # Keep hand-tuned per-benchmark thresholds of the previous baseline
+        thresholds = {}
+        if os.path.exists(args.save_baseline):
+            with open(args.save_baseline) as f:
+                thresholds = json.load(f).get("thresholds", {})
+        _write_json(args.save_baseline, dict(run, thresholds=thresholds))
+        print(f"Baseline written to {args.save_baseline}")
+        return 0
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    default, per_name = _parse_thresholds(args.threshold)
+    thresholds = dict(baseline.get("thresholds", {}), **per_name)
+    rows = compare(results, baseline["results"], thresholds, default, normalize=args.normalize)
+
+    print(f"{'benchmark':55s} {'baseline':>10s} {'current':>10s} {'ratio':>7s}")
+    for name, before, after, ratio, allowed, regressed in rows:
+        flag = f"  REGRESSION (> {allowed:.2f}x)" if regressed else ""
+        print(f"{name:55s} {before:8.2f}us {after:8.2f}us {ratio:6.2f}x{flag}")
+    regressions = [row for row in rows if row[-1]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed beyond their threshold.")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())